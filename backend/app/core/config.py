@@ -4,10 +4,110 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
     
+    # Storage Engine
+    # "supabase" (default) or "sqlite": an embedded database file on the
+    # shop PC, for single-counter stores that must keep billing offline
+    DB_ENGINE: str = "supabase"
+    SQLITE_PATH: str = "retail_boss.db"
+    SQLITE_WAL: bool = True
+    
+    # Database Pool Configuration
+    DB_POOL_SIZE: int = 20
+    DB_QUERY_TIMEOUT_SECONDS: float = 10.0
+    
     # API Configuration
     API_V1_STR: str = "/api"
     CORS_ORIGINS: str = "http://localhost:3000"
     
+    # Store Configuration
+    # Written to the database at startup for store_local_time() (migration
+    # 025); changing it rebuilds the sales rollups
+    STORE_TIMEZONE: str = "Asia/Kolkata"
+    
+    # Inventory Configuration
+    LOW_STOCK_THRESHOLD: float = 5
+    EXPORT_PAGE_SIZE: int = 1000
+    
+    # Stock deductions for products hashing to the same shard are serialized
+    # in-process, so hot SKUs queue in the API instead of in the database
+    STOCK_LOCK_SHARDS: int = 256
+    
+    # Inventory Reconciliation Configuration
+    # Ledger rows younger than RECONCILE_SETTLE_SECONDS are left for the next run
+    RECONCILE_SHARDS: int = 8
+    RECONCILE_SETTLE_SECONDS: int = 300
+    
+    # Idempotency Configuration
+    # Keys are kept for IDEMPOTENCY_TTL_SECONDS. A duplicate request waits up
+    # to IDEMPOTENCY_WAIT_SECONDS for the in-flight attempt; an attempt whose
+    # worker died is taken over after IDEMPOTENCY_LEASE_SECONDS, which must
+    # exceed the longest create_sale transaction.
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_LEASE_SECONDS: int = 30
+    IDEMPOTENCY_WAIT_SECONDS: float = 15
+    
+    # Bill Number Configuration
+    BILL_NUMBER_BLOCK_SIZE: int = 20
+    
+    # Barcode Configuration
+    # Generated barcodes use a GS1 restricted-circulation (in-store) prefix
+    BARCODE_PREFIX: str = "200"
+    BARCODE_BLOCK_SIZE: int = 100
+    
+    # Product Import Configuration
+    IMPORT_MAX_ROWS: int = 100000
+    IMPORT_CHUNK_SIZE: int = 1000
+    
+    # Conditional GET Configuration
+    # The catalog version is re-read at most once per refresh interval
+    CATALOG_VERSION_REFRESH_SECONDS: float = 1.0
+    RESPONSE_CACHE_SIZE: int = 256
+    RESPONSE_CACHE_TTL_SECONDS: float = 30
+    
+    # Product Cache Configuration
+    BARCODE_CACHE_SIZE: int = 50000
+    BARCODE_CACHE_TTL_SECONDS: float = 600
+    STOCK_CACHE_TTL_SECONDS: float = 2
+    
+    # Analytics Configuration
+    # Rows per scan chunk. PostgREST caps responses at its max-rows setting,
+    # which must be at least this value.
+    ANALYTICS_CHUNK_SIZE: int = 10000
+    ANALYTICS_CACHE_SIZE: int = 64
+    ANALYTICS_CACHE_TTL_SECONDS: float = 300
+    
+    # Metrics Configuration
+    # Per-request DB round trips and latency: Server-Timing header and /metrics
+    METRICS_ENABLED: bool = True
+    
+    # Query Detector Configuration (off by default)
+    # Warns when one query shape repeats more than QUERY_REPEAT_THRESHOLD
+    # times in a request (N+1) or a query exceeds SLOW_QUERY_MS; strict mode
+    # raises instead of warning, for CI
+    QUERY_DETECTOR_ENABLED: bool = False
+    QUERY_DETECTOR_STRICT: bool = False
+    QUERY_REPEAT_THRESHOLD: int = 5
+    SLOW_QUERY_MS: float = 200
+    
+    # Product Search Configuration
+    # In-memory name/SKU index built at startup; products created by other
+    # workers are picked up at most every SEARCH_INDEX_REFRESH_SECONDS.
+    # Disabled (or still building), searches use the search_products function.
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_REFRESH_SECONDS: float = 5
+    
+    # Live Updates Configuration
+    # GET /api/events (server-sent events): each worker polls the ledger,
+    # bills and notifications every EVENTS_POLL_SECONDS while clients are
+    # connected and keeps the last EVENTS_BUFFER_SIZE events for resuming.
+    # Each poll re-reads the last EVENTS_OVERLAP_SECONDS of rows, which must
+    # exceed the longest writing transaction the database allows
+    # (statement_timeout); DB_QUERY_TIMEOUT_SECONDS does not bound commits.
+    EVENTS_POLL_SECONDS: float = 1
+    EVENTS_OVERLAP_SECONDS: float = 30
+    EVENTS_BUFFER_SIZE: int = 1000
+    EVENTS_KEEPALIVE_SECONDS: float = 15
+    
     # App Configuration
     APP_NAME: str = "Retail Boss API"
     DEBUG: bool = True
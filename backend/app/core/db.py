@@ -1,22 +1,421 @@
-from supabase import create_client, Client
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from app.core.config import settings
+from app.core import query_detector
+from app.core.metrics import record_query
 
-def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
-    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
-        raise ValueError("Supabase URL and KEY must be set in environment variables")
-    
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 
-# Global client instance
-supabase: Client = None
+class DatabaseError(Exception):
+    """
+    Error raised by the database backend.
+
+    Carries the backend error code (Postgres SQLSTATE for Supabase) so that
+    services can map business errors raised inside SQL functions to HTTP codes.
+    """
+
+    def __init__(self, message: str, code: Optional[str] = None, details: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.details = details
+
+    @property
+    def http_status(self) -> int:
+        """
+        HTTP status for this error.
+
+        SQL functions raise business errors with SQLSTATE 'RBnnn', where nnn
+        is the HTTP status. A unique violation (23505) maps to 409 Conflict.
+        Anything else is a server error.
+        """
+        code = self.code or ""
+        if code.startswith("RB") and code[2:].isdigit():
+            return int(code[2:])
+        if code == "23505":
+            return 409
+        return 500
+
+
+class DatabaseTimeout(DatabaseError):
+    """Raised when a query exceeds DB_QUERY_TIMEOUT_SECONDS"""
+
+
+@dataclass
+class QueryResult:
+    """Result of an executed query: rows (or RPC return value) and optional exact count"""
+    data: Any
+    count: Optional[int] = None
+
+
+@dataclass
+class Query:
+    """
+    Table query builder.
+
+    Mirrors the postgrest builder API used across the services
+    (`table(...).select(...).eq(...).order(...).limit(...)`), but only records
+    the query. `await query.execute()` hands it to the database, which runs it
+    on the active backend under the connection pool limits.
+    """
+    db: "Database"
+    table: str
+    action: str = "select"
+    columns: str = "*"
+    count: Optional[str] = None
+    payload: Any = None
+    on_conflict: Optional[str] = None
+    filters: List[Tuple[str, str, Any]] = field(default_factory=list)
+    orders: List[Tuple[str, bool]] = field(default_factory=list)
+    row_limit: Optional[int] = None
+    keyset: Optional[Tuple[Tuple[str, ...], Tuple[Any, ...], bool]] = None
+    # Service method that built the query (only with the query detector on)
+    caller: Optional[str] = None
+    # Repeated on purpose (see expect_repeats)
+    repeats_expected: bool = False
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "Query":
+        self.action = "select"
+        self.columns = columns
+        self.count = count
+        return self
+
+    def insert(self, rows: Any) -> "Query":
+        self.action = "insert"
+        self.payload = rows
+        return self
+
+    def upsert(self, rows: Any, on_conflict: Optional[str] = None) -> "Query":
+        self.action = "upsert"
+        self.payload = rows
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, values: Dict[str, Any]) -> "Query":
+        self.action = "update"
+        self.payload = values
+        return self
+
+    def delete(self) -> "Query":
+        self.action = "delete"
+        return self
+
+    def _filter(self, op: str, column: str, value: Any) -> "Query":
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "Query":
+        return self._filter("eq", column, value)
+
+    def neq(self, column: str, value: Any) -> "Query":
+        return self._filter("neq", column, value)
+
+    def gt(self, column: str, value: Any) -> "Query":
+        return self._filter("gt", column, value)
+
+    def gte(self, column: str, value: Any) -> "Query":
+        return self._filter("gte", column, value)
+
+    def lt(self, column: str, value: Any) -> "Query":
+        return self._filter("lt", column, value)
+
+    def lte(self, column: str, value: Any) -> "Query":
+        return self._filter("lte", column, value)
+
+    def like(self, column: str, pattern: str) -> "Query":
+        return self._filter("like", column, pattern)
+
+    def in_(self, column: str, values: List[Any]) -> "Query":
+        return self._filter("in_", column, list(values))
+
+    def is_(self, column: str, value: Any) -> "Query":
+        return self._filter("is_", column, value)
+
+    def after(self, columns: Tuple[str, ...], values: Tuple[Any, ...], desc: bool = False) -> "Query":
+        """
+        Keyset pagination: only rows strictly after `values` in the
+        (columns...) ordering, i.e. (c1, c2) > (v1, v2), or < when desc.
+        Combine with matching order() calls.
+        """
+        self.keyset = (tuple(columns), tuple(values), desc)
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "Query":
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "Query":
+        self.row_limit = n
+        return self
+
+    def expect_repeats(self) -> "Query":
+        """
+        Mark the query as repeated on purpose (paging, fixed fan-out), so
+        the query detector does not report it as N+1
+        """
+        self.repeats_expected = True
+        return self
+
+    async def execute(self) -> QueryResult:
+        return await self.db.run(self)
+
+
+@dataclass
+class RpcCall:
+    """Call of a SQL function (stored procedure). Executes in a single round trip."""
+    db: "Database"
+    function: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    caller: Optional[str] = None
+    repeats_expected: bool = False
+
+    def expect_repeats(self) -> "RpcCall":
+        """Mark the call as repeated on purpose (e.g. one call per shard)"""
+        self.repeats_expected = True
+        return self
+
+    async def execute(self) -> QueryResult:
+        return await self.db.run(self)
+
+
+class SupabaseBackend:
+    """
+    Async PostgREST backend for Supabase.
+
+    Uses postgrest's AsyncPostgrestClient over a single shared httpx.AsyncClient,
+    so requests never block the event loop and TCP/TLS connections are reused
+    from a bounded pool.
+    """
+
+    def __init__(self, url: str, key: str, pool_size: int, timeout: float):
+        import httpx
+        from postgrest import AsyncPostgrestClient
+
+        headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        self.client = AsyncPostgrestClient(f"{url.rstrip('/')}/rest/v1", headers=headers)
+        # Replace the default session with one bounded to the configured pool size
+        self.client.session = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size
+            ),
+            follow_redirects=True
+        )
+
+    async def execute(self, query: Any) -> QueryResult:
+        from postgrest.exceptions import APIError
+
+        if isinstance(query, RpcCall):
+            builder = self.client.rpc(query.function, query.params)
+        else:
+            builder = self.client.table(query.table)
+            if query.action == "select":
+                builder = builder.select(query.columns, count=query.count)
+            elif query.action == "insert":
+                builder = builder.insert(query.payload)
+            elif query.action == "upsert":
+                builder = builder.upsert(query.payload, on_conflict=query.on_conflict or "")
+            elif query.action == "update":
+                builder = builder.update(query.payload)
+            elif query.action == "delete":
+                builder = builder.delete()
+
+            for op, column, value in query.filters:
+                builder = getattr(builder, op)(column, value)
+            if query.keyset is not None:
+                builder.params = builder.params.add("or", f"({self._keyset_filter(*query.keyset)})")
+            if query.orders:
+                # PostgREST expects all sort keys in a single order parameter
+                builder.params = builder.params.add("order", ",".join(
+                    f"{column}.{'desc' if desc else 'asc'}" for column, desc in query.orders
+                ))
+            if query.row_limit is not None:
+                builder = builder.limit(query.row_limit)
+
+        try:
+            response = await builder.execute()
+        except APIError as e:
+            raise DatabaseError(e.message or str(e), code=e.code, details=e.details)
+
+        return QueryResult(data=response.data, count=response.count)
+
+    @staticmethod
+    def _keyset_filter(columns: Tuple[str, ...], values: Tuple[Any, ...], desc: bool) -> str:
+        """
+        Render a row-value comparison as a PostgREST `or` filter, e.g.
+        (name, id) > (a, b)  ->  name.gt."a",and(name.eq."a",id.gt."b")
+        """
+        op = "lt" if desc else "gt"
+
+        def quote(value: Any) -> str:
+            text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            return f'"{text}"'
+
+        branches = []
+        for i, column in enumerate(columns):
+            terms = [f"{columns[j]}.eq.{quote(values[j])}" for j in range(i)]
+            terms.append(f"{column}.{op}.{quote(values[i])}")
+            branches.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+        return ",".join(branches)
+
+    async def close(self):
+        await self.client.session.aclose()
+
+
+class Database:
+    """
+    Async data-access layer shared by all services.
+
+    - Bounded concurrency: at most DB_POOL_SIZE queries are in flight; the rest
+      wait for a free slot instead of opening unbounded connections.
+    - Per-call timeout: every query is cancelled after DB_QUERY_TIMEOUT_SECONDS.
+    - Non-blocking: independent queries can be awaited together with
+      asyncio.gather and run concurrently on the pool.
+    """
+
+    def __init__(self, backend: Any, pool_size: int, timeout: float):
+        self.backend = backend
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(pool_size)
+
+    def table(self, name: str) -> Query:
+        caller = query_detector.calling_method() if query_detector.enabled() else None
+        return Query(db=self, table=name, caller=caller)
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> RpcCall:
+        caller = query_detector.calling_method() if query_detector.enabled() else None
+        return RpcCall(db=self, function=function, params=params or {}, caller=caller)
+
+    async def run(self, query: Any) -> QueryResult:
+        if isinstance(query, RpcCall):
+            target, action = query.function, "rpc"
+        else:
+            target, action = query.table, query.action
+        async with self._slots:
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await asyncio.wait_for(self.backend.execute(query), self.timeout)
+                failed = False
+            except asyncio.TimeoutError:
+                raise DatabaseTimeout(f"Query on {target} timed out after {self.timeout}s")
+            finally:
+                # Time spent waiting for a pool slot is not included
+                elapsed = time.perf_counter() - started
+                record_query(target, action, elapsed, failed)
+        if query_detector.enabled():
+            query_detector.observe(query, elapsed, query.caller)
+        return result
+
+    async def close(self):
+        await self.backend.close()
+
+
+# Max values per in_() filter. PostgREST filters travel in the URL, and large
+# IN lists must be split to stay under proxy URL length limits.
+IN_FILTER_CHUNK_SIZE = 150
+
+
+def chunks(values: List[Any], size: int = IN_FILTER_CHUNK_SIZE) -> List[List[Any]]:
+    """Split values into lists of at most `size` items"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+async def scan_pages(
+    build_query: Callable[[], Query],
+    keys: Tuple[str, ...],
+    page_size: int,
+    desc: bool = False
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Iterate over a large result set page by page using keyset pagination.
+
+    Every page is a fresh query continuing after the last row of the previous
+    page, so each page costs the same and only one page is held in memory.
+
+    Args:
+        build_query: Returns a new filtered select Query (without order/limit)
+        keys: Unique sort key columns, e.g. ("name", "id"); must be selected
+        page_size: Rows per page
+        desc: Sort descending
+
+    Yields:
+        Non-empty lists of rows
+    """
+    after = None
+    while True:
+        query = build_query()
+        if after is not None:
+            query = query.after(keys, after, desc=desc)
+        for key in keys:
+            query = query.order(key, desc=desc)
+
+        # One query per page is the point, not an N+1
+        response = await query.limit(page_size).expect_repeats().execute()
+
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        after = tuple(rows[-1][key] for key in keys)
+
+
+# Global database instance (None when running in mock mode)
+_db: Optional[Database] = None
+
+
+def get_db() -> Optional[Database]:
+    """Get the active database, or None when running in mock mode"""
+    return _db
+
 
 def init_db():
     """Initialize database connection"""
-    global supabase
-    try:
-        supabase = get_supabase_client()
-    except ValueError:
+    global _db
+    if settings.DB_ENGINE == "sqlite":
+        # Imported here so Supabase deployments never load the SQLite schema
+        from app.core.sqlite_backend import SQLiteBackend
+        _db = Database(
+            SQLiteBackend(settings.SQLITE_PATH, wal=settings.SQLITE_WAL),
+            pool_size=settings.DB_POOL_SIZE,
+            timeout=settings.DB_QUERY_TIMEOUT_SECONDS
+        )
+        return
+    if settings.DB_ENGINE != "supabase":
+        raise ValueError(f"Unknown DB_ENGINE {settings.DB_ENGINE!r}, expected 'supabase' or 'sqlite'")
+
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
         # In development, allow running without Supabase
-        supabase = None
+        _db = None
         print("Warning: Supabase not configured. Running in mock mode.")
+        return
+
+    backend = SupabaseBackend(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_KEY,
+        pool_size=settings.DB_POOL_SIZE,
+        timeout=settings.DB_QUERY_TIMEOUT_SECONDS
+    )
+    _db = Database(
+        backend,
+        pool_size=settings.DB_POOL_SIZE,
+        timeout=settings.DB_QUERY_TIMEOUT_SECONDS
+    )
+
+
+async def close_db():
+    """Close pooled connections on shutdown"""
+    global _db
+    if _db is not None:
+        await _db.close()
+        _db = None
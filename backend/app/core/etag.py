@@ -0,0 +1,116 @@
+import asyncio
+import time
+import zlib
+import orjson
+from typing import Any, Awaitable, Callable, Optional, Type
+from fastapi import Request, Response
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.db import get_db
+from app.utils.cache import TTLCache
+
+
+class CatalogVersion:
+    """
+    Process-local view of the catalog_version row (migration 024), which
+    each writing transaction increments as it commits.
+
+    The version is re-read from the database at most once per
+    CATALOG_VERSION_REFRESH_SECONDS; concurrent readers share one fetch.
+    Writes made by this worker call bump() so its own changes are seen on
+    the next read without waiting for the refresh interval.
+    """
+
+    def __init__(self, refresh: float):
+        self.refresh = refresh
+        self._version: Optional[int] = None
+        self._fetched_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+
+    async def current(self) -> Optional[int]:
+        """Current catalog version, or None in mock mode"""
+        db = get_db()
+        if db is None:
+            return None
+
+        if self._version is not None and time.monotonic() - self._fetched_at < self.refresh:
+            return self._version
+
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._fetch(db))
+        pending = self._pending
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            if self._pending is pending and pending.done():
+                self._pending = None
+
+    async def _fetch(self, db) -> int:
+        fetched_at = time.monotonic()
+        response = await db.rpc("catalog_version").execute()
+        self._version = int(response.data)
+        self._fetched_at = fetched_at
+        return self._version
+
+    def bump(self) -> None:
+        """Force a re-read on the next call (after a local write)"""
+        self._fetched_at = 0.0
+
+
+catalog_version = CatalogVersion(settings.CATALOG_VERSION_REFRESH_SECONDS)
+
+# Request URL -> (version, etag, serialized body)
+response_cache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS
+)
+
+
+def _serialize(content: Any, model: Optional[Type[BaseModel]]) -> bytes:
+    if model is not None:
+        return model.model_validate(content).model_dump_json().encode()
+    return orjson.dumps(content)
+
+
+async def conditional_response(
+    request: Request,
+    producer: Callable[[], Awaitable[Any]],
+    model: Optional[Type[BaseModel]] = None
+) -> Response:
+    """
+    Serve a catalog read with ETag / If-None-Match support.
+
+    - If-None-Match equal to the current ETag: 304, no queries
+    - Unchanged since the last identical request: cached bytes, no queries
+    - Otherwise: run `producer`, serialize once and cache the bytes
+
+    The ETag is the catalog version plus a hash of the URL, so it changes
+    whenever products, stock or the query parameters change.
+
+    Args:
+        request: Incoming request (URL and If-None-Match header)
+        producer: Builds the response body
+        model: Response model the body is validated and serialized with
+
+    Returns:
+        Response with ETag header
+    """
+    version = await catalog_version.current()
+    if version is None:
+        return Response(content=_serialize(await producer(), model), media_type="application/json")
+
+    key = str(request.url)
+    etag = f'"{version}-{zlib.crc32(key.encode()):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return Response(content=cached[2], media_type="application/json", headers=headers)
+
+    body = _serialize(await producer(), model)
+    response_cache.set(key, (version, etag, body))
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,307 @@
+"""
+Live update broker (server-sent events).
+
+Terminals used to poll notifications and inventory; instead each worker
+runs one poll loop while it has subscribers and fans the resulting events
+out to every connected client. Read load is one query per feed per
+EVENTS_POLL_SECONDS per worker, however many terminals are connected.
+
+created_at is the writing transaction's start time, not its commit time:
+a transaction that started first can commit after a later one, so a row
+can appear behind rows already seen. Each poll therefore re-reads the
+last EVENTS_OVERLAP_SECONDS before the newest created_at seen and skips
+the ids it has already published. A row is missed only if its
+transaction commits more than EVENTS_OVERLAP_SECONDS after it started.
+The API's query timeout does not bound that (it only stops waiting; the
+server may still commit later), so the overlap must exceed the server's
+own limit on writing transactions (statement_timeout).
+
+Each feed is polled independently: a feed whose query fails (e.g. its
+table does not exist) is logged and retried on every poll, while the
+other feeds keep publishing.
+
+Event ids are "<broker>-<sequence>". A client reconnecting to the same
+worker with Last-Event-ID gets the buffered events after that sequence,
+as long as the ring buffer (EVENTS_BUFFER_SIZE events) still holds them;
+otherwise (buffer overrun, restart, another worker) it gets a "reset"
+event and should reload its state over the REST API.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+    """One change in a feed"""
+    __slots__ = ("feed", "type", "data", "key", "seq", "_payload")
+
+    def __init__(self, feed: str, type: str, data: Dict[str, Any], key: Optional[str] = None):
+        self.feed = feed
+        self.type = type
+        self.data = data
+        # Subscription filter value, e.g. the product id of a stock event
+        self.key = key
+        # Assigned by the broker when published
+        self.seq = 0
+        self._payload: Optional[str] = None
+
+    def encode(self, event_id: str) -> str:
+        """SSE frame; the payload is serialized once and shared by all subscribers"""
+        if self._payload is None:
+            self._payload = f"event: {self.type}\ndata: {json.dumps(self.data, separators=(',', ':'), default=str)}\n\n"
+        return f"id: {event_id}\n{self._payload}"
+
+
+class Feed:
+    """
+    A table followed by the broker.
+
+    Args:
+        name: Feed name, also the topic clients subscribe to
+        newest: Returns the created_at of the newest row (None when empty)
+        rows: Returns up to `limit` rows (with id and created_at) created at
+              or after `since` (None: from the first row) and past the
+              (created_at, id) keyset `after`, in (created_at, id) order
+        events: Builds the events of rows not published yet
+    """
+
+    def __init__(
+        self,
+        name: str,
+        newest: Callable[[], Awaitable[Optional[str]]],
+        rows: Callable[[Optional[str], Optional[Tuple[Any, Any]], int], Awaitable[List[Dict[str, Any]]]],
+        events: Callable[[List[Dict[str, Any]]], Awaitable[List[Event]]]
+    ):
+        self.name = name
+        self.newest = newest
+        self.rows = rows
+        self.events = events
+
+
+class Subscription:
+    """One connected client"""
+
+    def __init__(self, broker: "EventBroker", last_seq: int,
+                 topics: Set[str], keys: Optional[Set[str]], queue_size: int):
+        self.broker = broker
+        self.last_seq = last_seq
+        self.topics = topics
+        self.keys = keys
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Set when the client falls too far behind; its stream ends and the
+        # client resumes from its last event id
+        self.overflowed = False
+
+    def wants(self, event: Event) -> bool:
+        if event.feed not in self.topics or event.seq <= self.last_seq:
+            return False
+        return self.keys is None or event.key is None or event.key in self.keys
+
+    def frame(self, event: Event) -> str:
+        self.last_seq = event.seq
+        return event.encode(self.broker.event_id(event.seq))
+
+    def deliver(self, event: Event) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+
+
+class _FeedState:
+    """Newest created_at seen in a feed and the ids seen within the overlap"""
+    __slots__ = ("primed", "failing", "newest", "seen")
+
+    def __init__(self):
+        # Existing rows were marked seen (done per feed, on its first good poll)
+        self.primed = False
+        # The last poll failed (logged once per failure streak)
+        self.failing = False
+        self.newest: Optional[datetime] = None
+        self.seen: Dict[Any, datetime] = {}  # id -> created_at
+
+
+class EventBroker:
+    """Polls registered feeds while clients are connected and fans events out"""
+
+    def __init__(self, feeds: Sequence[Feed], buffer_size: int, poll_seconds: float,
+                 overlap_seconds: float, batch_size: int = 500):
+        self.feeds = list(feeds)
+        self.buffer_size = buffer_size
+        self.poll_seconds = poll_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.batch_size = batch_size
+        # Distinguishes this broker's event ids from other workers' and restarts
+        self.name = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._state = self._fresh_state()
+        self._buffer: Deque[Event] = deque()
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._started = asyncio.Event()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.name}-{seq}"
+
+    async def subscribe(self, last_event_id: Optional[str], topics: Set[str],
+                        keys: Optional[Set[str]] = None) -> Tuple[Subscription, List[Event], bool]:
+        """
+        Register a client.
+
+        Returns:
+            The subscription, the buffered events to replay first, and
+            whether the client must reload its state (resume not possible)
+        """
+        self._ensure_running()
+        # Clients start after the rows that existed when the broker started
+        await self._started.wait()
+
+        last_seq = self._seq
+        reset = False
+        if last_event_id:
+            name, _, seq = last_event_id.rpartition("-")
+            # The buffer holds every event after `floor`
+            floor = self._buffer[0].seq - 1 if self._buffer else self._seq
+            if name == self.name and seq.isdigit() and floor <= int(seq) <= self._seq:
+                last_seq = int(seq)
+            else:
+                reset = True
+
+        # No await between taking the replay and registering, so nothing is
+        # missed or delivered twice
+        subscription = Subscription(self, last_seq, topics, keys, self.buffer_size)
+        replay = [event for event in self._buffer if subscription.wants(event)]
+        self._subscribers.add(subscription)
+        return subscription, replay, reset
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            # Fresh context: the loop outlives the request that started it and
+            # must not count its queries against that request's metrics
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self) -> None:
+        while True:
+            await self.poll()
+            # Clients wait for the first poll only, even if some feeds failed
+            self._started.set()
+
+            await asyncio.sleep(self.poll_seconds)
+            if not self._subscribers:
+                # Idle: the next client starts from the rows existing then
+                # (clients resuming from before the gap get a reset)
+                self._state = self._fresh_state()
+                self._buffer.clear()
+                self._started.clear()
+                self._task = None
+                return
+
+    def _fresh_state(self) -> Dict[str, _FeedState]:
+        return {feed.name: _FeedState() for feed in self.feeds}
+
+    async def poll(self) -> None:
+        """Read every feed's overlap window and publish the rows not seen yet"""
+        await asyncio.gather(*(
+            self._poll_feed(feed, self._state[feed.name]) for feed in self.feeds
+        ))
+
+    async def _poll_feed(self, feed: Feed, state: _FeedState) -> None:
+        """
+        Poll one feed. A failing feed (e.g. its table does not exist) is
+        logged and retried on the next poll; the other feeds are unaffected.
+        """
+        try:
+            if not state.primed:
+                await self._prime(feed, state)
+            else:
+                rows = await self._read(feed, state)
+                if rows:
+                    events = await feed.events(rows)
+                    self._mark(state, rows)
+                    for event in events:
+                        self.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if not state.failing:
+                logger.exception("Event feed %s failed; retrying on every poll", feed.name)
+            state.failing = True
+        else:
+            if state.failing:
+                logger.info("Event feed %s recovered", feed.name)
+            state.failing = False
+
+    async def _prime(self, feed: Feed, state: _FeedState) -> None:
+        """Mark the feed's rows existing now as seen, without publishing them"""
+        created_at = await feed.newest()
+        if created_at is not None:
+            state.newest = datetime.fromisoformat(created_at)
+            self._mark(state, await self._read(feed, state))
+        state.primed = True
+
+    async def _read(self, feed: Feed, state: _FeedState) -> List[Dict[str, Any]]:
+        """Rows of the feed's overlap window not seen yet"""
+        since = None
+        if state.newest is not None:
+            since = (state.newest - self.overlap).isoformat()
+
+        new_rows = []
+        after = None
+        while True:
+            # Keyset pages, so a busy window cannot exceed one query's limit
+            rows = await feed.rows(since, after, self.batch_size)
+            new_rows.extend(row for row in rows if row["id"] not in state.seen)
+            if len(rows) < self.batch_size:
+                break
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+        return new_rows
+
+    def _mark(self, state: _FeedState, rows: List[Dict[str, Any]]) -> None:
+        """Record rows as published (after their events were built)"""
+        if not rows:
+            return
+        for row in rows:
+            created_at = datetime.fromisoformat(row["created_at"])
+            state.seen[row["id"]] = created_at
+            if state.newest is None or created_at > state.newest:
+                state.newest = created_at
+
+        # Ids older than the next window are never read again
+        horizon = state.newest - self.overlap
+        state.seen = {
+            row_id: created_at for row_id, created_at in state.seen.items()
+            if created_at >= horizon
+        }
+
+    def publish(self, event: Event) -> None:
+        self._seq += 1
+        event.seq = self._seq
+        self._buffer.append(event)
+        if len(self._buffer) > self.buffer_size:
+            self._buffer.popleft()
+        for subscription in list(self._subscribers):
+            if subscription.wants(event):
+                subscription.deliver(event)
+
+    async def close(self) -> None:
+        """Stop the poll loop (shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
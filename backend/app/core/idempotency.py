@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from app.core.config import settings
+from app.core.db import get_db, DatabaseError, DatabaseTimeout
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """
+    Exactly-once execution of write requests carrying an Idempotency-Key.
+
+    The key and the response are stored in idempotency_keys (migration 017)
+    for IDEMPOTENCY_TTL_SECONDS. A repeat of a completed request replays the
+    stored response. A duplicate arriving while the first attempt is still
+    running waits for it: in-process duplicates share the first attempt's
+    result directly, duplicates on other workers poll the key.
+
+    Only successful responses are stored. An attempt that certainly did not
+    commit (rejected by validation or by the database) releases its key, so
+    the retry executes again. An attempt that may have committed (timeout,
+    cancellation, lost connection) keeps its key claimed: handlers record
+    the id of what they created on the key in their own transaction
+    (result_ref, e.g. create_sale's p_idempotency_key), so a retry replays
+    that result through `recover`, and only a key whose lease expired
+    without a result_ref is executed again.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        payload: Any,
+        handler: Callable[[], Awaitable[Any]],
+        recover: Optional[Callable[[str], Awaitable[Any]]] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Execute `handler` at most once per (scope, key).
+
+        Args:
+            scope: Endpoint family sharing the key space, e.g. "sales"
+            key: Idempotency-Key header value, or None to execute normally
+            payload: Request body; a reused key must come with the same body
+            handler: Executes the request and returns the response body
+            recover: Rebuilds the response body from the result_ref an
+                     attempt committed without storing its response
+
+        Returns:
+            (response, replayed)
+        """
+        db = get_db()
+        if not key or db is None:
+            return await handler(), False
+
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        request_hash = hashlib.sha256(
+            json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")).encode()
+        ).hexdigest()
+
+        # Duplicate of an attempt running in this process: share its outcome
+        inflight = self._inflight.get((scope, key))
+        if inflight is not None:
+            inflight_hash, future = inflight
+            if inflight_hash != request_hash:
+                raise self._mismatch()
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(scope, key)] = (request_hash, future)
+        try:
+            result = await self._run_claimed(db, scope, key, request_hash, handler, recover)
+            future.set_result(result[0])
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here so an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            del self._inflight[(scope, key)]
+
+    async def _run_claimed(self, db, scope: str, key: str, request_hash: str, handler, recover) -> Tuple[Any, bool]:
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+
+        while True:
+            response = await db.rpc("claim_idempotency_key", {
+                "p_scope": scope,
+                "p_key": key,
+                "p_request_hash": request_hash,
+                "p_ttl_seconds": settings.IDEMPOTENCY_TTL_SECONDS,
+                "p_lease_seconds": settings.IDEMPOTENCY_LEASE_SECONDS
+            }).execute()
+            claim = response.data
+
+            if claim["state"] == "claimed":
+                break
+            if claim["state"] == "completed":
+                return claim["response"], True
+            if claim["state"] == "committed" and recover is not None:
+                # An earlier attempt committed but its response was lost
+                result = await recover(claim["result_ref"])
+                await self._complete(db, scope, key, result)
+                return result, True
+            if claim["state"] == "mismatch":
+                raise self._mismatch()
+
+            # In progress on another worker
+            if time.monotonic() + delay > deadline:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress. Please retry."
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        try:
+            result = await handler()
+        except BaseException as e:
+            if self._definitely_failed(e):
+                await self._release(db, scope, key)
+            raise
+
+        await self._complete(db, scope, key, result)
+        return result, False
+
+    @staticmethod
+    def _definitely_failed(error: BaseException) -> bool:
+        """
+        The attempt did not commit: rejected with a client error, or by the
+        database with an error code (the statement rolled back). Timeouts,
+        cancellation and errors without a code may have committed.
+        """
+        if isinstance(error, HTTPException) and error.status_code < 500:
+            return True
+        # Services re-raise database errors as HTTPException
+        for candidate in (error, error.__cause__ or error.__context__):
+            if isinstance(candidate, DatabaseError) and not isinstance(candidate, DatabaseTimeout):
+                return candidate.code is not None
+        return False
+
+    @staticmethod
+    async def _complete(db, scope: str, key: str, result: Any) -> None:
+        try:
+            await db.rpc("complete_idempotency_key", {
+                "p_scope": scope,
+                "p_key": key,
+                "p_status_code": 200,
+                "p_response": jsonable_encoder(result)
+            }).execute()
+        except Exception:
+            # The request succeeded; answer it even if the response could not
+            # be stored. A retry finds the result_ref written with the result
+            # and replays it through `recover`.
+            pass
+
+    @staticmethod
+    async def _release(db, scope: str, key: str) -> None:
+        try:
+            await db.rpc("release_idempotency_key", {"p_scope": scope, "p_key": key}).execute()
+        except Exception:
+            # The lease expires on its own; keep the original error
+            pass
+
+    @staticmethod
+    def _mismatch() -> HTTPException:
+        return HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request body"
+        )
+
+
+# Shared by every endpoint that accepts Idempotency-Key
+idempotency = IdempotencyStore()
@@ -0,0 +1,191 @@
+"""
+Request and database metrics.
+
+- Database.run reports every query and RPC to record_query(): per-table
+  latency histograms, and per-request call counts via a context variable
+- MetricsMiddleware times each request, adds a Server-Timing header
+  (database time and query count, total handler time) and records
+  handler latency and queries per request by route template
+- ShardedLock counts acquisitions that had to wait (app/utils/locks.py)
+- GET /metrics renders everything in the Prometheus text format
+
+Everything is in-process and per worker: recording is a few dictionary
+updates on the event loop thread, cheap enough to leave on in production.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Prometheus histogram with a fixed label set"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Prometheus counter with a fixed label set"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, label_values: Tuple[str, ...], value: float = 1) -> None:
+        self._series[label_values] = self._series.get(label_values, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value:g}")
+        return lines
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request handler latency by route",
+    ("method", "route", "status"), LATENCY_BUCKETS
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "Database round trips per request by route",
+    ("method", "route"), QUERY_COUNT_BUCKETS
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Database query latency by table (or RPC function) and action",
+    ("table", "action"), LATENCY_BUCKETS
+)
+db_query_errors = Counter(
+    "db_query_errors_total", "Failed database queries by table (or RPC function) and action",
+    ("table", "action")
+)
+lock_waits = Counter(
+    "lock_waits_total", "Acquisitions of an in-process sharded lock that had to wait, by lock",
+    ("lock",)
+)
+
+REGISTRY = (http_request_duration, http_request_db_queries, db_query_duration, db_query_errors, lock_waits)
+
+
+class RequestStats:
+    """Database usage of the current request"""
+    __slots__ = ("db_calls", "db_seconds")
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+
+
+# Shared (not copied) by the tasks a request spawns with asyncio.gather
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Database usage of the request being handled, or None outside a request"""
+    return _request_stats.get()
+
+
+def record_query(table: str, action: str, seconds: float, failed: bool = False) -> None:
+    """Record one database round trip (called by Database.run)"""
+    db_query_duration.observe((table, action), seconds)
+    if failed:
+        db_query_errors.inc((table, action))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_calls += 1
+        stats.db_seconds += seconds
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording handler latency and database usage per request.
+
+    Routes are labelled with their path template (/api/sales/{bill_id}), so
+    the number of series stays bounded. The Server-Timing header reflects
+    the work done before the response starts; for streamed responses the
+    histograms also include the time spent streaming.
+    """
+
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;desc="{stats.db_calls} queries";dur={stats.db_seconds * 1000:.1f}, app;dur={elapsed_ms:.1f}'.encode()
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe((method, route_label, str(status)), time.perf_counter() - started)
+            http_request_db_queries.observe((method, route_label), stats.db_calls)
@@ -0,0 +1,164 @@
+"""
+N+1 and slow-query detector (opt-in, QUERY_DETECTOR_ENABLED).
+
+Every query run inside an audit (one per request, see
+QueryDetectorMiddleware) is fingerprinted by its shape: table or RPC
+function, action, columns, filter operators and columns, ordering. Values
+are ignored, so a loop fetching items bill by bill produces one
+fingerprint repeated once per bill. When a fingerprint repeats more than
+QUERY_REPEAT_THRESHOLD times in one request, or a query takes longer than
+SLOW_QUERY_MS, a warning is logged with the service method that built
+the query.
+
+Queries repeated on purpose, whose count does not depend on the data
+(reconciliation shards) or that page through it (scan_pages), are marked
+with expect_repeats() and left out of the repeat check.
+
+With QUERY_DETECTOR_STRICT the repeat check raises QueryBudgetExceeded
+instead, so CI runs fail on the first N+1 loop. benchmarks/services.py
+audits every call the same way and can also fail when round trips grow
+with data size (--check-scaling).
+"""
+import logging
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a query shape repeats past the threshold"""
+
+
+class QueryAudit:
+    """Query shapes seen during one request (or benchmark call)"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.queries = 0
+        self.fingerprints: Dict[Tuple, int] = {}
+        self.repeated: List[Dict[str, Any]] = []
+        self.slow: List[Dict[str, Any]] = []
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.fingerprints.values(), default=0)
+
+
+_audit: ContextVar[Optional[QueryAudit]] = ContextVar("query_audit", default=None)
+
+
+@contextmanager
+def audit_queries(label: str) -> Iterator[QueryAudit]:
+    """Collect the queries run inside the block (including spawned tasks)"""
+    audit = QueryAudit(label)
+    token = _audit.set(audit)
+    try:
+        yield audit
+    finally:
+        _audit.reset(token)
+
+
+def enabled() -> bool:
+    return settings.QUERY_DETECTOR_ENABLED
+
+
+def calling_method() -> Optional[str]:
+    """
+    The first app.modules function up the stack, e.g.
+    "app.modules.sales.service:SalesService.get_sales:62".
+
+    Called when a query is built (db.table() / db.rpc()), where the service
+    method is still on the stack; by the time a query gathered into its own
+    task runs, it is not.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.modules."):
+            return f"{module}:{frame.f_code.co_qualname}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+def fingerprint(query: Any) -> Tuple:
+    """Shape of a query or RPC call, without its values"""
+    function = getattr(query, "function", None)
+    if function is not None:
+        return ("rpc", function, tuple(sorted(query.params)))
+    return (
+        query.table,
+        query.action,
+        query.columns,
+        tuple(sorted((op, column) for op, column, _ in query.filters)),
+        tuple(query.orders),
+        query.keyset[0] if query.keyset else None
+    )
+
+
+def describe(shape: Tuple) -> str:
+    if shape[0] == "rpc":
+        return f"rpc {shape[1]}({', '.join(shape[2])})"
+    table, action, columns, filters, orders, keyset = shape
+    text = f"{action} {columns} from {table}"
+    if filters:
+        text += " where " + " and ".join(f"{column} {op}" for op, column in filters)
+    if keyset:
+        text += f" after ({', '.join(keyset)})"
+    if orders:
+        text += " order by " + ", ".join(f"{column}{' desc' if desc else ''}" for column, desc in orders)
+    return text
+
+
+def observe(query: Any, seconds: float, caller: Optional[str]) -> None:
+    """Check one executed query (called by Database.run when enabled)"""
+    elapsed_ms = seconds * 1000
+    audit = _audit.get()
+
+    if elapsed_ms > settings.SLOW_QUERY_MS:
+        shape = fingerprint(query)
+        logger.warning(
+            "Slow query (%.1f ms > %.0f ms): %s, from %s%s",
+            elapsed_ms, settings.SLOW_QUERY_MS, describe(shape), caller or "unknown caller",
+            f" in {audit.label}" if audit else ""
+        )
+        if audit is not None:
+            audit.slow.append({"query": describe(shape), "ms": round(elapsed_ms, 1), "caller": caller})
+
+    if audit is None:
+        return
+
+    audit.queries += 1
+    if query.repeats_expected:
+        return
+    shape = fingerprint(query)
+    count = audit.fingerprints.get(shape, 0) + 1
+    audit.fingerprints[shape] = count
+
+    # Report each shape once, when it first crosses the threshold
+    if count == settings.QUERY_REPEAT_THRESHOLD + 1:
+        message = (
+            f"Possible N+1: {describe(shape)} repeated more than "
+            f"{settings.QUERY_REPEAT_THRESHOLD} times in {audit.label}, from {caller or 'unknown caller'}"
+        )
+        audit.repeated.append({"query": describe(shape), "caller": caller})
+        if settings.QUERY_DETECTOR_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryDetectorMiddleware:
+    """ASGI middleware running each request inside its own query audit"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with audit_queries(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
@@ -0,0 +1,1022 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from app.core.config import settings
+from app.core.db import DatabaseError, Query, QueryResult, RpcCall
+
+# Schema equivalent to the Postgres migrations (001-026) for the tables,
+# views and triggers the services use. NUMERIC columns are REAL so values
+# come back as numbers, as they do through PostgREST.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    sku TEXT UNIQUE NOT NULL,
+    barcode TEXT UNIQUE,
+    unit TEXT NOT NULL CHECK (unit IN ('piece', 'kg', 'liter', 'gram', 'pack')),
+    mrp REAL CHECK (mrp >= 0),
+    selling_price REAL NOT NULL CHECK (selling_price >= 0),
+    tax_rate REAL DEFAULT 0 CHECK (tax_rate >= 0 AND tax_rate <= 100),
+    created_at TEXT NOT NULL,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name, id);
+
+CREATE TABLE IF NOT EXISTS inventory_ledger (
+    id TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE RESTRICT,
+    qty_delta REAL NOT NULL,
+    reason TEXT NOT NULL CHECK (reason IN ('PURCHASE', 'SALE', 'ADJUSTMENT', 'RETURN')),
+    reference_id TEXT,
+    created_at TEXT NOT NULL,
+    notes TEXT,
+    supplier_ref TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_product_created_at ON inventory_ledger(product_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_reference_id ON inventory_ledger(reference_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_created_at ON inventory_ledger(created_at);
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_created_at_id ON inventory_ledger(created_at, id);
+
+CREATE TABLE IF NOT EXISTS inventory_balance (
+    product_id TEXT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    qty_on_hand REAL NOT NULL DEFAULT 0 CHECK (qty_on_hand >= 0),
+    last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_balance_qty ON inventory_balance(qty_on_hand);
+
+CREATE TABLE IF NOT EXISTS sales_bill (
+    id TEXT PRIMARY KEY,
+    bill_number TEXT UNIQUE NOT NULL,
+    subtotal REAL NOT NULL CHECK (subtotal >= 0),
+    tax_amount REAL NOT NULL CHECK (tax_amount >= 0),
+    total REAL NOT NULL CHECK (total >= 0),
+    payment_mode TEXT NOT NULL CHECK (payment_mode IN ('cash', 'upi', 'card')),
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sales_bill_created_at ON sales_bill(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_sales_bill_payment_mode_created_at ON sales_bill(payment_mode, created_at, id);
+
+CREATE TABLE IF NOT EXISTS sales_bill_items (
+    id TEXT PRIMARY KEY,
+    bill_id TEXT NOT NULL REFERENCES sales_bill(id) ON DELETE CASCADE,
+    product_id TEXT REFERENCES products(id),
+    product_name TEXT NOT NULL,
+    unit_price REAL NOT NULL CHECK (unit_price >= 0),
+    quantity REAL NOT NULL CHECK (quantity > 0),
+    tax_rate REAL NOT NULL CHECK (tax_rate >= 0 AND tax_rate <= 100),
+    line_total REAL NOT NULL CHECK (line_total >= 0),
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sales_bill_items_bill_id ON sales_bill_items(bill_id);
+CREATE INDEX IF NOT EXISTS idx_sales_bill_items_product_id ON sales_bill_items(product_id);
+CREATE INDEX IF NOT EXISTS idx_sales_bill_items_created_at ON sales_bill_items(created_at, id);
+
+CREATE TABLE IF NOT EXISTS bill_number_counter (
+    bill_date TEXT PRIMARY KEY,
+    next_value INTEGER NOT NULL CHECK (next_value >= 1)
+);
+
+CREATE TABLE IF NOT EXISTS barcode_counter (
+    prefix TEXT PRIMARY KEY,
+    next_value INTEGER NOT NULL CHECK (next_value >= 1)
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_payment (
+    store_id TEXT NOT NULL DEFAULT 'default',
+    sale_date TEXT NOT NULL,
+    sale_hour INTEGER NOT NULL CHECK (sale_hour >= 0 AND sale_hour <= 23),
+    payment_mode TEXT NOT NULL,
+    bill_count INTEGER NOT NULL DEFAULT 0,
+    subtotal REAL NOT NULL DEFAULT 0,
+    tax_amount REAL NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, sale_date, sale_hour, payment_mode)
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_category (
+    store_id TEXT NOT NULL DEFAULT 'default',
+    sale_date TEXT NOT NULL,
+    sale_hour INTEGER NOT NULL CHECK (sale_hour >= 0 AND sale_hour <= 23),
+    category TEXT NOT NULL,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    quantity REAL NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, sale_date, sale_hour, category)
+);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'in_progress' CHECK (status IN ('in_progress', 'completed')),
+    status_code INTEGER,
+    response JSONB,
+    locked_until TEXT,
+    result_ref TEXT,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT,
+    title TEXT,
+    message TEXT,
+    unread BOOLEAN NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at_id ON notifications(created_at, id);
+
+CREATE TABLE IF NOT EXISTS inventory_reconciliation_runs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    shards INTEGER NOT NULL CHECK (shards >= 1 AND shards <= 64),
+    repair BOOLEAN NOT NULL DEFAULT 0,
+    to_created_at TEXT,
+    to_id TEXT,
+    shards_completed INTEGER NOT NULL DEFAULT 0,
+    ledger_rows INTEGER NOT NULL DEFAULT 0,
+    discrepancies INTEGER NOT NULL DEFAULT 0,
+    repaired INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT,
+    finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS inventory_reconciliation_discrepancies (
+    run_id TEXT NOT NULL REFERENCES inventory_reconciliation_runs(id) ON DELETE CASCADE,
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    balance_qty REAL NOT NULL,
+    ledger_qty REAL NOT NULL,
+    repaired BOOLEAN NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+-- Timezone the rollups were built with; store_local_time() itself uses
+-- STORE_TIMEZONE directly
+CREATE TABLE IF NOT EXISTS store_settings (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    timezone TEXT NOT NULL
+);
+
+-- Views
+CREATE VIEW IF NOT EXISTS product_catalog AS
+SELECT
+    p.id, p.name, p.sku, p.barcode, p.unit, p.mrp, p.selling_price, p.tax_rate, p.created_at,
+    COALESCE(b.qty_on_hand, 0) AS qty_on_hand,
+    p.category
+FROM products p
+LEFT JOIN inventory_balance b ON b.product_id = p.id;
+
+CREATE VIEW IF NOT EXISTS sales_bill_summary AS
+SELECT
+    b.id, b.bill_number, b.subtotal, b.tax_amount, b.total, b.payment_mode, b.created_at,
+    (SELECT COUNT(*) FROM sales_bill_items i WHERE i.bill_id = b.id) AS item_count
+FROM sales_bill b;
+
+CREATE VIEW IF NOT EXISTS analytics_bill_facts AS
+SELECT
+    b.id,
+    b.created_at,
+    substr(store_local_time(b.created_at), 1, 10) AS sale_date,
+    CAST(substr(store_local_time(b.created_at), 12, 2) AS INTEGER) AS sale_hour,
+    b.payment_mode,
+    b.total,
+    (SELECT COUNT(*) FROM sales_bill_items i WHERE i.bill_id = b.id) AS item_count
+FROM sales_bill b;
+
+CREATE VIEW IF NOT EXISTS analytics_item_facts AS
+SELECT i.id, i.created_at, i.product_id, i.product_name, i.quantity, i.line_total
+FROM sales_bill_items i;
+
+CREATE VIEW IF NOT EXISTS sales_report_lines AS
+SELECT
+    i.id, i.created_at, i.bill_id, b.bill_number, b.payment_mode, i.product_id, i.product_name,
+    i.quantity, i.unit_price, i.tax_rate, i.line_total
+FROM sales_bill_items i
+JOIN sales_bill b ON b.id = i.bill_id;
+
+-- Ledger -> balance (the only way stock changes)
+CREATE TRIGGER IF NOT EXISTS update_balance_on_ledger_insert
+AFTER INSERT ON inventory_ledger
+BEGIN
+    -- Update first: SQLite checks CHECK constraints on the VALUES row before
+    -- ON CONFLICT, so an upsert of a negative delta would always fail
+    UPDATE inventory_balance
+    SET qty_on_hand = ROUND(qty_on_hand + NEW.qty_delta, 6), last_updated = NEW.created_at
+    WHERE product_id = NEW.product_id;
+    INSERT INTO inventory_balance (product_id, qty_on_hand, last_updated)
+    SELECT NEW.product_id, NEW.qty_delta, NEW.created_at
+    WHERE NOT EXISTS (SELECT 1 FROM inventory_balance WHERE product_id = NEW.product_id);
+END;
+
+-- Immutability
+CREATE TRIGGER IF NOT EXISTS prevent_inventory_ledger_update BEFORE UPDATE ON inventory_ledger
+BEGIN SELECT RAISE(ABORT, 'inventory_ledger is immutable. Updates and deletes are not allowed.'); END;
+CREATE TRIGGER IF NOT EXISTS prevent_inventory_ledger_delete BEFORE DELETE ON inventory_ledger
+BEGIN SELECT RAISE(ABORT, 'inventory_ledger is immutable. Updates and deletes are not allowed.'); END;
+CREATE TRIGGER IF NOT EXISTS prevent_sales_bill_update BEFORE UPDATE ON sales_bill
+BEGIN SELECT RAISE(ABORT, 'sales_bill is immutable. Updates and deletes are not allowed.'); END;
+CREATE TRIGGER IF NOT EXISTS prevent_sales_bill_delete BEFORE DELETE ON sales_bill
+BEGIN SELECT RAISE(ABORT, 'sales_bill is immutable. Updates and deletes are not allowed.'); END;
+CREATE TRIGGER IF NOT EXISTS prevent_sales_bill_items_update BEFORE UPDATE ON sales_bill_items
+BEGIN SELECT RAISE(ABORT, 'sales_bill is immutable. Updates and deletes are not allowed.'); END;
+CREATE TRIGGER IF NOT EXISTS prevent_sales_bill_items_delete BEFORE DELETE ON sales_bill_items
+BEGIN SELECT RAISE(ABORT, 'sales_bill is immutable. Updates and deletes are not allowed.'); END;
+
+-- Catalog version (ETags)
+CREATE TRIGGER IF NOT EXISTS bump_catalog_version_products_insert AFTER INSERT ON products
+BEGIN UPDATE catalog_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS bump_catalog_version_products_update AFTER UPDATE ON products
+BEGIN UPDATE catalog_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS bump_catalog_version_ledger AFTER INSERT ON inventory_ledger
+BEGIN UPDATE catalog_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS bump_catalog_version_balance AFTER UPDATE ON inventory_balance
+BEGIN UPDATE catalog_version SET version = version + 1; END;
+"""
+
+def inventory_bucket(product_id: Optional[str]) -> Optional[int]:
+    """Product bucket (0..63) used to shard reconciliation runs"""
+    if product_id is None:
+        return None
+    return zlib.crc32(product_id.encode()) & 63
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE"}
+
+
+def utc_timestamp(value: Optional[datetime] = None) -> str:
+    """Stored timestamp format: UTC with millisecond precision, so text order is time order"""
+    value = (value or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}+00:00"
+
+
+def _ident(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise DatabaseError(f"Invalid identifier: {name}", code="42601")
+    return f'"{name}"'
+
+
+class SQLiteBackend:
+    """
+    Local stand-in for the Supabase backend, on SQLite.
+
+    Implements the query builder and the RPCs the services call with the
+    same semantics as the Postgres schema: triggers keep inventory_balance
+    and the sales rollups in sync with inserts, the ledger and bills are
+    immutable, and business errors raise DatabaseError with the same RBnnn
+    codes. Each query or RPC runs in its own transaction on a single
+    connection, in a worker thread so the event loop is not blocked.
+
+    Used as the embedded engine of single-counter stores (DB_ENGINE=sqlite,
+    a file on the shop PC) and by the benchmarks (":memory:").
+    """
+
+    def __init__(self, path: str = ":memory:", wal: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._tz = ZoneInfo(settings.STORE_TIMEZONE)
+        self.conn.create_function("store_local_time", 1, self._store_local_time, deterministic=True)
+        self.conn.create_function("inventory_bucket", 1, inventory_bucket, deterministic=True)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA busy_timeout = 5000")
+        if wal and path != ":memory:":
+            # WAL lets backups and other readers open the file while the API
+            # writes; FULL keeps a committed sale across a power cut
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = FULL")
+        self.conn.executescript(SCHEMA)
+        self._upgrade()
+        self._column_types: Dict[str, Dict[str, str]] = {}
+
+    def _upgrade(self) -> None:
+        """Changes made after a store's database file was created"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(idempotency_keys)")}
+        if "result_ref" not in columns:
+            self.conn.execute("ALTER TABLE idempotency_keys ADD COLUMN result_ref TEXT")
+        # Rollups are written by create_sale (migration 026), not per row
+        self.conn.execute("DROP TRIGGER IF EXISTS rollup_on_sales_bill_insert")
+        self.conn.execute("DROP TRIGGER IF EXISTS rollup_on_sales_bill_item_insert")
+
+    def _store_local_time(self, ts: Optional[str]) -> Optional[str]:
+        if ts is None:
+            return None
+        return datetime.fromisoformat(ts).astimezone(self._tz).strftime("%Y-%m-%d %H:%M:%S")
+
+    # -- execution -------------------------------------------------------
+
+    async def execute(self, query: Any) -> QueryResult:
+        return await asyncio.to_thread(self._execute_sync, query)
+
+    def _execute_sync(self, query: Any) -> QueryResult:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE" if self._writes(query) else "BEGIN")
+            try:
+                if isinstance(query, RpcCall):
+                    handler = getattr(self, f"_rpc_{query.function}", None)
+                    if handler is None:
+                        raise DatabaseError(
+                            f"Could not find the function {query.function} in the SQLite backend",
+                            code="PGRST202"
+                        )
+                    result = QueryResult(data=handler(**query.params))
+                else:
+                    result = self._run_query(query)
+                self.conn.execute("COMMIT")
+                return result
+            except sqlite3.Error as e:
+                self.conn.execute("ROLLBACK")
+                raise self._error(e)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _writes(query: Any) -> bool:
+        return isinstance(query, RpcCall) or query.action != "select"
+
+    @staticmethod
+    def _error(error: sqlite3.Error) -> DatabaseError:
+        message = str(error)
+        code = None
+        if isinstance(error, sqlite3.IntegrityError):
+            if message.startswith("UNIQUE"):
+                code = "23505"
+            elif message.startswith("CHECK"):
+                code = "23514"
+            elif message.startswith("FOREIGN KEY"):
+                code = "23503"
+            elif message.startswith("NOT NULL"):
+                code = "23502"
+            else:
+                code = "P0001"  # RAISE(ABORT) from a trigger
+        return DatabaseError(message, code=code)
+
+    def _fetch(self, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute(sql, params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        return self._convert(table, rows)
+
+    def _types(self, table: str) -> Dict[str, str]:
+        types = self._column_types.get(table)
+        if types is None:
+            types = {
+                row["name"]: (row["type"] or "").upper()
+                for row in self.conn.execute(f"PRAGMA table_info({_ident(table)})")
+            }
+            self._column_types[table] = types
+        return types
+
+    def _convert(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Restore BOOLEAN and JSONB values, which SQLite stores as 0/1 and text"""
+        types = self._types(table)
+        booleans = [c for c, t in types.items() if t == "BOOLEAN"]
+        documents = [c for c, t in types.items() if t == "JSONB"]
+        if booleans or documents:
+            for row in rows:
+                for column in booleans:
+                    if row.get(column) is not None:
+                        row[column] = bool(row[column])
+                for column in documents:
+                    if isinstance(row.get(column), str):
+                        row[column] = json.loads(row[column])
+        return rows
+
+    @staticmethod
+    def _value(value: Any) -> Any:
+        """Python value -> SQLite parameter (timestamps normalized to stored UTC format)"""
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            return utc_timestamp(value)
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, str) and _TIMESTAMP.match(value) and ("+" in value[10:] or value.endswith("Z") or "-" in value[10:]):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                return value
+            if parsed.tzinfo is not None:
+                return utc_timestamp(parsed)
+        return value
+
+    # -- table queries ---------------------------------------------------
+
+    def _run_query(self, query: Query) -> QueryResult:
+        table = _ident(query.table)
+        where, params = self._where(query)
+
+        if query.action == "select":
+            columns = "*" if query.columns.strip() == "*" else ", ".join(
+                _ident(column.strip()) for column in query.columns.split(",")
+            )
+            sql = f"SELECT {columns} FROM {table}{where}"
+            if query.orders:
+                sql += " ORDER BY " + ", ".join(
+                    f"{_ident(column)} {'DESC' if desc else 'ASC'}" for column, desc in query.orders
+                )
+            if query.row_limit is not None:
+                sql += f" LIMIT {int(query.row_limit)}"
+            rows = self._fetch(query.table, sql, params)
+            count = None
+            if query.count:
+                count = self.conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+            return QueryResult(data=rows, count=count)
+
+        if query.action in ("insert", "upsert"):
+            payload = query.payload if isinstance(query.payload, list) else [query.payload]
+            types = self._types(query.table)
+            conflict = [c.strip() for c in (query.on_conflict or "").split(",") if c.strip()]
+            created = []
+            for row in payload:
+                row = dict(row)
+                if "id" in types and types["id"] == "TEXT" and not row.get("id"):
+                    row["id"] = str(uuid.uuid4())
+                if "created_at" in types and not row.get("created_at"):
+                    row["created_at"] = utc_timestamp()
+                columns = list(row.keys())
+                sql = (
+                    f"INSERT INTO {table} ({', '.join(_ident(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})"
+                )
+                if query.action == "upsert":
+                    target = conflict or self._primary_key(query.table)
+                    updates = [c for c in columns if c not in target]
+                    sql += f" ON CONFLICT ({', '.join(_ident(c) for c in target)}) DO " + (
+                        "UPDATE SET " + ", ".join(f"{_ident(c)} = excluded.{_ident(c)}" for c in updates)
+                        if updates else "NOTHING"
+                    )
+                created.extend(self._fetch(query.table, sql + " RETURNING *", [self._value(row[c]) for c in columns]))
+            return QueryResult(data=created)
+
+        if query.action == "update":
+            columns = list(query.payload.keys())
+            sql = f"UPDATE {table} SET {', '.join(f'{_ident(c)} = ?' for c in columns)}{where} RETURNING *"
+            return QueryResult(data=self._fetch(query.table, sql, [self._value(query.payload[c]) for c in columns] + params))
+
+        if query.action == "delete":
+            return QueryResult(data=self._fetch(query.table, f"DELETE FROM {table}{where} RETURNING *", params))
+
+        raise DatabaseError(f"Unsupported action: {query.action}")
+
+    def _primary_key(self, table: str) -> List[str]:
+        rows = self.conn.execute(f"PRAGMA table_info({_ident(table)})").fetchall()
+        return [row["name"] for row in sorted(rows, key=lambda r: r["pk"]) if row["pk"]]
+
+    def _where(self, query: Query) -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        for op, column, value in query.filters:
+            if op in _OPERATORS:
+                if op == "like":
+                    value = value.replace("*", "%")
+                clauses.append(f"{_ident(column)} {_OPERATORS[op]} ?")
+                params.append(self._value(value))
+            elif op == "in_":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{_ident(column)} IN ({', '.join('?' for _ in value)})")
+                params.extend(self._value(v) for v in value)
+            elif op == "is_":
+                literal = {None: "NULL", "null": "NULL", True: "1", "true": "1", False: "0", "false": "0"}.get(value)
+                if literal is None:
+                    raise DatabaseError(f"Unsupported is_ value: {value}", code="22023")
+                clauses.append(f"{_ident(column)} IS {literal}")
+            else:
+                raise DatabaseError(f"Unsupported filter: {op}", code="42601")
+
+        if query.keyset is not None:
+            columns, values, desc = query.keyset
+            clauses.append(
+                f"({', '.join(_ident(c) for c in columns)}) {'<' if desc else '>'} ({', '.join('?' for _ in values)})"
+            )
+            params.extend(self._value(v) for v in values)
+
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    # -- RPCs (same contracts as the SQL functions in app/migrations) ----
+
+    def _rpc_create_sale(self, p_bill_number: str, p_payment_mode: str, p_items: List[Dict[str, Any]],
+                         p_idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        if p_payment_mode not in ("cash", "upi", "card"):
+            raise DatabaseError("payment_mode must be one of: cash, upi, card", code="RB400")
+        if not p_items:
+            raise DatabaseError("Sale must have at least one item", code="RB400")
+        if any(not item.get("product_id") or item.get("quantity") is None or item["quantity"] <= 0 for item in p_items):
+            raise DatabaseError("product_id and a positive quantity are required for all items", code="RB400")
+
+        # The write transaction (BEGIN IMMEDIATE) already serializes sales
+        product_ids = sorted({item["product_id"] for item in p_items})
+        products = {
+            row["id"]: row for row in self.conn.execute(
+                f"SELECT p.id, p.name, p.selling_price, p.tax_rate, COALESCE(b.qty_on_hand, 0) AS qty_on_hand "
+                f"FROM products p LEFT JOIN inventory_balance b ON b.product_id = p.id "
+                f"WHERE p.id IN ({', '.join('?' for _ in product_ids)})",
+                product_ids
+            )
+        }
+        for item in p_items:
+            if item["product_id"] not in products:
+                raise DatabaseError(f"Product {item['product_id']} not found", code="RB404")
+
+        requested: Dict[str, float] = {}
+        for item in p_items:
+            requested[item["product_id"]] = requested.get(item["product_id"], 0) + item["quantity"]
+        for product_id, quantity in requested.items():
+            product = products[product_id]
+            if product["qty_on_hand"] < quantity:
+                raise DatabaseError(
+                    f"Insufficient stock for {product['name']}. Available: {product['qty_on_hand']}, Requested: {quantity}",
+                    code="RB400"
+                )
+
+        lines = []
+        for item in p_items:
+            product = products[item["product_id"]]
+            tax_rate = product["tax_rate"] or 0
+            line_subtotal = product["selling_price"] * item["quantity"]
+            line_tax = line_subtotal * tax_rate / 100
+            lines.append((item, product, tax_rate, line_subtotal, line_tax))
+
+        now = utc_timestamp()
+        subtotal = round(sum(line[3] for line in lines), 2)
+        tax_amount = round(sum(line[4] for line in lines), 2)
+        bill = {
+            "id": str(uuid.uuid4()),
+            "bill_number": p_bill_number,
+            "subtotal": subtotal,
+            "tax_amount": tax_amount,
+            "total": round(sum(line[3] + line[4] for line in lines), 2),
+            "payment_mode": p_payment_mode,
+            "created_at": now
+        }
+        self.conn.execute(
+            "INSERT INTO sales_bill (id, bill_number, subtotal, tax_amount, total, payment_mode, created_at) "
+            "VALUES (:id, :bill_number, :subtotal, :tax_amount, :total, :payment_mode, :created_at)",
+            bill
+        )
+
+        items = []
+        for item, product, tax_rate, line_subtotal, line_tax in lines:
+            row = {
+                "id": str(uuid.uuid4()),
+                "bill_id": bill["id"],
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "unit_price": product["selling_price"],
+                "quantity": item["quantity"],
+                "tax_rate": tax_rate,
+                "line_total": round(line_subtotal + line_tax, 2),
+                "created_at": now
+            }
+            self.conn.execute(
+                "INSERT INTO sales_bill_items (id, bill_id, product_id, product_name, unit_price, quantity, tax_rate, line_total, created_at) "
+                "VALUES (:id, :bill_id, :product_id, :product_name, :unit_price, :quantity, :tax_rate, :line_total, :created_at)",
+                row
+            )
+            items.append(row)
+
+        # Stock is deducted by the ledger trigger
+        self.conn.executemany(
+            "INSERT INTO inventory_ledger (id, product_id, qty_delta, reason, reference_id, notes, created_at) "
+            "VALUES (?, ?, ?, 'SALE', ?, ?, ?)",
+            [
+                (str(uuid.uuid4()), item["product_id"], -item["quantity"], bill["id"], f"Sale: {p_bill_number}", now)
+                for item in p_items
+            ]
+        )
+
+        if p_idempotency_key is not None:
+            self.conn.execute(
+                "UPDATE idempotency_keys SET result_ref = ? WHERE scope = 'sales' AND key = ?",
+                (bill["id"], p_idempotency_key)
+            )
+
+        self._rollup_sale(bill["id"])
+        return {**bill, "items": items}
+
+    def _rollup_sale(self, bill_id: str) -> None:
+        """Add one bill to the sales rollups (rollup_sale, migration 026)"""
+        local = "store_local_time(b.created_at)"
+        self.conn.execute(
+            "INSERT INTO sales_rollup_payment (sale_date, sale_hour, payment_mode, bill_count, subtotal, tax_amount, total) "
+            f"SELECT substr({local}, 1, 10), CAST(substr({local}, 12, 2) AS INTEGER), b.payment_mode, 1, b.subtotal, b.tax_amount, b.total "
+            "FROM sales_bill b WHERE b.id = ? "
+            "ON CONFLICT (store_id, sale_date, sale_hour, payment_mode) DO UPDATE SET "
+            "bill_count = bill_count + 1, "
+            "subtotal = ROUND(subtotal + excluded.subtotal, 2), "
+            "tax_amount = ROUND(tax_amount + excluded.tax_amount, 2), "
+            "total = ROUND(total + excluded.total, 2)",
+            (bill_id,)
+        )
+        self.conn.execute(
+            "INSERT INTO sales_rollup_category (sale_date, sale_hour, category, line_count, quantity, revenue) "
+            f"SELECT substr({local}, 1, 10), CAST(substr({local}, 12, 2) AS INTEGER), COALESCE(p.category, 'Others') AS category, "
+            "COUNT(*), SUM(i.quantity), SUM(i.line_total) "
+            "FROM sales_bill_items i JOIN sales_bill b ON b.id = i.bill_id LEFT JOIN products p ON p.id = i.product_id "
+            "WHERE i.bill_id = ? GROUP BY category ORDER BY category "
+            "ON CONFLICT (store_id, sale_date, sale_hour, category) DO UPDATE SET "
+            "line_count = line_count + excluded.line_count, "
+            "quantity = ROUND(quantity + excluded.quantity, 6), "
+            "revenue = ROUND(revenue + excluded.revenue, 2)",
+            (bill_id,)
+        )
+
+    def _reserve(self, table: str, key_column: str, key: str, count: int, seed) -> int:
+        if count is None or count < 1:
+            raise DatabaseError("block size must be positive", code="RB400")
+        row = self.conn.execute(
+            f"UPDATE {table} SET next_value = next_value + ? WHERE {key_column} = ? RETURNING next_value - ?",
+            (count, key, count)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        start = seed()
+        self.conn.execute(f"INSERT INTO {table} ({key_column}, next_value) VALUES (?, ?)", (key, start + count))
+        return start
+
+    def _rpc_reserve_bill_numbers(self, p_bill_date: str, p_block_size: int) -> int:
+        def seed():
+            prefix = f"BILL-{p_bill_date.replace('-', '')}-"
+            numbers = [
+                int(row[0][len(prefix):])
+                for row in self.conn.execute(
+                    "SELECT bill_number FROM sales_bill WHERE bill_number LIKE ?", (prefix + "%",)
+                )
+                if row[0][len(prefix):].isdigit()
+            ]
+            return max(numbers, default=0) + 1
+        return self._reserve("bill_number_counter", "bill_date", p_bill_date, p_block_size, seed)
+
+    def _rpc_reserve_barcodes(self, p_prefix: str, p_block_size: int) -> int:
+        digits = 12 - len(p_prefix)
+
+        def seed():
+            values = [
+                int(row[0][len(p_prefix):12])
+                for row in self.conn.execute("SELECT barcode FROM products WHERE barcode LIKE ?", (p_prefix + "%",))
+                if len(row[0]) == 13 and row[0].isdigit()
+            ]
+            return max(values, default=0) + 1
+
+        start = self._reserve("barcode_counter", "prefix", p_prefix, p_block_size, seed)
+        if start + p_block_size - 1 >= 10 ** digits:
+            raise DatabaseError(f"Barcode range for prefix {p_prefix} is exhausted", code="RB409")
+        return start
+
+    def _rpc_inventory_stats(self, p_low_stock_threshold: float = 5) -> Dict[str, Any]:
+        row = self.conn.execute(
+            "SELECT COUNT(*), "
+            "COUNT(*) FILTER (WHERE qty_on_hand > 0), "
+            "COUNT(*) FILTER (WHERE qty_on_hand < ?), "
+            "ROUND(COALESCE(SUM(qty_on_hand * selling_price), 0), 2) "
+            "FROM product_catalog",
+            (p_low_stock_threshold,)
+        ).fetchone()
+        return {"products": row[0], "inStock": row[1], "lowStock": row[2], "stockValue": row[3]}
+
+    def _rpc_catalog_version(self) -> int:
+        return self.conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+    def _rpc_bulk_stock_in(self, p_items: List[Dict[str, Any]], p_reason: str = "PURCHASE",
+                           p_supplier_ref: Optional[str] = None, p_notes: Optional[str] = None) -> Dict[str, Any]:
+        if p_reason not in ("PURCHASE", "ADJUSTMENT", "RETURN"):
+            raise DatabaseError("reason must be one of: PURCHASE, ADJUSTMENT, RETURN", code="RB400")
+        if not p_items:
+            raise DatabaseError("Stock-in must have at least one item", code="RB400")
+        if any(not item.get("product_id") or item.get("quantity") is None or item["quantity"] <= 0 for item in p_items):
+            raise DatabaseError("product_id and a positive quantity are required for all items", code="RB400")
+
+        product_ids = sorted({item["product_id"] for item in p_items})
+        placeholders = ", ".join("?" for _ in product_ids)
+        found = {row[0] for row in self.conn.execute(f"SELECT id FROM products WHERE id IN ({placeholders})", product_ids)}
+        missing = [product_id for product_id in product_ids if product_id not in found]
+        if missing:
+            raise DatabaseError(f"Products not found: {', '.join(missing)}", code="RB404")
+
+        now = utc_timestamp()
+        self.conn.executemany(
+            "INSERT INTO inventory_ledger (id, product_id, qty_delta, reason, reference_id, notes, supplier_ref, created_at) "
+            "VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+            [
+                (str(uuid.uuid4()), item["product_id"], item["quantity"], p_reason,
+                 item.get("notes") or p_notes, p_supplier_ref, now)
+                for item in sorted(p_items, key=lambda item: item["product_id"])
+            ]
+        )
+        balances = [
+            {"product_id": row[0], "qty_on_hand": row[1]}
+            for row in self.conn.execute(
+                f"SELECT product_id, qty_on_hand FROM inventory_balance WHERE product_id IN ({placeholders}) ORDER BY product_id",
+                product_ids
+            )
+        ]
+        return {"supplier_ref": p_supplier_ref, "entries": len(p_items), "balances": balances}
+
+    def _rpc_find_existing_products(self, p_skus: List[str], p_barcodes: List[str]) -> Dict[str, Any]:
+        def existing(column: str, values: List[str]) -> List[str]:
+            if not values:
+                return []
+            return [
+                row[0] for row in self.conn.execute(
+                    f"SELECT {column} FROM products WHERE {column} IN ({', '.join('?' for _ in values)})", values
+                )
+            ]
+        return {"skus": existing("sku", p_skus), "barcodes": existing("barcode", p_barcodes)}
+
+    def _rpc_bulk_create_products(self, p_products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        created = []
+        now = utc_timestamp()
+        for product in p_products:
+            row = self.conn.execute(
+                "INSERT INTO products (id, name, sku, barcode, unit, mrp, selling_price, tax_rate, category, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING RETURNING id, sku, barcode",
+                (str(uuid.uuid4()), product["name"], product["sku"], product.get("barcode"), product["unit"],
+                 product.get("mrp"), product["selling_price"], product.get("tax_rate") or 0, product.get("category"), now)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "INSERT INTO inventory_balance (product_id, qty_on_hand, last_updated) VALUES (?, 0, ?) "
+                    "ON CONFLICT (product_id) DO NOTHING",
+                    (row[0], now)
+                )
+                created.append({"id": row[0], "sku": row[1], "barcode": row[2]})
+        return created
+
+    def _rpc_claim_idempotency_key(self, p_scope: str, p_key: str, p_request_hash: str,
+                                   p_ttl_seconds: int, p_lease_seconds: int) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        self.conn.execute(
+            "DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND expires_at < ?",
+            (p_scope, p_key, utc_timestamp(now))
+        )
+        inserted = self.conn.execute(
+            "INSERT INTO idempotency_keys (scope, key, request_hash, locked_until, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (scope, key) DO NOTHING RETURNING 1",
+            (p_scope, p_key, p_request_hash, utc_timestamp(now + timedelta(seconds=p_lease_seconds)),
+             utc_timestamp(now), utc_timestamp(now + timedelta(seconds=p_ttl_seconds)))
+        ).fetchone()
+        if inserted is not None:
+            return {"state": "claimed"}
+
+        row = self.conn.execute(
+            "SELECT * FROM idempotency_keys WHERE scope = ? AND key = ?", (p_scope, p_key)
+        ).fetchone()
+        if row["request_hash"] != p_request_hash:
+            return {"state": "mismatch"}
+        if row["status"] == "completed":
+            return {
+                "state": "completed",
+                "status_code": row["status_code"],
+                "response": json.loads(row["response"]) if row["response"] is not None else None
+            }
+        if row["result_ref"] is not None:
+            return {"state": "committed", "result_ref": row["result_ref"]}
+        if row["locked_until"] < utc_timestamp(now):
+            self.conn.execute(
+                "UPDATE idempotency_keys SET locked_until = ? WHERE scope = ? AND key = ?",
+                (utc_timestamp(now + timedelta(seconds=p_lease_seconds)), p_scope, p_key)
+            )
+            return {"state": "claimed"}
+        return {"state": "in_progress"}
+
+    def _rpc_complete_idempotency_key(self, p_scope: str, p_key: str, p_status_code: int, p_response: Any) -> None:
+        self.conn.execute(
+            "UPDATE idempotency_keys SET status = 'completed', status_code = ?, response = ?, locked_until = NULL "
+            "WHERE scope = ? AND key = ?",
+            (p_status_code, json.dumps(p_response), p_scope, p_key)
+        )
+
+    def _rpc_release_idempotency_key(self, p_scope: str, p_key: str) -> None:
+        self.conn.execute(
+            "DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND status = 'in_progress' AND result_ref IS NULL",
+            (p_scope, p_key)
+        )
+
+    def _rpc_configure_store(self, p_timezone: str) -> Dict[str, Any]:
+        row = self.conn.execute("SELECT timezone FROM store_settings WHERE id = 1").fetchone()
+        if row is not None and row["timezone"] == p_timezone:
+            return {"changed": False}
+        self.conn.execute(
+            "INSERT INTO store_settings (id, timezone) VALUES (1, ?) "
+            "ON CONFLICT (id) DO UPDATE SET timezone = excluded.timezone",
+            (p_timezone,)
+        )
+        if row is None:
+            # New database file: the rollups were built with this timezone
+            return {"changed": False}
+        return {"changed": True, "rollups": self._rpc_rebuild_sales_rollups()}
+
+    def _rpc_rebuild_sales_rollups(self, p_from: Optional[str] = None) -> Dict[str, Any]:
+        since = "" if p_from is None else " WHERE substr(store_local_time(created_at), 1, 10) >= :p_from"
+        self.conn.execute(
+            "DELETE FROM sales_rollup_payment" + ("" if p_from is None else " WHERE sale_date >= :p_from"),
+            {"p_from": p_from}
+        )
+        self.conn.execute(
+            "DELETE FROM sales_rollup_category" + ("" if p_from is None else " WHERE sale_date >= :p_from"),
+            {"p_from": p_from}
+        )
+        payment_rows = self.conn.execute(
+            "INSERT INTO sales_rollup_payment (store_id, sale_date, sale_hour, payment_mode, bill_count, subtotal, tax_amount, total) "
+            "SELECT 'default', substr(store_local_time(created_at), 1, 10), CAST(substr(store_local_time(created_at), 12, 2) AS INTEGER), "
+            "payment_mode, COUNT(*), ROUND(SUM(subtotal), 2), ROUND(SUM(tax_amount), 2), ROUND(SUM(total), 2) "
+            "FROM sales_bill" + since + " GROUP BY 2, 3, 4",
+            {"p_from": p_from}
+        ).rowcount
+        category_rows = self.conn.execute(
+            "INSERT INTO sales_rollup_category (store_id, sale_date, sale_hour, category, line_count, quantity, revenue) "
+            "SELECT 'default', substr(store_local_time(i.created_at), 1, 10), CAST(substr(store_local_time(i.created_at), 12, 2) AS INTEGER), "
+            "COALESCE(p.category, 'Others'), COUNT(*), SUM(i.quantity), ROUND(SUM(i.line_total), 2) "
+            "FROM sales_bill_items i LEFT JOIN products p ON p.id = i.product_id"
+            + since.replace("created_at", "i.created_at") + " GROUP BY 2, 3, 4",
+            {"p_from": p_from}
+        ).rowcount
+        return {"payment_rows": payment_rows, "category_rows": category_rows}
+
+    def _rpc_sales_report(self, p_from: str, p_to: str, p_group_by: str,
+                          p_payment_mode: Optional[str] = None) -> Dict[str, Any]:
+        keys = {
+            "day": "substr(store_local_time(b.created_at), 1, 10)",
+            "hour": "CAST(substr(store_local_time(b.created_at), 12, 2) AS INTEGER)",
+            "payment_mode": "b.payment_mode",
+            "product": "i.product_id",
+            "tax_rate": "i.tax_rate"
+        }
+        if p_group_by not in keys:
+            raise DatabaseError("group_by must be one of: day, hour, product, tax_rate, payment_mode", code="RB400")
+        params = {"p_from": self._value(p_from), "p_to": self._value(p_to), "p_payment_mode": p_payment_mode}
+        bills_where = (
+            "b.created_at >= :p_from AND b.created_at < :p_to "
+            "AND (:p_payment_mode IS NULL OR b.payment_mode = :p_payment_mode)"
+        )
+
+        if p_group_by in ("day", "hour", "payment_mode"):
+            sql = (
+                f"WITH lines AS (SELECT bill_id, COUNT(*) AS lines, SUM(quantity) AS quantity FROM sales_bill_items "
+                f"WHERE created_at >= :p_from AND created_at < :p_to GROUP BY bill_id) "
+                f"SELECT {keys[p_group_by]} AS key, NULL AS label, COUNT(*) AS bills, "
+                f"COALESCE(SUM(l.lines), 0) AS lines, COALESCE(SUM(l.quantity), 0) AS quantity, "
+                f"ROUND(SUM(b.subtotal), 2) AS taxable_value, ROUND(SUM(b.tax_amount), 2) AS tax_amount, "
+                f"ROUND(SUM(b.total), 2) AS total "
+                f"FROM sales_bill b LEFT JOIN lines l ON l.bill_id = b.id WHERE {bills_where} "
+                f"GROUP BY 1 ORDER BY 1"
+            )
+        else:
+            sql = (
+                f"SELECT {keys[p_group_by]} AS key, "
+                f"{'MAX(i.product_name)' if p_group_by == 'product' else 'NULL'} AS label, "
+                f"COUNT(DISTINCT i.bill_id) AS bills, COUNT(*) AS lines, SUM(i.quantity) AS quantity, "
+                f"ROUND(SUM(i.unit_price * i.quantity), 2) AS taxable_value, "
+                f"ROUND(SUM(i.unit_price * i.quantity * i.tax_rate / 100), 2) AS tax_amount, "
+                f"ROUND(SUM(i.line_total), 2) AS total "
+                f"FROM sales_bill_items i JOIN sales_bill b ON b.id = i.bill_id "
+                f"WHERE i.created_at >= :p_from AND i.created_at < :p_to "
+                f"AND (:p_payment_mode IS NULL OR b.payment_mode = :p_payment_mode) "
+                f"GROUP BY 1 ORDER BY total DESC, 1"
+            )
+        groups = [dict(row) for row in self.conn.execute(sql, params)]
+
+        totals = self.conn.execute(
+            f"SELECT COUNT(*), ROUND(COALESCE(SUM(b.subtotal), 0), 2), ROUND(COALESCE(SUM(b.tax_amount), 0), 2), "
+            f"ROUND(COALESCE(SUM(b.total), 0), 2) FROM sales_bill b WHERE {bills_where}",
+            params
+        ).fetchone()
+        return {
+            "groups": groups,
+            "totals": {"bills": totals[0], "taxable_value": totals[1], "tax_amount": totals[2], "total": totals[3]}
+        }
+
+    def _rpc_search_products(self, p_query: str, p_limit: int = 20) -> List[Dict[str, Any]]:
+        # Substring matches only: SQLite has no trigram similarity
+        text = (p_query or "").strip().lower()
+        if not text:
+            return []
+        pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return self._fetch(
+            "product_catalog",
+            "SELECT * FROM product_catalog "
+            "WHERE lower(name) LIKE :contains ESCAPE '\\' OR lower(sku) LIKE :contains ESCAPE '\\' "
+            "ORDER BY CASE "
+            "WHEN lower(sku) = :text THEN 0 "
+            "WHEN lower(sku) LIKE :prefix ESCAPE '\\' THEN 1 "
+            "WHEN lower(name) LIKE :prefix ESCAPE '\\' THEN 2 "
+            "ELSE 3 END, length(name), name "
+            "LIMIT :limit",
+            {"text": text, "prefix": pattern + "%", "contains": "%" + pattern + "%",
+             "limit": min(max(p_limit, 1), 100)}
+        )
+
+    # Reconciliation. Writes are serialized on one connection, so there are no
+    # in-flight transactions to settle and each shard simply re-sums the whole
+    # ledger of its products (the incremental totals of migration 013 are not
+    # needed at single-store volumes).
+
+    def _reconciliation_run(self, run_id: str) -> Dict[str, Any]:
+        rows = self._fetch(
+            "inventory_reconciliation_runs",
+            "SELECT * FROM inventory_reconciliation_runs WHERE id = ?",
+            [run_id]
+        )
+        if not rows:
+            raise DatabaseError(f"Reconciliation run {run_id} not found", code="RB404")
+        return rows[0]
+
+    def _rpc_reconcile_inventory_begin(self, p_shards: int, p_repair: bool = False, p_settle_seconds: int = 300) -> Dict[str, Any]:
+        if p_shards is None or not 1 <= p_shards <= 64:
+            raise DatabaseError("shards must be between 1 and 64", code="RB400")
+        newest = self.conn.execute(
+            "SELECT created_at, id FROM inventory_ledger ORDER BY created_at DESC, id DESC LIMIT 1"
+        ).fetchone()
+        run_id = str(uuid.uuid4())
+        self.conn.execute(
+            "INSERT INTO inventory_reconciliation_runs (id, shards, repair, to_created_at, to_id, started_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, p_shards, int(bool(p_repair)), newest[0] if newest else None,
+             newest[1] if newest else None, utc_timestamp())
+        )
+        return self._reconciliation_run(run_id)
+
+    def _rpc_reconcile_inventory_shard(self, p_run_id: str, p_shard: int) -> Dict[str, Any]:
+        run = self._reconciliation_run(p_run_id)
+        if run["status"] != "running":
+            raise DatabaseError(f"Reconciliation run {p_run_id} is {run['status']}", code="RB409")
+        if p_shard is None or not 0 <= p_shard < run["shards"]:
+            raise DatabaseError(f"shard must be between 0 and {run['shards'] - 1}", code="RB400")
+
+        ledger_rows = self.conn.execute(
+            "SELECT COUNT(*) FROM inventory_ledger WHERE inventory_bucket(product_id) % ? = ?",
+            (run["shards"], p_shard)
+        ).fetchone()[0]
+        mismatches = self.conn.execute(
+            "SELECT p.id AS product_id, COALESCE(b.qty_on_hand, 0) AS balance_qty, "
+            "ROUND(COALESCE((SELECT SUM(l.qty_delta) FROM inventory_ledger l WHERE l.product_id = p.id), 0), 6) AS ledger_qty "
+            "FROM products p LEFT JOIN inventory_balance b ON b.product_id = p.id "
+            "WHERE inventory_bucket(p.id) % ? = ? AND balance_qty <> ledger_qty",
+            (run["shards"], p_shard)
+        ).fetchall()
+
+        now = utc_timestamp()
+        discrepancies = []
+        for row in mismatches:
+            # Negative ledger totals cannot be stored (qty_on_hand >= 0); report only
+            repaired = bool(run["repair"]) and row["ledger_qty"] >= 0
+            if repaired:
+                self.conn.execute(
+                    "INSERT INTO inventory_balance (product_id, qty_on_hand, last_updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT (product_id) DO UPDATE SET qty_on_hand = excluded.qty_on_hand, last_updated = excluded.last_updated",
+                    (row["product_id"], row["ledger_qty"], now)
+                )
+            self.conn.execute(
+                "INSERT INTO inventory_reconciliation_discrepancies (run_id, product_id, balance_qty, ledger_qty, repaired) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (p_run_id, row["product_id"], row["balance_qty"], row["ledger_qty"], int(repaired))
+            )
+            discrepancies.append({
+                "product_id": row["product_id"],
+                "balance_qty": row["balance_qty"],
+                "ledger_qty": row["ledger_qty"],
+                "repaired": repaired
+            })
+
+        self.conn.execute(
+            "UPDATE inventory_reconciliation_runs SET shards_completed = shards_completed + 1, "
+            "ledger_rows = ledger_rows + ?, discrepancies = discrepancies + ?, repaired = repaired + ? WHERE id = ?",
+            (ledger_rows, len(discrepancies), sum(1 for row in discrepancies if row["repaired"]), p_run_id)
+        )
+        return {"shard": p_shard, "ledger_rows": ledger_rows, "discrepancies": discrepancies}
+
+    def _rpc_reconcile_inventory_finish(self, p_run_id: str) -> Dict[str, Any]:
+        updated = self.conn.execute(
+            "UPDATE inventory_reconciliation_runs "
+            "SET status = CASE WHEN shards_completed >= shards THEN 'completed' ELSE 'failed' END, finished_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (utc_timestamp(), p_run_id)
+        ).rowcount
+        if not updated:
+            raise DatabaseError(f"Reconciliation run {p_run_id} not found or already finished", code="RB404")
+        return self._reconciliation_run(p_run_id)
+
+    async def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,20 +1,46 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from app.modules.inventory.routes import router as inventory_router
 from app.modules.sales.routes import router as sales_router
 from app.modules.products.routes import router as products_router
 from app.modules.dashboard.routes import router as dashboard_router
+from app.modules.dashboard.service import DashboardService
 from app.modules.analytics.routes import router as analytics_router
 from app.modules.voice.routes import router as voice_router
 from app.modules.notifications.routes import router as notifications_router
+from app.modules.events.routes import router as events_router
+from app.modules.events.service import broker as event_broker
 from app.core.config import settings
-from app.core.db import init_db
+from app.core.db import init_db, close_db
+from app.core.idempotency import idempotency
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.query_detector import QueryDetectorMiddleware
+from app.modules.products.search import product_index
 
-app = FastAPI(title="Retail Boss API", version="1.0.0")
+# Responses are serialized with orjson (response models are dumped by pydantic-core first)
+app = FastAPI(title="Retail Boss API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Initialize database
 init_db()
 
+@app.on_event("startup")
+async def build_search_index():
+    """Build the product search index in the background (searches use the database until it is ready)"""
+    product_index.start()
+
+@app.on_event("startup")
+async def configure_store():
+    """Write STORE_TIMEZONE to the database, where the sales rollups read it"""
+    await DashboardService().configure_store()
+
+@app.on_event("shutdown")
+async def shutdown_db():
+    """Stop the live update poller and release pooled database connections"""
+    await event_broker.close()
+    await close_db()
+
 # CORS middleware
 # Parse comma-separated CORS_ORIGINS string into list
 cors_origins = [origin.strip() for origin in settings.CORS_ORIGINS.split(",")] if settings.CORS_ORIGINS else []
@@ -24,8 +50,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed", "Server-Timing"],
 )
 
+# Request latency and database round trips (Server-Timing header, /metrics)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# N+1 and slow-query warnings (opt-in)
+if settings.QUERY_DETECTOR_ENABLED:
+    app.add_middleware(QueryDetectorMiddleware)
+
 # Include routers
 app.include_router(dashboard_router, prefix="/api/dashboard", tags=["dashboard"])
 app.include_router(inventory_router, prefix="/api/inventory", tags=["inventory"])
@@ -34,21 +69,41 @@ app.include_router(products_router, prefix="/api/products", tags=["products"])
 app.include_router(analytics_router, prefix="/api/analytics", tags=["analytics"])
 app.include_router(voice_router, prefix="/api/voice", tags=["voice"])
 app.include_router(notifications_router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(events_router, prefix="/api/events", tags=["events"])
 
 # Billing routes (legacy endpoint, can be moved to sales module later)
 from app.modules.sales.service import SalesService
+from app.modules.sales.schemas import SaleCreate, SaleCreated, RecentBill
 sales_service = SalesService()
 
-@app.post("/api/billing")
-async def create_bill(request: dict):
-    """Create a new bill - legacy endpoint"""
-    return await sales_service.create_bill(request)
+@app.post("/api/billing", response_model=SaleCreated, response_model_exclude_unset=True)
+async def create_bill(
+    request: SaleCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Create a new bill - legacy endpoint (same Idempotency-Key space as /api/sales)"""
+    result, replayed = await idempotency.run(
+        "sales", idempotency_key, request,
+        lambda: sales_service.create_bill(request, idempotency_key),
+        recover=sales_service.get_created_sale
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
-@app.get("/api/billing")
+@app.get("/api/billing", response_model=List[RecentBill])
 async def get_recent_bills():
     """Get recent bills - legacy endpoint"""
     return await sales_service.get_recent_bills()
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this worker"""
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("Metrics are disabled\n", status_code=404)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Retail Boss API", "version": "1.0.0"}
@@ -0,0 +1,24 @@
+-- Product Catalog (VIEW)
+-- Products joined with their current stock, so catalog reads take one query
+-- instead of one inventory_balance lookup per product.
+
+CREATE OR REPLACE VIEW product_catalog AS
+SELECT
+    p.id,
+    p.name,
+    p.sku,
+    p.barcode,
+    p.unit,
+    p.mrp,
+    p.selling_price,
+    p.tax_rate,
+    p.created_at,
+    COALESCE(b.qty_on_hand, 0) AS qty_on_hand
+FROM products p
+LEFT JOIN inventory_balance b ON b.product_id = p.id;
+
+-- Index for keyset pagination ordered by (name, id)
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name, id);
+
+-- Comments
+COMMENT ON VIEW product_catalog IS 'Products with current qty_on_hand (0 when no balance row). Read-only.';
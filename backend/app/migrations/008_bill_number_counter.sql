@@ -0,0 +1,53 @@
+-- Bill Number Counter
+-- Per-day counter row used to allocate bill numbers in blocks (hi/lo).
+-- Each API worker reserves a block of numbers with one call and hands them
+-- out from memory, so sales do not query sales_bill to find the next number.
+-- Numbers are unique but may have gaps (unused numbers of a block are lost on restart).
+
+CREATE TABLE IF NOT EXISTS bill_number_counter (
+    bill_date DATE PRIMARY KEY,
+    next_value BIGINT NOT NULL CHECK (next_value >= 1)
+);
+
+COMMENT ON TABLE bill_number_counter IS 'Next unreserved bill sequence number per day. Only modified by reserve_bill_numbers().';
+
+-- Reserve p_block_size consecutive sequence numbers for p_bill_date.
+-- Returns the first number of the block.
+CREATE OR REPLACE FUNCTION reserve_bill_numbers(
+    p_bill_date DATE,
+    p_block_size INT
+)
+RETURNS BIGINT AS $$
+DECLARE
+    v_start BIGINT;
+BEGIN
+    IF p_block_size IS NULL OR p_block_size < 1 THEN
+        RAISE EXCEPTION 'block size must be positive'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    UPDATE bill_number_counter
+    SET next_value = next_value + p_block_size
+    WHERE bill_date = p_bill_date
+    RETURNING next_value - p_block_size INTO v_start;
+
+    IF FOUND THEN
+        RETURN v_start;
+    END IF;
+
+    -- First reservation of the day: continue after any bill numbers already
+    -- issued for that day (e.g. by the previous query-based generator)
+    SELECT COALESCE(MAX(split_part(bill_number, '-', 3)::BIGINT), 0) + 1 INTO v_start
+    FROM sales_bill
+    WHERE bill_number LIKE 'BILL-' || to_char(p_bill_date, 'YYYYMMDD') || '-%'
+      AND bill_number ~ '^BILL-[0-9]{8}-[0-9]+$';
+
+    INSERT INTO bill_number_counter (bill_date, next_value)
+    VALUES (p_bill_date, v_start + p_block_size)
+    ON CONFLICT (bill_date) DO UPDATE
+        SET next_value = bill_number_counter.next_value + p_block_size
+    RETURNING next_value - p_block_size INTO v_start;
+
+    RETURN v_start;
+END;
+$$ LANGUAGE plpgsql;
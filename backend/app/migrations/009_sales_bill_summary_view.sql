@@ -0,0 +1,22 @@
+-- Sales Bill Summary (VIEW)
+-- Bills with their line item count, so bill listings get counts from the
+-- database instead of fetching every item row.
+
+CREATE OR REPLACE VIEW sales_bill_summary AS
+SELECT
+    b.id,
+    b.bill_number,
+    b.subtotal,
+    b.tax_amount,
+    b.total,
+    b.payment_mode,
+    b.created_at,
+    (
+        SELECT COUNT(*)
+        FROM sales_bill_items i
+        WHERE i.bill_id = b.id
+    ) AS item_count
+FROM sales_bill b;
+
+-- Comments
+COMMENT ON VIEW sales_bill_summary IS 'sales_bill with item_count per bill. Read-only.';
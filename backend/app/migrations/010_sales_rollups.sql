@@ -0,0 +1,159 @@
+-- Sales Rollups (AGGREGATE TABLES)
+-- Hourly sales totals per store, maintained incrementally by triggers in the
+-- same transaction as each sale, so dashboards read O(days shown) rows
+-- instead of every bill.
+-- Rebuild from sales_bill / sales_bill_items with rebuild_sales_rollups().
+
+-- Product category (used for category rollups; NULL is reported as 'Others')
+ALTER TABLE products ADD COLUMN IF NOT EXISTS category TEXT;
+
+CREATE OR REPLACE VIEW product_catalog AS
+SELECT
+    p.id,
+    p.name,
+    p.sku,
+    p.barcode,
+    p.unit,
+    p.mrp,
+    p.selling_price,
+    p.tax_rate,
+    p.created_at,
+    COALESCE(b.qty_on_hand, 0) AS qty_on_hand,
+    p.category
+FROM products p
+LEFT JOIN inventory_balance b ON b.product_id = p.id;
+
+-- Store-local time used for day/hour buckets.
+-- Keep in sync with STORE_TIMEZONE in app/core/config.py.
+CREATE OR REPLACE FUNCTION store_local_time(p_ts TIMESTAMPTZ)
+RETURNS TIMESTAMP AS $$
+    SELECT p_ts AT TIME ZONE 'Asia/Kolkata';
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS sales_rollup_payment (
+    store_id TEXT NOT NULL DEFAULT 'default',
+    sale_date DATE NOT NULL,
+    sale_hour SMALLINT NOT NULL CHECK (sale_hour >= 0 AND sale_hour <= 23),
+    payment_mode TEXT NOT NULL,
+    bill_count INTEGER NOT NULL DEFAULT 0,
+    subtotal NUMERIC(14,2) NOT NULL DEFAULT 0,
+    tax_amount NUMERIC(14,2) NOT NULL DEFAULT 0,
+    total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, sale_date, sale_hour, payment_mode)
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_category (
+    store_id TEXT NOT NULL DEFAULT 'default',
+    sale_date DATE NOT NULL,
+    sale_hour SMALLINT NOT NULL CHECK (sale_hour >= 0 AND sale_hour <= 23),
+    category TEXT NOT NULL,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, sale_date, sale_hour, category)
+);
+
+-- Comments
+COMMENT ON TABLE sales_rollup_payment IS 'DERIVED: hourly bill totals by payment mode. Rebuild with rebuild_sales_rollups().';
+COMMENT ON TABLE sales_rollup_category IS 'DERIVED: hourly line revenue by product category. Rebuild with rebuild_sales_rollups().';
+
+-- Add a bill to the payment rollup
+CREATE OR REPLACE FUNCTION rollup_sales_bill()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_local TIMESTAMP := store_local_time(COALESCE(NEW.created_at, now()));
+BEGIN
+    INSERT INTO sales_rollup_payment (store_id, sale_date, sale_hour, payment_mode, bill_count, subtotal, tax_amount, total)
+    VALUES ('default', v_local::DATE, EXTRACT(HOUR FROM v_local), NEW.payment_mode, 1, NEW.subtotal, NEW.tax_amount, NEW.total)
+    ON CONFLICT (store_id, sale_date, sale_hour, payment_mode)
+    DO UPDATE SET
+        bill_count = sales_rollup_payment.bill_count + 1,
+        subtotal = sales_rollup_payment.subtotal + EXCLUDED.subtotal,
+        tax_amount = sales_rollup_payment.tax_amount + EXCLUDED.tax_amount,
+        total = sales_rollup_payment.total + EXCLUDED.total;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Add a bill line to the category rollup
+CREATE OR REPLACE FUNCTION rollup_sales_bill_item()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_local TIMESTAMP := store_local_time(COALESCE(NEW.created_at, now()));
+    v_category TEXT;
+BEGIN
+    SELECT category INTO v_category FROM products WHERE id = NEW.product_id;
+
+    INSERT INTO sales_rollup_category (store_id, sale_date, sale_hour, category, line_count, quantity, revenue)
+    VALUES ('default', v_local::DATE, EXTRACT(HOUR FROM v_local), COALESCE(v_category, 'Others'), 1, NEW.quantity, NEW.line_total)
+    ON CONFLICT (store_id, sale_date, sale_hour, category)
+    DO UPDATE SET
+        line_count = sales_rollup_category.line_count + 1,
+        quantity = sales_rollup_category.quantity + EXCLUDED.quantity,
+        revenue = sales_rollup_category.revenue + EXCLUDED.revenue;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER rollup_on_sales_bill_insert
+    AFTER INSERT ON sales_bill
+    FOR EACH ROW
+    EXECUTE FUNCTION rollup_sales_bill();
+
+CREATE TRIGGER rollup_on_sales_bill_item_insert
+    AFTER INSERT ON sales_bill_items
+    FOR EACH ROW
+    EXECUTE FUNCTION rollup_sales_bill_item();
+
+-- Rebuild rollups from sales_bill / sales_bill_items.
+-- p_from: first local date to rebuild (NULL = everything).
+-- Blocks new sales while it runs so no bill is counted twice or missed.
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups(p_from DATE DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+    v_payment_rows INTEGER;
+    v_category_rows INTEGER;
+BEGIN
+    LOCK TABLE sales_bill, sales_bill_items IN SHARE MODE;
+
+    DELETE FROM sales_rollup_payment WHERE p_from IS NULL OR sale_date >= p_from;
+    DELETE FROM sales_rollup_category WHERE p_from IS NULL OR sale_date >= p_from;
+
+    INSERT INTO sales_rollup_payment (store_id, sale_date, sale_hour, payment_mode, bill_count, subtotal, tax_amount, total)
+    SELECT
+        'default',
+        store_local_time(b.created_at)::DATE,
+        EXTRACT(HOUR FROM store_local_time(b.created_at)),
+        b.payment_mode,
+        COUNT(*),
+        SUM(b.subtotal),
+        SUM(b.tax_amount),
+        SUM(b.total)
+    FROM sales_bill b
+    WHERE p_from IS NULL OR store_local_time(b.created_at)::DATE >= p_from
+    GROUP BY 2, 3, 4;
+    GET DIAGNOSTICS v_payment_rows = ROW_COUNT;
+
+    INSERT INTO sales_rollup_category (store_id, sale_date, sale_hour, category, line_count, quantity, revenue)
+    SELECT
+        'default',
+        store_local_time(i.created_at)::DATE,
+        EXTRACT(HOUR FROM store_local_time(i.created_at)),
+        COALESCE(p.category, 'Others'),
+        COUNT(*),
+        SUM(i.quantity),
+        SUM(i.line_total)
+    FROM sales_bill_items i
+    LEFT JOIN products p ON p.id = i.product_id
+    WHERE p_from IS NULL OR store_local_time(i.created_at)::DATE >= p_from
+    GROUP BY 2, 3, 4;
+    GET DIAGNOSTICS v_category_rows = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'payment_rows', v_payment_rows,
+        'category_rows', v_category_rows
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,35 @@
+-- Analytics Facts (VIEWS)
+-- Narrow, pre-bucketed projections of bills and bill items that the
+-- analytics engine scans in keyset-ordered chunks of (created_at, id).
+
+CREATE OR REPLACE VIEW analytics_bill_facts AS
+SELECT
+    b.id,
+    b.created_at,
+    store_local_time(b.created_at)::DATE AS sale_date,
+    EXTRACT(HOUR FROM store_local_time(b.created_at))::SMALLINT AS sale_hour,
+    b.payment_mode,
+    b.total,
+    (
+        SELECT COUNT(*)
+        FROM sales_bill_items i
+        WHERE i.bill_id = b.id
+    ) AS item_count
+FROM sales_bill b;
+
+CREATE OR REPLACE VIEW analytics_item_facts AS
+SELECT
+    i.id,
+    i.created_at,
+    i.product_id,
+    i.product_name,
+    i.quantity,
+    i.line_total
+FROM sales_bill_items i;
+
+-- Index for keyset scans of bill items by time
+CREATE INDEX IF NOT EXISTS idx_sales_bill_items_created_at ON sales_bill_items(created_at, id);
+
+-- Comments
+COMMENT ON VIEW analytics_bill_facts IS 'Bills with store-local day/hour and item_count, for analytics scans. Read-only.';
+COMMENT ON VIEW analytics_item_facts IS 'Bill item columns needed for analytics scans. Read-only.';
@@ -0,0 +1,16 @@
+-- Inventory Stats (FUNCTION)
+-- Server-side aggregate for the inventory screen header, so stats are
+-- computed in one query instead of downloading every product and balance.
+
+CREATE OR REPLACE FUNCTION inventory_stats(p_low_stock_threshold NUMERIC DEFAULT 5)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'products', COUNT(*),
+        'inStock', COUNT(*) FILTER (WHERE qty_on_hand > 0),
+        'lowStock', COUNT(*) FILTER (WHERE qty_on_hand < p_low_stock_threshold),
+        'stockValue', ROUND(COALESCE(SUM(qty_on_hand * selling_price), 0), 2)
+    )
+    FROM product_catalog;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION inventory_stats(NUMERIC) IS 'Inventory header stats: product count, in stock, low stock and stock value at selling price.';
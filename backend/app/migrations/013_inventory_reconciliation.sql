@@ -0,0 +1,277 @@
+-- Inventory Reconciliation
+-- Recomputes expected stock from inventory_ledger incrementally and compares
+-- it with the inventory_balance cache.
+--
+-- Products are hashed into 64 fixed buckets. Each bucket keeps a high-water
+-- mark (created_at, id) of the ledger rows already folded into
+-- inventory_ledger_totals, so a run only reads ledger rows added since the
+-- previous run. A run is split into shards (sets of buckets) that can be
+-- processed concurrently; folding a bucket and moving its mark happen in the
+-- same transaction, so a failed shard never double-counts.
+--
+-- Flow: reconcile_inventory_begin() -> reconcile_inventory_shard() per shard
+--       -> reconcile_inventory_finish()
+
+-- Bucket of a product (0..63)
+CREATE OR REPLACE FUNCTION inventory_bucket(p_product_id UUID)
+RETURNS SMALLINT AS $$
+    SELECT (hashtext(p_product_id::TEXT) & 63)::SMALLINT;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Running SUM(qty_delta) per product, up to the bucket high-water marks
+CREATE TABLE IF NOT EXISTS inventory_ledger_totals (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    qty_total NUMERIC NOT NULL DEFAULT 0,
+    last_updated TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS inventory_reconciliation_buckets (
+    bucket SMALLINT PRIMARY KEY CHECK (bucket >= 0 AND bucket <= 63),
+    hwm_created_at TIMESTAMPTZ,  -- NULL = nothing folded yet
+    hwm_id UUID,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+INSERT INTO inventory_reconciliation_buckets (bucket)
+SELECT generate_series(0, 63)
+ON CONFLICT (bucket) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS inventory_reconciliation_runs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    shards INT NOT NULL CHECK (shards >= 1 AND shards <= 64),
+    repair BOOLEAN NOT NULL DEFAULT false,
+    to_created_at TIMESTAMPTZ,  -- High-water mark this run folds up to
+    to_id UUID,
+    shards_completed INT NOT NULL DEFAULT 0,
+    ledger_rows BIGINT NOT NULL DEFAULT 0,
+    discrepancies INT NOT NULL DEFAULT 0,
+    repaired INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS inventory_reconciliation_discrepancies (
+    run_id UUID NOT NULL REFERENCES inventory_reconciliation_runs(id) ON DELETE CASCADE,
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    balance_qty NUMERIC NOT NULL,
+    ledger_qty NUMERIC NOT NULL,
+    repaired BOOLEAN NOT NULL DEFAULT false,
+    PRIMARY KEY (run_id, product_id)
+);
+
+-- Index for per-product ledger reads after a high-water mark
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_product_created_at ON inventory_ledger(product_id, created_at);
+
+-- Comments
+COMMENT ON TABLE inventory_ledger_totals IS 'DERIVED: SUM(qty_delta) per product up to its bucket high-water mark. Maintained by reconcile_inventory_shard().';
+COMMENT ON TABLE inventory_reconciliation_buckets IS 'High-water mark (created_at, id) of ledger rows folded into inventory_ledger_totals, per product bucket.';
+COMMENT ON TABLE inventory_reconciliation_runs IS 'Reconciliation run log with the high-water mark each run folded up to.';
+COMMENT ON TABLE inventory_reconciliation_discrepancies IS 'Products whose balance did not match the ledger, per run.';
+
+-- Start a run. The high-water mark is the newest ledger row older than
+-- p_settle_seconds, so rows of still-open transactions (which get an earlier
+-- created_at than their commit time) are not skipped.
+CREATE OR REPLACE FUNCTION reconcile_inventory_begin(
+    p_shards INT,
+    p_repair BOOLEAN DEFAULT false,
+    p_settle_seconds INT DEFAULT 300
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_run inventory_reconciliation_runs;
+    v_to_created_at TIMESTAMPTZ;
+    v_to_id UUID;
+BEGIN
+    IF p_shards IS NULL OR p_shards < 1 OR p_shards > 64 THEN
+        RAISE EXCEPTION 'shards must be between 1 and 64'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    SELECT created_at, id INTO v_to_created_at, v_to_id
+    FROM inventory_ledger
+    WHERE created_at <= now() - make_interval(secs => p_settle_seconds)
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1;
+
+    INSERT INTO inventory_reconciliation_runs (shards, repair, to_created_at, to_id)
+    VALUES (p_shards, COALESCE(p_repair, false), v_to_created_at, v_to_id)
+    RETURNING * INTO v_run;
+
+    RETURN to_jsonb(v_run);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Process one shard of a run: fold new ledger rows, compare with balances,
+-- optionally repair. Returns the shard's discrepancies.
+CREATE OR REPLACE FUNCTION reconcile_inventory_shard(
+    p_run_id UUID,
+    p_shard INT
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_run inventory_reconciliation_runs;
+    v_min_hwm TIMESTAMPTZ;
+    v_unbounded BOOLEAN;
+    v_ledger_rows BIGINT := 0;
+    v_expected NUMERIC;
+    v_repaired BOOLEAN;
+    v_repaired_count INT := 0;
+    v_results JSONB := '[]'::JSONB;
+    r RECORD;
+BEGIN
+    SELECT * INTO v_run FROM inventory_reconciliation_runs WHERE id = p_run_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Reconciliation run % not found', p_run_id
+            USING ERRCODE = 'RB404';
+    END IF;
+    IF v_run.status <> 'running' THEN
+        RAISE EXCEPTION 'Reconciliation run % is %', p_run_id, v_run.status
+            USING ERRCODE = 'RB409';
+    END IF;
+    IF p_shard IS NULL OR p_shard < 0 OR p_shard >= v_run.shards THEN
+        RAISE EXCEPTION 'shard must be between 0 and %', v_run.shards - 1
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    -- Lock this shard's buckets; a concurrent run on the same buckets waits here
+    PERFORM 1
+    FROM inventory_reconciliation_buckets
+    WHERE bucket % v_run.shards = p_shard
+    ORDER BY bucket
+    FOR UPDATE;
+
+    SELECT MIN(hwm_created_at), bool_or(hwm_created_at IS NULL) INTO v_min_hwm, v_unbounded
+    FROM inventory_reconciliation_buckets
+    WHERE bucket % v_run.shards = p_shard;
+
+    -- Fold ledger rows between each bucket's mark and the run's mark
+    IF v_run.to_created_at IS NOT NULL THEN
+        WITH delta AS (
+            SELECT l.product_id, SUM(l.qty_delta) AS qty, COUNT(*) AS row_count
+            FROM inventory_ledger l
+            JOIN inventory_reconciliation_buckets k ON k.bucket = inventory_bucket(l.product_id)
+            WHERE k.bucket % v_run.shards = p_shard
+              AND (v_unbounded OR l.created_at >= v_min_hwm)
+              AND (k.hwm_created_at IS NULL OR (l.created_at, l.id) > (k.hwm_created_at, k.hwm_id))
+              AND (l.created_at, l.id) <= (v_run.to_created_at, v_run.to_id)
+            GROUP BY l.product_id
+        ), folded AS (
+            INSERT INTO inventory_ledger_totals (product_id, qty_total, last_updated)
+            SELECT product_id, qty, now() FROM delta
+            ON CONFLICT (product_id) DO UPDATE SET
+                qty_total = inventory_ledger_totals.qty_total + EXCLUDED.qty_total,
+                last_updated = now()
+            RETURNING 1
+        )
+        SELECT COALESCE(SUM(row_count), 0) INTO v_ledger_rows FROM delta;
+
+        UPDATE inventory_reconciliation_buckets
+        SET hwm_created_at = v_run.to_created_at,
+            hwm_id = v_run.to_id,
+            updated_at = now()
+        WHERE bucket % v_run.shards = p_shard
+          AND (hwm_created_at IS NULL OR (hwm_created_at, hwm_id) < (v_run.to_created_at, v_run.to_id));
+
+        SELECT MIN(hwm_created_at), bool_or(hwm_created_at IS NULL) INTO v_min_hwm, v_unbounded
+        FROM inventory_reconciliation_buckets
+        WHERE bucket % v_run.shards = p_shard;
+    END IF;
+
+    -- Compare: expected = folded total + ledger rows newer than the bucket mark
+    FOR r IN
+        WITH recent AS (
+            SELECT l.product_id, SUM(l.qty_delta) AS qty
+            FROM inventory_ledger l
+            JOIN inventory_reconciliation_buckets k ON k.bucket = inventory_bucket(l.product_id)
+            WHERE k.bucket % v_run.shards = p_shard
+              AND (v_unbounded OR l.created_at >= v_min_hwm)
+              AND (k.hwm_created_at IS NULL OR (l.created_at, l.id) > (k.hwm_created_at, k.hwm_id))
+            GROUP BY l.product_id
+        )
+        SELECT
+            p.id AS product_id,
+            COALESCE(b.qty_on_hand, 0) AS balance_qty,
+            COALESCE(t.qty_total, 0) + COALESCE(rc.qty, 0) AS ledger_qty
+        FROM products p
+        LEFT JOIN inventory_balance b ON b.product_id = p.id
+        LEFT JOIN inventory_ledger_totals t ON t.product_id = p.id
+        LEFT JOIN recent rc ON rc.product_id = p.id
+        WHERE inventory_bucket(p.id) % v_run.shards = p_shard
+          AND COALESCE(b.qty_on_hand, 0) <> COALESCE(t.qty_total, 0) + COALESCE(rc.qty, 0)
+    LOOP
+        v_repaired := false;
+
+        IF v_run.repair THEN
+            -- Lock the balance row, then recompute so concurrent sales are not overwritten
+            PERFORM 1 FROM inventory_balance WHERE product_id = r.product_id FOR UPDATE;
+
+            SELECT COALESCE(t.qty_total, 0) + COALESCE((
+                SELECT SUM(l.qty_delta)
+                FROM inventory_ledger l
+                JOIN inventory_reconciliation_buckets k ON k.bucket = inventory_bucket(l.product_id)
+                WHERE l.product_id = r.product_id
+                  AND (k.hwm_created_at IS NULL OR (l.created_at, l.id) > (k.hwm_created_at, k.hwm_id))
+            ), 0) INTO v_expected
+            FROM (SELECT 1) one
+            LEFT JOIN inventory_ledger_totals t ON t.product_id = r.product_id;
+
+            -- Negative ledger totals cannot be stored (qty_on_hand >= 0); report only
+            IF v_expected >= 0 THEN
+                INSERT INTO inventory_balance (product_id, qty_on_hand, last_updated)
+                VALUES (r.product_id, v_expected, now())
+                ON CONFLICT (product_id) DO UPDATE SET
+                    qty_on_hand = EXCLUDED.qty_on_hand,
+                    last_updated = now();
+                v_repaired := true;
+                v_repaired_count := v_repaired_count + 1;
+            END IF;
+        END IF;
+
+        INSERT INTO inventory_reconciliation_discrepancies (run_id, product_id, balance_qty, ledger_qty, repaired)
+        VALUES (p_run_id, r.product_id, r.balance_qty, r.ledger_qty, v_repaired);
+
+        v_results := v_results || jsonb_build_object(
+            'product_id', r.product_id,
+            'balance_qty', r.balance_qty,
+            'ledger_qty', r.ledger_qty,
+            'repaired', v_repaired
+        );
+    END LOOP;
+
+    UPDATE inventory_reconciliation_runs
+    SET shards_completed = shards_completed + 1,
+        ledger_rows = ledger_rows + v_ledger_rows,
+        discrepancies = discrepancies + jsonb_array_length(v_results),
+        repaired = repaired + v_repaired_count
+    WHERE id = p_run_id;
+
+    RETURN jsonb_build_object(
+        'shard', p_shard,
+        'ledger_rows', v_ledger_rows,
+        'discrepancies', v_results
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Close a run: completed when every shard succeeded, failed otherwise
+CREATE OR REPLACE FUNCTION reconcile_inventory_finish(p_run_id UUID)
+RETURNS JSONB AS $$
+DECLARE
+    v_run inventory_reconciliation_runs;
+BEGIN
+    UPDATE inventory_reconciliation_runs
+    SET status = CASE WHEN shards_completed >= shards THEN 'completed' ELSE 'failed' END,
+        finished_at = now()
+    WHERE id = p_run_id AND status = 'running'
+    RETURNING * INTO v_run;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Reconciliation run % not found or already finished', p_run_id
+            USING ERRCODE = 'RB404';
+    END IF;
+
+    RETURN to_jsonb(v_run);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,88 @@
+-- Bulk stock-in (STORED PROCEDURE)
+-- Receives a whole goods receipt (e.g. a distributor invoice) in one round
+-- trip: validates every line set-wise, writes all ledger rows with a single
+-- INSERT ... SELECT in one transaction and returns the updated balances.
+--
+-- RULE: Stock is added ONLY by the update_balance_on_ledger_insert trigger.
+-- Business errors use SQLSTATE 'RBnnn' (see 006_create_sale_function.sql).
+
+-- Supplier document the stock was received against (invoice / GRN number)
+ALTER TABLE inventory_ledger ADD COLUMN IF NOT EXISTS supplier_ref TEXT;
+
+COMMENT ON COLUMN inventory_ledger.supplier_ref IS 'Supplier invoice / goods receipt reference for stock-in entries';
+
+CREATE OR REPLACE FUNCTION bulk_stock_in(
+    p_items JSONB,
+    p_reason TEXT DEFAULT 'PURCHASE',
+    p_supplier_ref TEXT DEFAULT NULL,
+    p_notes TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_missing TEXT;
+    v_balances JSONB;
+    v_count INT;
+BEGIN
+    IF p_reason NOT IN ('PURCHASE', 'ADJUSTMENT', 'RETURN') THEN
+        RAISE EXCEPTION 'reason must be one of: PURCHASE, ADJUSTMENT, RETURN'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    IF p_items IS NULL OR jsonb_array_length(p_items) = 0 THEN
+        RAISE EXCEPTION 'Stock-in must have at least one item'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+        WHERE c.product_id IS NULL OR c.quantity IS NULL OR c.quantity <= 0
+    ) THEN
+        RAISE EXCEPTION 'product_id and a positive quantity are required for all items'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    -- Validate all products exist in one query
+    SELECT string_agg(DISTINCT c.product_id::TEXT, ', ') INTO v_missing
+    FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+    LEFT JOIN products p ON p.id = c.product_id
+    WHERE p.id IS NULL;
+
+    IF v_missing IS NOT NULL THEN
+        RAISE EXCEPTION 'Products not found: %', v_missing
+            USING ERRCODE = 'RB404';
+    END IF;
+
+    -- Lock existing balance rows in product_id order (same order as create_sale)
+    -- so a receipt and concurrent sales cannot deadlock.
+    PERFORM 1
+    FROM inventory_balance b
+    WHERE b.product_id IN (
+        SELECT c.product_id FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+    )
+    ORDER BY b.product_id
+    FOR UPDATE;
+
+    -- One ledger row per line; the trigger adds each to inventory_balance
+    INSERT INTO inventory_ledger (product_id, qty_delta, reason, reference_id, notes, supplier_ref)
+    SELECT c.product_id, c.quantity, p_reason, NULL, COALESCE(c.notes, p_notes), p_supplier_ref
+    FROM jsonb_to_recordset(p_items) WITH ORDINALITY AS c(product_id UUID, quantity NUMERIC, notes TEXT, line_no BIGINT)
+    ORDER BY c.product_id, c.line_no;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    SELECT jsonb_agg(jsonb_build_object('product_id', b.product_id, 'qty_on_hand', b.qty_on_hand) ORDER BY b.product_id)
+    INTO v_balances
+    FROM inventory_balance b
+    WHERE b.product_id IN (
+        SELECT c.product_id FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+    );
+
+    RETURN jsonb_build_object(
+        'supplier_ref', p_supplier_ref,
+        'entries', v_count,
+        'balances', v_balances
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION bulk_stock_in(JSONB, TEXT, TEXT, TEXT) IS 'Bulk stock-in: validates all lines, writes all ledger rows in one transaction and returns the new balances.';
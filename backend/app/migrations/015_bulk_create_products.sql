@@ -0,0 +1,49 @@
+-- Bulk product import (FUNCTIONS)
+-- Set-based uniqueness checks and chunked inserts for catalog onboarding.
+-- Rows are validated in the API; these functions only touch the database
+-- once per chunk instead of several times per product.
+
+-- SKUs and barcodes from the given lists that already exist
+CREATE OR REPLACE FUNCTION find_existing_products(
+    p_skus TEXT[],
+    p_barcodes TEXT[]
+)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'skus', COALESCE((SELECT jsonb_agg(sku) FROM products WHERE sku = ANY(p_skus)), '[]'::JSONB),
+        'barcodes', COALESCE((SELECT jsonb_agg(barcode) FROM products WHERE barcode = ANY(p_barcodes)), '[]'::JSONB)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Insert a chunk of products with their zero balance rows in one transaction.
+-- Rows whose SKU or barcode was taken concurrently are skipped; the caller
+-- reports them from the returned list of created products.
+CREATE OR REPLACE FUNCTION bulk_create_products(p_products JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_created JSONB;
+BEGIN
+    WITH inserted AS (
+        INSERT INTO products (name, sku, barcode, unit, mrp, selling_price, tax_rate, category)
+        SELECT r.name, r.sku, r.barcode, r.unit, r.mrp, r.selling_price, COALESCE(r.tax_rate, 0), r.category
+        FROM jsonb_to_recordset(p_products) AS r(
+            name TEXT, sku TEXT, barcode TEXT, unit TEXT, mrp NUMERIC,
+            selling_price NUMERIC, tax_rate NUMERIC, category TEXT
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING id, sku, barcode
+    ), balances AS (
+        INSERT INTO inventory_balance (product_id, qty_on_hand)
+        SELECT id, 0 FROM inserted
+        ON CONFLICT (product_id) DO NOTHING
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'sku', sku, 'barcode', barcode)), '[]'::JSONB)
+    INTO v_created
+    FROM inserted;
+
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION find_existing_products(TEXT[], TEXT[]) IS 'Existing SKUs and barcodes among the given lists (bulk import uniqueness check).';
+COMMENT ON FUNCTION bulk_create_products(JSONB) IS 'Insert a chunk of products and their zero inventory_balance rows; conflicting rows are skipped.';
@@ -0,0 +1,60 @@
+-- Barcode Counter
+-- Persisted counter for in-store EAN-13 barcodes, allocated in blocks (hi/lo)
+-- like bill numbers (008_bill_number_counter.sql). Each API worker reserves a
+-- block with one call and hands codes out from memory, so generated barcodes
+-- never need a uniqueness lookup or retry.
+--
+-- Barcode = prefix (GS1 restricted-circulation range, default '200')
+--         + zero-padded counter + EAN-13 check digit
+
+CREATE TABLE IF NOT EXISTS barcode_counter (
+    prefix TEXT PRIMARY KEY CHECK (prefix ~ '^[0-9]{1,11}$'),
+    next_value BIGINT NOT NULL CHECK (next_value >= 1)
+);
+
+COMMENT ON TABLE barcode_counter IS 'Next unreserved barcode counter value per prefix. Only modified by reserve_barcodes().';
+
+-- Reserve p_block_size consecutive counter values for p_prefix.
+-- Returns the first value of the block.
+CREATE OR REPLACE FUNCTION reserve_barcodes(
+    p_prefix TEXT,
+    p_block_size INT
+)
+RETURNS BIGINT AS $$
+DECLARE
+    v_start BIGINT;
+    v_digits INT := 12 - length(p_prefix);
+BEGIN
+    IF p_block_size IS NULL OR p_block_size < 1 THEN
+        RAISE EXCEPTION 'block size must be positive'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    UPDATE barcode_counter
+    SET next_value = next_value + p_block_size
+    WHERE prefix = p_prefix
+    RETURNING next_value - p_block_size INTO v_start;
+
+    IF NOT FOUND THEN
+        -- First reservation: continue after barcodes already in the catalog
+        -- with this prefix (e.g. entered manually)
+        SELECT COALESCE(MAX(substr(barcode, length(p_prefix) + 1, v_digits)::BIGINT), 0) + 1 INTO v_start
+        FROM products
+        WHERE barcode LIKE p_prefix || '%'
+          AND barcode ~ '^[0-9]{13}$';
+
+        INSERT INTO barcode_counter (prefix, next_value)
+        VALUES (p_prefix, v_start + p_block_size)
+        ON CONFLICT (prefix) DO UPDATE
+            SET next_value = barcode_counter.next_value + p_block_size
+        RETURNING next_value - p_block_size INTO v_start;
+    END IF;
+
+    IF v_start + p_block_size - 1 >= power(10, v_digits) THEN
+        RAISE EXCEPTION 'Barcode range for prefix % is exhausted', p_prefix
+            USING ERRCODE = 'RB409';
+    END IF;
+
+    RETURN v_start;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,117 @@
+-- Idempotency Keys
+-- Stores the outcome of write requests sent with an Idempotency-Key header,
+-- so client retries (after timeouts, dropped connections...) replay the
+-- stored response instead of creating a second bill.
+--
+-- A key is claimed before the request executes (status 'in_progress') and
+-- completed with the response afterwards. Failed requests release the key.
+-- The lease lets another worker take over a key whose worker died mid-request.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope TEXT NOT NULL,  -- Endpoint family, e.g. 'sales'
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,  -- SHA-256 of the request body
+    status TEXT NOT NULL DEFAULT 'in_progress' CHECK (status IN ('in_progress', 'completed')),
+    status_code INT,
+    response JSONB,
+    locked_until TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+COMMENT ON TABLE idempotency_keys IS 'Idempotency-Key claims and stored responses. Rows expire after expires_at.';
+
+-- Claim a key. Returns {"state": ...}:
+--   claimed      the caller must execute the request, then complete or release
+--   completed    replay status_code / response
+--   in_progress  another attempt is executing; retry the claim later
+--   mismatch     the key was used with a different request body
+CREATE OR REPLACE FUNCTION claim_idempotency_key(
+    p_scope TEXT,
+    p_key TEXT,
+    p_request_hash TEXT,
+    p_ttl_seconds INT,
+    p_lease_seconds INT
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_row idempotency_keys;
+BEGIN
+    -- Occasionally purge expired keys
+    IF random() < 0.01 THEN
+        DELETE FROM idempotency_keys
+        WHERE ctid IN (SELECT ctid FROM idempotency_keys WHERE expires_at < now() LIMIT 1000);
+    END IF;
+
+    DELETE FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key AND expires_at < now();
+
+    INSERT INTO idempotency_keys (scope, key, request_hash, locked_until, expires_at)
+    VALUES (
+        p_scope, p_key, p_request_hash,
+        now() + make_interval(secs => p_lease_seconds),
+        now() + make_interval(secs => p_ttl_seconds)
+    )
+    ON CONFLICT (scope, key) DO NOTHING;
+
+    IF FOUND THEN
+        RETURN jsonb_build_object('state', 'claimed');
+    END IF;
+
+    SELECT * INTO v_row
+    FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key
+    FOR UPDATE;
+
+    IF v_row.request_hash <> p_request_hash THEN
+        RETURN jsonb_build_object('state', 'mismatch');
+    END IF;
+
+    IF v_row.status = 'completed' THEN
+        RETURN jsonb_build_object(
+            'state', 'completed',
+            'status_code', v_row.status_code,
+            'response', v_row.response
+        );
+    END IF;
+
+    -- In progress: take over when the holder's lease ran out
+    IF v_row.locked_until < now() THEN
+        UPDATE idempotency_keys
+        SET locked_until = now() + make_interval(secs => p_lease_seconds)
+        WHERE scope = p_scope AND key = p_key;
+        RETURN jsonb_build_object('state', 'claimed');
+    END IF;
+
+    RETURN jsonb_build_object('state', 'in_progress');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Store the response of a claimed key
+CREATE OR REPLACE FUNCTION complete_idempotency_key(
+    p_scope TEXT,
+    p_key TEXT,
+    p_status_code INT,
+    p_response JSONB
+)
+RETURNS VOID AS $$
+    UPDATE idempotency_keys
+    SET status = 'completed',
+        status_code = p_status_code,
+        response = p_response,
+        locked_until = NULL
+    WHERE scope = p_scope AND key = p_key;
+$$ LANGUAGE sql;
+
+-- Release a claimed key after a failed attempt so it can be retried
+CREATE OR REPLACE FUNCTION release_idempotency_key(
+    p_scope TEXT,
+    p_key TEXT
+)
+RETURNS VOID AS $$
+    DELETE FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key AND status = 'in_progress';
+$$ LANGUAGE sql;
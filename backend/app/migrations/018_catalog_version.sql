@@ -0,0 +1,45 @@
+-- Catalog Version
+-- Monotonic counter bumped by every statement that changes products, the
+-- ledger or balances. The API uses it as the ETag of catalog and inventory
+-- reads: when the version is unchanged, cached responses are still valid.
+--
+-- Sequences are not transactional: the bump is visible slightly before the
+-- writing transaction commits. The API therefore bounds how long a cached
+-- response is reused (RESPONSE_CACHE_TTL_SECONDS).
+
+CREATE SEQUENCE IF NOT EXISTS catalog_version_seq;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM nextval('catalog_version_seq');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level, so bulk writes bump the version once per statement
+DROP TRIGGER IF EXISTS bump_catalog_version_products ON products;
+CREATE TRIGGER bump_catalog_version_products
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_version_ledger ON inventory_ledger;
+CREATE TRIGGER bump_catalog_version_ledger
+    AFTER INSERT ON inventory_ledger
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_version_balance ON inventory_balance;
+CREATE TRIGGER bump_catalog_version_balance
+    AFTER INSERT OR UPDATE OR DELETE ON inventory_balance
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_catalog_version();
+
+-- Current version (no side effects)
+CREATE OR REPLACE FUNCTION catalog_version()
+RETURNS BIGINT AS $$
+    SELECT last_value FROM catalog_version_seq;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON SEQUENCE catalog_version_seq IS 'Bumped on every change to products, inventory_ledger or inventory_balance. Used for ETags.';
@@ -0,0 +1,11 @@
+-- Sales History Keyset Index
+-- GET /api/sales pages through bills newest first with a keyset on
+-- (created_at, id). Adding id to the created_at index lets the database
+-- read each page straight from the index (scanned backwards), whatever the
+-- page's depth, instead of sorting every bill with the same created_at.
+-- The payment_mode index serves the same pages filtered by payment mode.
+
+DROP INDEX IF EXISTS idx_sales_bill_created_at;
+CREATE INDEX IF NOT EXISTS idx_sales_bill_created_at ON sales_bill(created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_sales_bill_payment_mode_created_at ON sales_bill(payment_mode, created_at, id);
@@ -0,0 +1,120 @@
+-- Sales Report (FUNCTION + VIEW)
+-- Aggregates bills and bill items for owner reports and GST filing inside
+-- the database, so the API returns one row per group instead of every bill.
+--
+-- Groupings:
+--   day, hour, payment_mode  bill level (sales_bill totals); hour is the
+--                            store-local hour of day (0-23) across the range
+--   product, tax_rate        line level (sales_bill_items); taxable value is
+--                            unit_price x quantity, tax is taxable x tax_rate
+
+CREATE OR REPLACE FUNCTION sales_report(
+    p_from TIMESTAMPTZ,
+    p_to TIMESTAMPTZ,
+    p_group_by TEXT,
+    p_payment_mode TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_groups JSONB;
+    v_totals JSONB;
+BEGIN
+    IF p_group_by IS NULL OR p_group_by NOT IN ('day', 'hour', 'product', 'tax_rate', 'payment_mode') THEN
+        RAISE EXCEPTION 'group_by must be one of: day, hour, product, tax_rate, payment_mode'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    IF p_group_by IN ('day', 'hour', 'payment_mode') THEN
+        WITH bills AS (
+            SELECT
+                b.id,
+                b.subtotal,
+                b.tax_amount,
+                b.total,
+                CASE p_group_by
+                    WHEN 'day' THEN to_jsonb(store_local_time(b.created_at)::DATE)
+                    WHEN 'hour' THEN to_jsonb(EXTRACT(HOUR FROM store_local_time(b.created_at))::INT)
+                    ELSE to_jsonb(b.payment_mode)
+                END AS key
+            FROM sales_bill b
+            WHERE b.created_at >= p_from
+              AND b.created_at < p_to
+              AND (p_payment_mode IS NULL OR b.payment_mode = p_payment_mode)
+        ), lines AS (
+            SELECT i.bill_id, COUNT(*) AS lines, SUM(i.quantity) AS quantity
+            FROM sales_bill_items i
+            WHERE i.created_at >= p_from AND i.created_at < p_to
+            GROUP BY i.bill_id
+        )
+        SELECT jsonb_agg(to_jsonb(g) ORDER BY g.key) INTO v_groups
+        FROM (
+            SELECT
+                bills.key,
+                NULL::TEXT AS label,
+                COUNT(*) AS bills,
+                COALESCE(SUM(l.lines), 0) AS lines,
+                COALESCE(SUM(l.quantity), 0) AS quantity,
+                ROUND(SUM(bills.subtotal), 2) AS taxable_value,
+                ROUND(SUM(bills.tax_amount), 2) AS tax_amount,
+                ROUND(SUM(bills.total), 2) AS total
+            FROM bills
+            LEFT JOIN lines l ON l.bill_id = bills.id
+            GROUP BY bills.key
+        ) g;
+    ELSE
+        SELECT jsonb_agg(to_jsonb(g) ORDER BY g.total DESC, g.key) INTO v_groups
+        FROM (
+            SELECT
+                CASE p_group_by WHEN 'product' THEN to_jsonb(i.product_id) ELSE to_jsonb(i.tax_rate) END AS key,
+                CASE p_group_by WHEN 'product' THEN MAX(i.product_name) END AS label,
+                COUNT(DISTINCT i.bill_id) AS bills,
+                COUNT(*) AS lines,
+                SUM(i.quantity) AS quantity,
+                ROUND(SUM(i.unit_price * i.quantity), 2) AS taxable_value,
+                ROUND(SUM(i.unit_price * i.quantity * i.tax_rate / 100), 2) AS tax_amount,
+                ROUND(SUM(i.line_total), 2) AS total
+            FROM sales_bill_items i
+            JOIN sales_bill b ON b.id = i.bill_id
+            WHERE i.created_at >= p_from
+              AND i.created_at < p_to
+              AND (p_payment_mode IS NULL OR b.payment_mode = p_payment_mode)
+            GROUP BY 1
+        ) g;
+    END IF;
+
+    SELECT jsonb_build_object(
+        'bills', COUNT(*),
+        'taxable_value', ROUND(COALESCE(SUM(b.subtotal), 0), 2),
+        'tax_amount', ROUND(COALESCE(SUM(b.tax_amount), 0), 2),
+        'total', ROUND(COALESCE(SUM(b.total), 0), 2)
+    ) INTO v_totals
+    FROM sales_bill b
+    WHERE b.created_at >= p_from
+      AND b.created_at < p_to
+      AND (p_payment_mode IS NULL OR b.payment_mode = p_payment_mode);
+
+    RETURN jsonb_build_object('groups', COALESCE(v_groups, '[]'::JSONB), 'totals', v_totals);
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Bill lines with their bill's number and payment mode, for row-level
+-- report exports scanned in keyset-ordered chunks of (created_at, id)
+CREATE OR REPLACE VIEW sales_report_lines AS
+SELECT
+    i.id,
+    i.created_at,
+    i.bill_id,
+    b.bill_number,
+    b.payment_mode,
+    i.product_id,
+    i.product_name,
+    i.quantity,
+    i.unit_price,
+    i.tax_rate,
+    i.line_total
+FROM sales_bill_items i
+JOIN sales_bill b ON b.id = i.bill_id;
+
+-- Comments
+COMMENT ON FUNCTION sales_report(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT) IS 'Sales aggregates by day, hour, product, tax_rate or payment_mode for [p_from, p_to).';
+COMMENT ON VIEW sales_report_lines IS 'Bill lines with bill number and payment mode, for report exports. Read-only.';
@@ -0,0 +1,52 @@
+-- Product Search (TRIGRAM INDEXES + FUNCTION)
+-- Typeahead search by name or SKU. The API answers from an in-memory index
+-- built at startup (app/modules/products/search.py); this function serves
+-- searches until that build completes (cold starts) and the indexes keep it
+-- off sequential scans.
+--
+-- Ranking mirrors the in-memory index: exact SKU, SKU prefix, name prefix,
+-- substring match (shorter names first), then trigram similarity for typos.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_products_sku_trgm ON products USING GIN (lower(sku) gin_trgm_ops);
+
+CREATE OR REPLACE FUNCTION search_products(
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS SETOF product_catalog AS $$
+    WITH q AS (
+        SELECT
+            lower(trim(p_query)) AS text,
+            replace(replace(replace(lower(trim(p_query)), '\', '\\'), '%', '\%'), '_', '\_') AS pattern
+    ),
+    ranked AS (
+        SELECT
+            c.*,
+            CASE
+                WHEN lower(c.sku) = q.text THEN 0
+                WHEN lower(c.sku) LIKE q.pattern || '%' THEN 1
+                WHEN lower(c.name) LIKE q.pattern || '%' THEN 2
+                WHEN lower(c.name) LIKE '%' || q.pattern || '%' OR lower(c.sku) LIKE '%' || q.pattern || '%' THEN 3
+                ELSE 4
+            END AS match,
+            GREATEST(similarity(lower(c.name), q.text), similarity(lower(c.sku), q.text)) AS score
+        FROM product_catalog c, q
+        WHERE q.text <> ''
+          AND (
+              lower(c.name) LIKE '%' || q.pattern || '%'
+              OR lower(c.sku) LIKE '%' || q.pattern || '%'
+              OR lower(c.name) % q.text
+              OR lower(c.sku) % q.text
+          )
+    )
+    SELECT id, name, sku, barcode, unit, mrp, selling_price, tax_rate, created_at, qty_on_hand, category
+    FROM ranked
+    ORDER BY match, score DESC, length(name), name
+    LIMIT LEAST(GREATEST(p_limit, 1), 100);
+$$ LANGUAGE sql STABLE;
+
+-- Comments
+COMMENT ON FUNCTION search_products(TEXT, INTEGER) IS 'Ranked product_catalog rows matching a partial name or SKU (substring or trigram similarity).';
@@ -0,0 +1,16 @@
+-- Event Feed Keyset Indexes
+-- The live update broker (app/core/events.py) follows inventory_ledger,
+-- sales_bill and notifications by polling for rows after the last
+-- (created_at, id) it has seen. sales_bill already has that index
+-- (migration 019); these serve the other two feeds, so each poll reads
+-- only the new rows from the index.
+
+CREATE INDEX IF NOT EXISTS idx_inventory_ledger_created_at_id ON inventory_ledger(created_at, id);
+
+-- notifications is created outside these migrations
+DO $$
+BEGIN
+    IF to_regclass('public.notifications') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_notifications_created_at_id ON notifications(created_at, id);
+    END IF;
+END $$;
@@ -0,0 +1,119 @@
+-- Idempotency Key Written With The Sale
+-- A sale whose response never reached the API (query timeout, dropped
+-- connection, worker killed) may still have committed. Recording the bill
+-- id on the claimed key in the sale's own transaction makes that
+-- observable: a retry of the key then replays the committed bill instead
+-- of billing again, whether or not the first attempt managed to store its
+-- response.
+--
+-- create_sale(p_bill_number, p_payment_mode, p_items, p_idempotency_key)
+-- wraps the function of migration 006 in the same transaction. The new
+-- parameter has no default, so calls without it still resolve to the
+-- original function unambiguously.
+
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS result_ref TEXT;
+
+COMMENT ON COLUMN idempotency_keys.result_ref IS 'Id of the record the request created, written in the same transaction (e.g. sales_bill.id).';
+
+CREATE OR REPLACE FUNCTION create_sale(
+    p_bill_number TEXT,
+    p_payment_mode TEXT,
+    p_items JSONB,
+    p_idempotency_key TEXT
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_bill JSONB;
+BEGIN
+    v_bill := create_sale(p_bill_number, p_payment_mode, p_items);
+
+    IF p_idempotency_key IS NOT NULL THEN
+        UPDATE idempotency_keys
+        SET result_ref = v_bill->>'id'
+        WHERE scope = 'sales' AND key = p_idempotency_key;
+    END IF;
+
+    RETURN v_bill;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION create_sale(TEXT, TEXT, JSONB, TEXT) IS 'create_sale that also records the bill id on its claimed Idempotency-Key (scope sales), atomically.';
+
+-- Claim a key. Same states as migration 017, plus:
+--   committed    an attempt committed (result_ref) but its response was not
+--                stored; rebuild the response from result_ref
+CREATE OR REPLACE FUNCTION claim_idempotency_key(
+    p_scope TEXT,
+    p_key TEXT,
+    p_request_hash TEXT,
+    p_ttl_seconds INT,
+    p_lease_seconds INT
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_row idempotency_keys;
+BEGIN
+    -- Occasionally purge expired keys
+    IF random() < 0.01 THEN
+        DELETE FROM idempotency_keys
+        WHERE ctid IN (SELECT ctid FROM idempotency_keys WHERE expires_at < now() LIMIT 1000);
+    END IF;
+
+    DELETE FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key AND expires_at < now();
+
+    INSERT INTO idempotency_keys (scope, key, request_hash, locked_until, expires_at)
+    VALUES (
+        p_scope, p_key, p_request_hash,
+        now() + make_interval(secs => p_lease_seconds),
+        now() + make_interval(secs => p_ttl_seconds)
+    )
+    ON CONFLICT (scope, key) DO NOTHING;
+
+    IF FOUND THEN
+        RETURN jsonb_build_object('state', 'claimed');
+    END IF;
+
+    SELECT * INTO v_row
+    FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key
+    FOR UPDATE;
+
+    IF v_row.request_hash <> p_request_hash THEN
+        RETURN jsonb_build_object('state', 'mismatch');
+    END IF;
+
+    IF v_row.status = 'completed' THEN
+        RETURN jsonb_build_object(
+            'state', 'completed',
+            'status_code', v_row.status_code,
+            'response', v_row.response
+        );
+    END IF;
+
+    IF v_row.result_ref IS NOT NULL THEN
+        RETURN jsonb_build_object('state', 'committed', 'result_ref', v_row.result_ref);
+    END IF;
+
+    -- In progress: take over when the holder's lease ran out. Without a
+    -- result_ref the holder's transaction did not commit.
+    IF v_row.locked_until < now() THEN
+        UPDATE idempotency_keys
+        SET locked_until = now() + make_interval(secs => p_lease_seconds)
+        WHERE scope = p_scope AND key = p_key;
+        RETURN jsonb_build_object('state', 'claimed');
+    END IF;
+
+    RETURN jsonb_build_object('state', 'in_progress');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Release a claimed key after a failed attempt, unless that attempt committed
+CREATE OR REPLACE FUNCTION release_idempotency_key(
+    p_scope TEXT,
+    p_key TEXT
+)
+RETURNS VOID AS $$
+    DELETE FROM idempotency_keys
+    WHERE scope = p_scope AND key = p_key AND status = 'in_progress' AND result_ref IS NULL;
+$$ LANGUAGE sql;
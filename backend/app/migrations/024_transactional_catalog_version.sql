@@ -0,0 +1,64 @@
+-- Transactional Catalog Version
+-- The sequence of migration 018 is bumped when a statement runs, before its
+-- transaction commits. A read in between saw the new version with the old
+-- data and cached that body under the new ETag until the next change.
+--
+-- The version is now a row updated inside the writing transaction, so it
+-- becomes visible together with the data. The update runs from a deferred
+-- trigger, at commit: the row lock is the writer's last lock and is held
+-- only until the commit completes, so concurrent sales neither deadlock on
+-- it nor wait on it for the length of their transactions.
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INT PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL
+);
+
+INSERT INTO catalog_version (id, version)
+SELECT 1, last_value FROM catalog_version_seq
+ON CONFLICT (id) DO NOTHING;
+
+COMMENT ON TABLE catalog_version IS 'Incremented by every transaction that changes products, inventory_ledger or inventory_balance, at commit. Used for ETags.';
+
+-- Row triggers fire once per changed row; only the first one in a
+-- transaction updates the version
+CREATE OR REPLACE FUNCTION bump_catalog_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('retail_boss.catalog_version_bumped', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('retail_boss.catalog_version_bumped', 'on', true);
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_catalog_version_products ON products;
+CREATE CONSTRAINT TRIGGER bump_catalog_version_products
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_version_ledger ON inventory_ledger;
+CREATE CONSTRAINT TRIGGER bump_catalog_version_ledger
+    AFTER INSERT ON inventory_ledger
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_version_balance ON inventory_balance;
+CREATE CONSTRAINT TRIGGER bump_catalog_version_balance
+    AFTER INSERT OR UPDATE OR DELETE ON inventory_balance
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_catalog_version();
+
+-- Current version (no side effects)
+CREATE OR REPLACE FUNCTION catalog_version()
+RETURNS BIGINT AS $$
+    SELECT version FROM catalog_version WHERE id = 1;
+$$ LANGUAGE sql STABLE;
+
+DROP SEQUENCE IF EXISTS catalog_version_seq;
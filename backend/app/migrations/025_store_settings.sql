@@ -0,0 +1,48 @@
+-- Store Settings
+-- store_local_time() (migration 010) hard-coded the store timezone,
+-- duplicating STORE_TIMEZONE in the API configuration. The timezone is now
+-- a row that store_local_time() reads and that the API writes from
+-- STORE_TIMEZONE at startup (configure_store), so the configuration is the
+-- only place it is set. The sales rollups are bucketed by local day and
+-- hour, so changing the timezone rebuilds them.
+
+CREATE TABLE IF NOT EXISTS store_settings (
+    id INT PRIMARY KEY CHECK (id = 1),
+    timezone TEXT NOT NULL
+);
+
+INSERT INTO store_settings (id, timezone)
+VALUES (1, 'Asia/Kolkata')
+ON CONFLICT (id) DO NOTHING;
+
+COMMENT ON TABLE store_settings IS 'Store configuration read by the database (single row). Written by the API at startup.';
+
+-- Store-local time used for day/hour buckets
+CREATE OR REPLACE FUNCTION store_local_time(p_ts TIMESTAMPTZ)
+RETURNS TIMESTAMP AS $$
+    SELECT p_ts AT TIME ZONE (SELECT timezone FROM store_settings WHERE id = 1);
+$$ LANGUAGE sql STABLE;
+
+-- Set the store timezone; rebuilds the sales rollups when it changes
+CREATE OR REPLACE FUNCTION configure_store(p_timezone TEXT)
+RETURNS JSONB AS $$
+DECLARE
+    v_current TEXT;
+BEGIN
+    -- Rejects unknown zone names
+    PERFORM now() AT TIME ZONE p_timezone;
+
+    SELECT timezone INTO v_current
+    FROM store_settings
+    WHERE id = 1
+    FOR UPDATE;
+
+    IF v_current = p_timezone THEN
+        RETURN jsonb_build_object('changed', false);
+    END IF;
+
+    UPDATE store_settings SET timezone = p_timezone WHERE id = 1;
+
+    RETURN jsonb_build_object('changed', true, 'rollups', rebuild_sales_rollups());
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,179 @@
+-- Sales Rollups Written At The End Of create_sale
+-- The row triggers of migration 010 upserted a shared rollup row for every
+-- bill and bill line as soon as it was inserted, and held those row locks
+-- for the rest of the sale. Lines were inserted in cart order, so two sales
+-- touching the same categories in opposite order could deadlock, and every
+-- sale of the same payment mode and hour waited on one row for the length
+-- of the other's transaction.
+--
+-- create_sale now adds the bill to the rollups as its last step: one
+-- payment row, then one row per category in category order. Every sale
+-- takes these locks in the same order and holds them only until commit.
+-- Bills inserted outside create_sale are counted by rebuild_sales_rollups().
+
+DROP TRIGGER IF EXISTS rollup_on_sales_bill_insert ON sales_bill;
+DROP TRIGGER IF EXISTS rollup_on_sales_bill_item_insert ON sales_bill_items;
+DROP FUNCTION IF EXISTS rollup_sales_bill();
+DROP FUNCTION IF EXISTS rollup_sales_bill_item();
+
+-- Add one bill (aggregated per category) to the rollups
+CREATE OR REPLACE FUNCTION rollup_sale(p_bill_id UUID)
+RETURNS VOID AS $$
+DECLARE
+    v_bill sales_bill;
+    v_local TIMESTAMP;
+BEGIN
+    SELECT * INTO v_bill FROM sales_bill WHERE id = p_bill_id;
+    v_local := store_local_time(v_bill.created_at);
+
+    INSERT INTO sales_rollup_payment (sale_date, sale_hour, payment_mode, bill_count, subtotal, tax_amount, total)
+    VALUES (v_local::DATE, EXTRACT(HOUR FROM v_local), v_bill.payment_mode, 1, v_bill.subtotal, v_bill.tax_amount, v_bill.total)
+    ON CONFLICT (store_id, sale_date, sale_hour, payment_mode)
+    DO UPDATE SET
+        bill_count = sales_rollup_payment.bill_count + 1,
+        subtotal = sales_rollup_payment.subtotal + EXCLUDED.subtotal,
+        tax_amount = sales_rollup_payment.tax_amount + EXCLUDED.tax_amount,
+        total = sales_rollup_payment.total + EXCLUDED.total;
+
+    -- Category order, so concurrent sales lock shared rows in the same order
+    INSERT INTO sales_rollup_category (sale_date, sale_hour, category, line_count, quantity, revenue)
+    SELECT
+        v_local::DATE,
+        EXTRACT(HOUR FROM v_local),
+        COALESCE(p.category, 'Others'),
+        COUNT(*),
+        SUM(i.quantity),
+        SUM(i.line_total)
+    FROM sales_bill_items i
+    LEFT JOIN products p ON p.id = i.product_id
+    WHERE i.bill_id = p_bill_id
+    GROUP BY COALESCE(p.category, 'Others')
+    ORDER BY COALESCE(p.category, 'Others')
+    ON CONFLICT (store_id, sale_date, sale_hour, category)
+    DO UPDATE SET
+        line_count = sales_rollup_category.line_count + EXCLUDED.line_count,
+        quantity = sales_rollup_category.quantity + EXCLUDED.quantity,
+        revenue = sales_rollup_category.revenue + EXCLUDED.revenue;
+END;
+$$ LANGUAGE plpgsql;
+
+-- create_sale of migration 006, with the rollup step at the end
+CREATE OR REPLACE FUNCTION create_sale(
+    p_bill_number TEXT,
+    p_payment_mode TEXT,
+    p_items JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_bill sales_bill;
+    v_items JSONB;
+    v_missing UUID;
+    v_short RECORD;
+BEGIN
+    IF p_payment_mode NOT IN ('cash', 'upi', 'card') THEN
+        RAISE EXCEPTION 'payment_mode must be one of: cash, upi, card'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    IF p_items IS NULL OR jsonb_array_length(p_items) = 0 THEN
+        RAISE EXCEPTION 'Sale must have at least one item'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+        WHERE c.product_id IS NULL OR c.quantity IS NULL OR c.quantity <= 0
+    ) THEN
+        RAISE EXCEPTION 'product_id and a positive quantity are required for all items'
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    -- Lock the balance rows of every product in the cart.
+    -- Rows are locked in product_id order so concurrent sales cannot deadlock.
+    PERFORM 1
+    FROM inventory_balance b
+    WHERE b.product_id IN (
+        SELECT c.product_id FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+    )
+    ORDER BY b.product_id
+    FOR UPDATE;
+
+    -- Validate products exist
+    SELECT c.product_id INTO v_missing
+    FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+    LEFT JOIN products p ON p.id = c.product_id
+    WHERE p.id IS NULL
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'Product % not found', v_missing
+            USING ERRCODE = 'RB404';
+    END IF;
+
+    -- Validate stock (a product may appear on several cart lines)
+    SELECT p.name, COALESCE(b.qty_on_hand, 0) AS available, d.requested INTO v_short
+    FROM (
+        SELECT c.product_id, SUM(c.quantity) AS requested
+        FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+        GROUP BY c.product_id
+    ) d
+    JOIN products p ON p.id = d.product_id
+    LEFT JOIN inventory_balance b ON b.product_id = d.product_id
+    WHERE COALESCE(b.qty_on_hand, 0) < d.requested
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'Insufficient stock for %. Available: %, Requested: %',
+            v_short.name, v_short.available, v_short.requested
+            USING ERRCODE = 'RB400';
+    END IF;
+
+    -- Create sales bill (totals computed from current catalog prices)
+    INSERT INTO sales_bill (bill_number, subtotal, tax_amount, total, payment_mode)
+    SELECT
+        p_bill_number,
+        ROUND(SUM(l.line_subtotal), 2),
+        ROUND(SUM(l.line_tax), 2),
+        ROUND(SUM(l.line_subtotal + l.line_tax), 2),
+        p_payment_mode
+    FROM (
+        SELECT
+            p.selling_price * c.quantity AS line_subtotal,
+            p.selling_price * c.quantity * COALESCE(p.tax_rate, 0) / 100 AS line_tax
+        FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC)
+        JOIN products p ON p.id = c.product_id
+    ) l
+    RETURNING * INTO v_bill;
+
+    -- Create bill items (SNAPSHOT data), preserving cart order
+    WITH inserted AS (
+        INSERT INTO sales_bill_items (bill_id, product_id, product_name, unit_price, quantity, tax_rate, line_total)
+        SELECT
+            v_bill.id,
+            p.id,
+            p.name,
+            p.selling_price,
+            c.quantity,
+            COALESCE(p.tax_rate, 0),
+            p.selling_price * c.quantity * (1 + COALESCE(p.tax_rate, 0) / 100)
+        FROM jsonb_to_recordset(p_items) WITH ORDINALITY AS c(product_id UUID, quantity NUMERIC, line_no BIGINT)
+        JOIN products p ON p.id = c.product_id
+        ORDER BY c.line_no
+        RETURNING *
+    )
+    SELECT jsonb_agg(to_jsonb(inserted)) INTO v_items FROM inserted;
+
+    -- Create ledger entries (negative qty for stock out).
+    -- The update_balance_on_ledger_insert trigger deducts inventory_balance.
+    INSERT INTO inventory_ledger (product_id, qty_delta, reason, reference_id, notes)
+    SELECT c.product_id, -c.quantity, 'SALE', v_bill.id, 'Sale: ' || p_bill_number
+    FROM jsonb_to_recordset(p_items) AS c(product_id UUID, quantity NUMERIC);
+
+    -- Last: the shared rollup rows stay locked only until commit
+    PERFORM rollup_sale(v_bill.id);
+
+    RETURN to_jsonb(v_bill) || jsonb_build_object('items', v_items);
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION create_sale(TEXT, TEXT, JSONB) IS 'Atomic sale commit: validates cart, writes bill, items and ledger in one transaction, then adds the bill to the sales rollups. Stock is deducted by the ledger trigger.';
@@ -0,0 +1,224 @@
+import asyncio
+import numpy as np
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Dict, List
+from zoneinfo import ZoneInfo
+from app.core.config import settings
+from app.core.db import scan_pages
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+# Basket sizes above this are counted in the last bucket
+MAX_BASKET_SIZE = 50
+
+TOP_PRODUCTS = 10
+
+
+class _Accumulator:
+    """
+    Running aggregates for one analytics run.
+
+    Each chunk is reduced with NumPy (unique + bincount) and only the reduced
+    values are folded in, so memory stays bounded by the number of products
+    and time buckets, not by the number of rows scanned.
+    """
+
+    def __init__(self):
+        self.bill_count = 0
+        self.revenue = 0.0
+        self.hour_revenue = np.zeros(24)
+        self.hour_bills = np.zeros(24, dtype=np.int64)
+        self.basket_sizes = np.zeros(MAX_BASKET_SIZE + 1, dtype=np.int64)
+        self.payment: Dict[str, List[float]] = {}
+        self.trend: Dict[str, float] = {}
+        self.products: Dict[str, List[Any]] = {}
+
+    def add_bills(self, rows: List[Dict[str, Any]], granularity: str) -> None:
+        totals = np.fromiter((float(r["total"]) for r in rows), dtype=np.float64, count=len(rows))
+        hours = np.fromiter((int(r["sale_hour"]) for r in rows), dtype=np.int64, count=len(rows))
+        item_counts = np.fromiter((int(r["item_count"]) for r in rows), dtype=np.int64, count=len(rows))
+        days = np.array([r["sale_date"] for r in rows], dtype="datetime64[D]")
+        modes = np.array([r["payment_mode"] for r in rows])
+
+        self.bill_count += len(rows)
+        self.revenue += float(totals.sum())
+
+        # Peak hours
+        self.hour_revenue += np.bincount(hours, weights=totals, minlength=24)
+        self.hour_bills += np.bincount(hours, minlength=24)
+
+        # Basket size distribution (lines per bill)
+        self.basket_sizes += np.bincount(np.minimum(item_counts, MAX_BASKET_SIZE), minlength=MAX_BASKET_SIZE + 1)
+
+        # Payment mode mix
+        mode_keys, mode_index = np.unique(modes, return_inverse=True)
+        mode_counts = np.bincount(mode_index)
+        mode_totals = np.bincount(mode_index, weights=totals)
+        for mode, count, total in zip(mode_keys.tolist(), mode_counts.tolist(), mode_totals.tolist()):
+            entry = self.payment.setdefault(mode, [0, 0.0])
+            entry[0] += count
+            entry[1] += total
+
+        # Revenue trend
+        buckets = _bucket(days, hours, granularity)
+        bucket_keys, bucket_index = np.unique(buckets, return_inverse=True)
+        bucket_totals = np.bincount(bucket_index, weights=totals)
+        for key, total in zip(bucket_keys.astype(str).tolist(), bucket_totals.tolist()):
+            self.trend[key] = self.trend.get(key, 0.0) + total
+
+    def add_items(self, rows: List[Dict[str, Any]]) -> None:
+        product_ids = np.array([r["product_id"] or "" for r in rows])
+        quantities = np.fromiter((float(r["quantity"]) for r in rows), dtype=np.float64, count=len(rows))
+        line_totals = np.fromiter((float(r["line_total"]) for r in rows), dtype=np.float64, count=len(rows))
+
+        keys, first_index, index = np.unique(product_ids, return_index=True, return_inverse=True)
+        qty_sums = np.bincount(index, weights=quantities)
+        revenue_sums = np.bincount(index, weights=line_totals)
+
+        for key, first, qty, revenue in zip(keys.tolist(), first_index.tolist(), qty_sums.tolist(), revenue_sums.tolist()):
+            entry = self.products.get(key)
+            if entry is None:
+                self.products[key] = [rows[first]["product_name"], qty, revenue]
+            else:
+                entry[1] += qty
+                entry[2] += revenue
+
+
+def _bucket(days: np.ndarray, hours: np.ndarray, granularity: str) -> np.ndarray:
+    """Map (day, hour) arrays to trend bucket start values"""
+    if granularity == "hour":
+        return days.astype("datetime64[h]") + hours.astype("timedelta64[h]")
+    if granularity == "week":
+        # Monday-based weeks (1970-01-01 was a Thursday)
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype("timedelta64[D]")
+    if granularity == "month":
+        return days.astype("datetime64[M]")
+    return days
+
+
+class AnalyticsEngine:
+    """
+    Sales analytics computed from analytics_bill_facts / analytics_item_facts.
+
+    Rows are scanned in keyset-ordered chunks of ANALYTICS_CHUNK_SIZE and
+    aggregated with vectorized NumPy operations. The bill and item scans run
+    concurrently.
+    """
+
+    def __init__(self, chunk_size: int = None):
+        self.chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+
+    async def compute(self, db, start: date, end: date, granularity: str = "day") -> Dict[str, Any]:
+        """
+        Compute analytics for store-local dates start..end (inclusive).
+
+        Args:
+            db: Active database
+            start: First date
+            end: Last date
+            granularity: Revenue trend bucket: hour, day, week or month
+
+        Returns:
+            Aggregated analytics payload
+        """
+        tz = ZoneInfo(settings.STORE_TIMEZONE)
+        start_ts = datetime.combine(start, time.min, tzinfo=tz).isoformat()
+        end_ts = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz).isoformat()
+
+        acc = _Accumulator()
+
+        async def scan_bills():
+            async for rows in self._scan(db, "analytics_bill_facts",
+                                         "id, created_at, sale_date, sale_hour, payment_mode, total, item_count",
+                                         start_ts, end_ts):
+                acc.add_bills(rows, granularity)
+
+        async def scan_items():
+            async for rows in self._scan(db, "analytics_item_facts",
+                                         "id, created_at, product_id, product_name, quantity, line_total",
+                                         start_ts, end_ts):
+                acc.add_items(rows)
+
+        await asyncio.gather(scan_bills(), scan_items())
+
+        return self._result(acc, start, end)
+
+    def _scan(self, db, view: str, columns: str, start_ts: str, end_ts: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield rows of `view` with start_ts <= created_at < end_ts, chunk by chunk"""
+        return scan_pages(
+            lambda: db.table(view)
+                .select(columns)
+                .gte("created_at", start_ts)
+                .lt("created_at", end_ts),
+            ("created_at", "id"),
+            self.chunk_size
+        )
+
+    def _result(self, acc: _Accumulator, start: date, end: date) -> Dict[str, Any]:
+        days = (end - start).days + 1
+
+        # Two-hour windows from 6 AM to 10 PM, averaged per day in range
+        windows = []
+        for hour in range(6, 22, 2):
+            windows.append({
+                "label": f"{_hour_label(hour)}-{_hour_label(hour + 2)}",
+                "average": round(float(acc.hour_revenue[hour:hour + 2].sum()) / days, 2),
+                "morning": hour < 12
+            })
+        morning = max((w for w in windows if w["morning"]), key=lambda w: w["average"])
+        evening = max((w for w in windows if not w["morning"]), key=lambda w: w["average"])
+
+        products = [
+            {"product_id": pid or None, "name": name, "quantity": round(qty, 3), "revenue": round(revenue, 2)}
+            for pid, (name, qty, revenue) in acc.products.items()
+        ]
+
+        basket_total = int(acc.basket_sizes.sum())
+        avg_basket = float((acc.basket_sizes * np.arange(MAX_BASKET_SIZE + 1)).sum()) / basket_total if basket_total else 0.0
+        last_size = int(np.max(np.nonzero(acc.basket_sizes)[0])) if basket_total else 0
+
+        return {
+            "range": {"start": start.isoformat(), "end": end.isoformat()},
+            "summary": {
+                "bills": acc.bill_count,
+                "revenue": round(acc.revenue, 2),
+                "averageBill": round(acc.revenue / acc.bill_count, 2) if acc.bill_count else 0,
+                "averageBasketSize": round(avg_basket, 2)
+            },
+            "peakHours": {
+                "labels": [w["label"] for w in windows],
+                "data": [w["average"] for w in windows],
+                "insights": [
+                    {"period": f"Morning: {morning['label']}", "average": morning["average"]},
+                    {"period": f"Evening: {evening['label']}", "average": evening["average"]}
+                ]
+            },
+            "hourly": {
+                "labels": [_hour_label(h) for h in range(24)],
+                "revenue": [round(v, 2) for v in acc.hour_revenue.tolist()],
+                "bills": acc.hour_bills.tolist()
+            },
+            "paymentModes": [
+                {"mode": mode, "bills": int(count), "total": round(total, 2)}
+                for mode, (count, total) in sorted(acc.payment.items(), key=lambda m: m[1][1], reverse=True)
+            ],
+            "topProducts": {
+                "byRevenue": sorted(products, key=lambda p: p["revenue"], reverse=True)[:TOP_PRODUCTS],
+                "byQuantity": sorted(products, key=lambda p: p["quantity"], reverse=True)[:TOP_PRODUCTS]
+            },
+            "basketSizes": {
+                "labels": [str(size) if size < MAX_BASKET_SIZE else f"{MAX_BASKET_SIZE}+" for size in range(1, last_size + 1)],
+                "data": acc.basket_sizes[1:last_size + 1].tolist()
+            },
+            "trend": {
+                "labels": sorted(acc.trend.keys()),
+                "data": [round(acc.trend[key], 2) for key in sorted(acc.trend.keys())]
+            }
+        }
+
+
+def _hour_label(hour: int) -> str:
+    hour = hour % 24
+    suffix = "AM" if hour < 12 else "PM"
+    return f"{hour % 12 or 12} {suffix}"
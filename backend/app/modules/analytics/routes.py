@@ -1,10 +1,19 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from app.modules.analytics.service import AnalyticsService
+from app.modules.analytics.engine import GRANULARITIES
+from datetime import date
+from typing import Optional
 
 router = APIRouter()
 service = AnalyticsService()
 
 @router.get("/")
-async def get_analytics():
-    """Get analytics data"""
-    return await service.get_analytics()
+async def get_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern=f"^({'|'.join(GRANULARITIES)})$")
+):
+    """Get analytics data for a date range (default: last 30 days)"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await service.get_analytics(start=start, end=end, granularity=granularity)
@@ -1,10 +1,40 @@
-from app.core.db import supabase
+from app.core.db import get_db
+from app.core.config import settings
+from app.modules.analytics.engine import AnalyticsEngine
+from app.utils.cache import TTLCache
+from datetime import date, datetime, timedelta
 from typing import Dict, Any
+from zoneinfo import ZoneInfo
 
 class AnalyticsService:
-    async def get_analytics(self) -> Dict[str, Any]:
-        """Get analytics data"""
-        if supabase is None:
+    def __init__(self):
+        self.engine = AnalyticsEngine()
+        # Results per (start, end, granularity)
+        self.cache = TTLCache(
+            maxsize=settings.ANALYTICS_CACHE_SIZE,
+            ttl=settings.ANALYTICS_CACHE_TTL_SECONDS
+        )
+
+    async def get_analytics(self, start: date = None, end: date = None, granularity: str = "day") -> Dict[str, Any]:
+        """
+        Get analytics data.
+        
+        Peak hours, payment mix, top products, basket sizes and the revenue
+        trend are computed by AnalyticsEngine for store-local dates
+        start..end and cached per (range, granularity). There is no
+        forecast (null) or customer ranking (empty) yet; mock mode returns
+        sample figures for both.
+        
+        Args:
+            start: First date (default: 29 days before end)
+            end: Last date (default: today)
+            granularity: Revenue trend bucket: hour, day, week or month
+            
+        Returns:
+            Dictionary with analytics data
+        """
+        db = get_db()
+        if db is None:
             # Return mock data
             return {
                 "forecast": {
@@ -49,31 +79,21 @@ class AnalyticsService:
                 }
             }
         
+        end = end or datetime.now(ZoneInfo(settings.STORE_TIMEZONE)).date()
+        start = start or end - timedelta(days=29)
+        
         try:
-            # TODO: Implement actual analytics queries
-            # For now, return mock data
-            return {
-                "forecast": {
-                    "accuracy": 92,
-                    "data": {
-                        "labels": ["Today", "Day 2", "Day 3", "Day 4", "Day 5", "Day 6", "Day 7"],
-                        "actual": [45000, None, None, None, None, None, None],
-                        "predicted": [45000, 47000, 49000, 48000, 52000, 58000, 55000]
-                    },
-                    "insights": [
-                        "Expected 18% increase on Saturday (weekend rush)",
-                        "Stock up 30% more for upcoming festival week"
-                    ]
-                },
-                "customers": [],
-                "peakHours": {
-                    "labels": ["6-8 AM", "8-10 AM", "10-12 PM", "12-2 PM", "2-4 PM", "4-6 PM", "6-8 PM", "8-10 PM"],
-                    "data": [3500, 8500, 6000, 7500, 5000, 9000, 15200, 8000],
-                    "insights": [
-                        {"period": "Morning: 8-10 AM", "average": 8500},
-                        {"period": "Evening: 6-8 PM", "average": 15200}
-                    ]
-                }
-            }
+            key = (start, end, granularity)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            
+            result = await self.engine.compute(db, start, end, granularity)
+            # No forecasting model, and bills do not record customers
+            result["forecast"] = None
+            result["customers"] = []
+            
+            self.cache.set(key, result)
+            return result
         except Exception as e:
             raise Exception(f"Error fetching analytics: {str(e)}")
@@ -0,0 +1,50 @@
+"""
+Rebuild the dashboard sales rollups from sales_bill / sales_bill_items.
+
+Usage:
+    python -m app.modules.dashboard.backfill            # rebuild everything
+    python -m app.modules.dashboard.backfill --from 2024-01-01
+
+New sales are blocked while the rebuild runs; prefer running it outside
+store hours.
+"""
+import argparse
+import asyncio
+from datetime import date
+from app.core.db import init_db, close_db, get_db
+
+async def backfill(from_date: date = None) -> dict:
+    """
+    Rebuild sales rollups.
+    
+    Args:
+        from_date: First store-local date to rebuild, or None for all history
+        
+    Returns:
+        Number of rollup rows written per table
+    """
+    db = get_db()
+    if db is None:
+        raise RuntimeError("Supabase not configured")
+    
+    response = await db.rpc("rebuild_sales_rollups", {
+        "p_from": from_date.isoformat() if from_date else None
+    }).execute()
+    
+    return response.data
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild dashboard sales rollups")
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, default=None,
+                        help="First date to rebuild (YYYY-MM-DD). Default: all history")
+    args = parser.parse_args()
+    
+    init_db()
+    try:
+        result = await backfill(args.from_date)
+        print(f"Rebuilt sales rollups: {result}")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,44 @@
-from app.core.db import supabase
+import asyncio
+from app.core.db import get_db, DatabaseError
+from app.core.config import settings
 from typing import Dict, Any
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+import logging
+
+logger = logging.getLogger(__name__)
 
 class DashboardService:
+    async def configure_store(self) -> None:
+        """
+        Write STORE_TIMEZONE to the database (startup).
+        
+        store_local_time() buckets the sales rollups by the timezone stored
+        in store_settings (migration 025); a changed timezone rebuilds them.
+        """
+        db = get_db()
+        if db is None:
+            return
+        
+        try:
+            response = await db.rpc("configure_store", {"p_timezone": settings.STORE_TIMEZONE}).execute()
+        except DatabaseError:
+            # Keep serving; the rollups stay on the previously stored timezone
+            logger.exception("Could not write the store timezone to the database")
+            return
+        if (response.data or {}).get("changed"):
+            logger.warning("Store timezone changed to %s; sales rollups rebuilt", settings.STORE_TIMEZONE)
+    
     async def get_dashboard(self) -> Dict[str, Any]:
-        """Get dashboard data"""
-        if supabase is None:
+        """
+        Get dashboard data.
+        
+        Sales figures come from the hourly sales rollups (migration 010), so the
+        cost depends on the number of days shown, not the number of bills.
+        """
+        db = get_db()
+        if db is None:
             # Return mock data
             return {
                 "sales": {
@@ -58,33 +91,57 @@ class DashboardService:
             }
         
         try:
-            # Calculate today's sales
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_sales_response = supabase.table("sales").select("total_amount").gte("created_at", today_start.isoformat()).execute()
-            today_sales = sum(sale.get("total_amount", 0) for sale in (today_sales_response.data or []))
+            today = datetime.now(ZoneInfo(settings.STORE_TIMEZONE)).date()
+            yesterday = today - timedelta(days=1)
+            week_start = today - timedelta(days=6)
+            month_start = today.replace(day=1)
+            prev_month_start = (month_start - timedelta(days=1)).replace(day=1)
+            
+            # Rollup rows cover (days shown x 24 hours x payment modes), independent of bill volume
+            payment_response, category_response, products_response, low_stock_response = await asyncio.gather(
+                db.table("sales_rollup_payment")
+                    .select("sale_date, total")
+                    .gte("sale_date", min(prev_month_start, week_start).isoformat())
+                    .execute(),
+                db.table("sales_rollup_category")
+                    .select("category, revenue")
+                    .gte("sale_date", week_start.isoformat())
+                    .execute(),
+                db.table("product_catalog").select("id", count="exact").limit(1).execute(),
+                db.table("product_catalog").select("id", count="exact").lt("qty_on_hand", settings.LOW_STOCK_THRESHOLD).limit(1).execute()
+            )
             
-            # Calculate yesterday's sales
-            yesterday_start = today_start - timedelta(days=1)
-            yesterday_sales_response = supabase.table("sales").select("total_amount").gte("created_at", yesterday_start.isoformat()).lt("created_at", today_start.isoformat()).execute()
-            yesterday_sales = sum(sale.get("total_amount", 0) for sale in (yesterday_sales_response.data or []))
+            daily_totals: Dict[date, float] = defaultdict(float)
+            for row in (payment_response.data or []):
+                daily_totals[date.fromisoformat(row["sale_date"])] += float(row["total"])
             
+            today_sales = daily_totals[today]
+            yesterday_sales = daily_totals[yesterday]
             trend = ((today_sales - yesterday_sales) / yesterday_sales * 100) if yesterday_sales > 0 else 0
             
-            # Get product stats
-            products_response = supabase.table("products").select("id, stock, min_level").execute()
-            products = products_response.data if products_response.data else []
-            total_products = len(products)
-            low_stock = sum(1 for p in products if p.get("stock", 0) < p.get("min_level", 0))
+            # Month to date vs the same days of the previous month
+            monthly_revenue = sum(total for day, total in daily_totals.items() if day >= month_start)
+            prev_month_same_period = sum(
+                total for day, total in daily_totals.items()
+                if prev_month_start <= day < month_start and day.day <= today.day
+            )
+            revenue_trend = ((monthly_revenue - prev_month_same_period) / prev_month_same_period * 100) if prev_month_same_period > 0 else 0
             
-            # Get monthly revenue
-            month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            monthly_sales_response = supabase.table("sales").select("total_amount").gte("created_at", month_start.isoformat()).execute()
-            monthly_revenue = sum(sale.get("total_amount", 0) for sale in (monthly_sales_response.data or []))
+            week_days = [week_start + timedelta(days=i) for i in range(7)]
+            
+            category_totals: Dict[str, float] = defaultdict(float)
+            for row in (category_response.data or []):
+                category_totals[row["category"]] += float(row["revenue"])
+            category_revenue = sum(category_totals.values())
+            top_categories = sorted(category_totals.items(), key=lambda c: c[1], reverse=True)
+            
+            total_products = products_response.count or 0
+            low_stock = low_stock_response.count or 0
             
             return {
                 "sales": {
-                    "today": today_sales,
-                    "yesterday": yesterday_sales,
+                    "today": round(today_sales, 2),
+                    "yesterday": round(yesterday_sales, 2),
                     "trend": round(trend, 2)
                 },
                 "products": {
@@ -97,17 +154,20 @@ class DashboardService:
                     "trend": 8.2
                 },
                 "revenue": {
-                    "monthly": monthly_revenue,
+                    "monthly": round(monthly_revenue, 2),
                     "target": 1000000,
-                    "trend": 15.3
+                    "trend": round(revenue_trend, 2)
                 },
                 "salesTrend": {
-                    "labels": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
-                    "data": [32000, 35000, 38000, 36000, 40000, 45000, 42000]  # TODO: Calculate from actual data
+                    "labels": [day.strftime("%a") for day in week_days],
+                    "data": [round(daily_totals[day], 2) for day in week_days]
                 },
                 "categories": {
-                    "labels": ["Groceries", "Beverages", "Snacks", "Dairy", "Others"],
-                    "data": [35, 25, 20, 15, 5]  # TODO: Calculate from actual data
+                    "labels": [category for category, _ in top_categories],
+                    "data": [
+                        round(revenue / category_revenue * 100, 1) if category_revenue > 0 else 0
+                        for _, revenue in top_categories
+                    ]
                 },
                 "insights": [
                     {
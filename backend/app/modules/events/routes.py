@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.modules.events.service import EventService, TOPICS
+
+router = APIRouter()
+service = EventService()
+
+@router.get("/")
+async def stream_events(
+    topics: str = Query(",".join(TOPICS), description="Comma-separated: stock, bills, notifications"),
+    products: Optional[str] = Query(None, description="Comma-separated product ids; limits stock events to these"),
+    last_event_id: Optional[str] = Query(None, description="Resume after this event (first connection)"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-sent events: stock changes, new bills and notifications. Resumes from Last-Event-ID."""
+    requested = {topic.strip() for topic in topics.split(",") if topic.strip()}
+    unknown = requested - set(TOPICS)
+    if not requested or unknown:
+        raise HTTPException(status_code=400, detail=f"topics must be some of: {', '.join(TOPICS)}")
+    product_ids = {product_id.strip() for product_id in products.split(",") if product_id.strip()} if products else None
+
+    # Browsers send the header on automatic reconnects, it wins over the query parameter
+    frames = await service.stream(requested, product_ids, last_event_id_header or last_event_id)
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,172 @@
+import asyncio
+from app.core.db import get_db
+from app.core.config import settings
+from app.core.events import EventBroker, Event, Feed
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Awaitable, AsyncIterator
+from fastapi import HTTPException
+
+# Longest a new client waits for the broker's first read of the feeds
+SUBSCRIBE_TIMEOUT_SECONDS = 10
+# Browser reconnect delay after a dropped stream
+RETRY_MS = 3000
+
+
+def _feed(table: str, columns: str) -> Tuple[
+    Callable[[], Awaitable[Optional[str]]],
+    Callable[[Optional[str], Optional[Tuple[Any, Any]], int], Awaitable[List[Dict[str, Any]]]]
+]:
+    """Newest-row and window readers of a table, keyed on (created_at, id)"""
+
+    async def newest() -> Optional[str]:
+        db = get_db()
+        if db is None:
+            return None
+        response = await db.table(table) \
+            .select("created_at") \
+            .order("created_at", desc=True) \
+            .limit(1) \
+            .execute()
+        return response.data[0]["created_at"] if response.data else None
+
+    async def rows(since: Optional[str], after: Optional[Tuple[Any, Any]], limit: int) -> List[Dict[str, Any]]:
+        db = get_db()
+        if db is None:
+            return []
+        query = db.table(table).select(columns)
+        if since is not None:
+            query = query.gte("created_at", since)
+        if after is not None:
+            query = query.after(("created_at", "id"), after)
+        response = await query \
+            .order("created_at") \
+            .order("id") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    return newest, rows
+
+
+async def _stock_events(rows: List[Dict[str, Any]]) -> List[Event]:
+    """
+    One "stock" event per product with new ledger rows, carrying its
+    current qty_on_hand (one inventory_balance query per poll)
+    """
+    # Products in order of their last new ledger row
+    latest = {}
+    for row in rows:
+        latest.pop(row["product_id"], None)
+        latest[row["product_id"]] = None
+
+    response = await get_db().table("inventory_balance") \
+        .select("product_id, qty_on_hand") \
+        .in_("product_id", list(latest)) \
+        .execute()
+    balances = {row["product_id"]: float(row["qty_on_hand"]) for row in response.data or []}
+
+    return [
+        Event("stock", "stock", {
+            "product_id": product_id,
+            "qty_on_hand": balances.get(product_id, 0.0)
+        }, key=product_id)
+        for product_id in latest
+    ]
+
+
+async def _bill_events(rows: List[Dict[str, Any]]) -> List[Event]:
+    return [Event("bills", "bill", row) for row in rows]
+
+
+async def _notification_events(rows: List[Dict[str, Any]]) -> List[Event]:
+    return [
+        Event("notifications", "notification", {
+            "id": row["id"],
+            "type": row.get("type"),
+            "title": row.get("title"),
+            "message": row.get("message"),
+            "timestamp": row["created_at"],
+            "unread": row.get("unread", True)
+        })
+        for row in rows
+    ]
+
+
+broker = EventBroker(
+    [
+        Feed("stock", *_feed("inventory_ledger", "id, product_id, created_at"), _stock_events),
+        Feed(
+            "bills",
+            *_feed("sales_bill", "id, bill_number, subtotal, tax_amount, total, payment_mode, created_at"),
+            _bill_events
+        ),
+        Feed("notifications", *_feed("notifications", "id, type, title, message, unread, created_at"), _notification_events)
+    ],
+    buffer_size=settings.EVENTS_BUFFER_SIZE,
+    poll_seconds=settings.EVENTS_POLL_SECONDS,
+    overlap_seconds=settings.EVENTS_OVERLAP_SECONDS
+)
+
+TOPICS = tuple(feed.name for feed in broker.feeds)
+
+
+class EventService:
+    """
+    Live updates for terminals (server-sent events).
+    Replaces polling notifications and inventory.
+    """
+
+    async def stream(
+        self,
+        topics: Set[str],
+        products: Optional[Set[str]] = None,
+        last_event_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Subscribe and return the client's event stream.
+        
+        Events:
+        - stock: {product_id, qty_on_hand} after any stock movement
+          (only for `products` when given)
+        - bill: new sales_bill row
+        - notification: new notification, shaped like GET /api/notifications
+        - reset: resume from last_event_id was not possible; reload state
+        
+        Args:
+            topics: Feeds to receive (stock, bills, notifications)
+            products: Only stock events of these product ids
+            last_event_id: id of the last event received, to resume after it
+            
+        Returns:
+            Async iterator of SSE frames
+        """
+        try:
+            subscription, replay, reset = await asyncio.wait_for(
+                broker.subscribe(last_event_id, topics, products),
+                SUBSCRIBE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Live updates not available")
+
+        return self._frames(subscription, replay, reset)
+
+    @staticmethod
+    async def _frames(subscription, replay: List[Event], reset: bool) -> AsyncIterator[str]:
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if reset:
+                yield f"id: {broker.event_id(subscription.last_seq)}\nevent: reset\ndata: {{}}\n\n"
+
+            for event in replay:
+                yield subscription.frame(event)
+
+            queue = subscription.queue
+            while not (subscription.overflowed and queue.empty()):
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield subscription.frame(event)
+        finally:
+            broker.unsubscribe(subscription)
@@ -0,0 +1,41 @@
+"""
+Reconcile inventory_balance against inventory_ledger.
+
+Usage:
+    python -m app.modules.inventory.reconcile               # report only
+    python -m app.modules.inventory.reconcile --repair --shards 16
+
+Runs are incremental: only ledger rows added since the previous run are
+read. The first run reads the whole ledger once.
+"""
+import argparse
+import asyncio
+from fastapi import HTTPException
+from app.core.db import init_db, close_db
+from app.modules.inventory.service import InventoryService
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reconcile stock balances with the inventory ledger")
+    parser.add_argument("--repair", action="store_true",
+                        help="Overwrite mismatched balances with the ledger total")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Number of concurrent shards (1-64). Default: RECONCILE_SHARDS")
+    args = parser.parse_args()
+    
+    init_db()
+    try:
+        result = await InventoryService().reconcile(repair=args.repair, shards=args.shards)
+    except HTTPException as e:
+        raise SystemExit(f"Reconciliation failed: {e.detail}")
+    finally:
+        await close_db()
+    
+    print(f"Run {result['run_id']}: {result['status']}, "
+          f"{result['ledger_rows']} new ledger rows, "
+          f"{len(result['discrepancies'])} discrepancies, {result['repaired']} repaired")
+    for row in result["discrepancies"]:
+        print(f"  {row['product_id']}: balance {row['balance_qty']}, ledger {row['ledger_qty']}"
+              f"{' (repaired)' if row['repaired'] else ''}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
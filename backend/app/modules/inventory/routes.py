@@ -1,20 +1,50 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
 from app.modules.inventory.service import InventoryService
+from app.modules.inventory.schemas import (
+    StockIn, BulkStockIn, StockAdjust,
+    InventoryPage, StockMovement, BulkStockInResult, ReconcileReport
+)
+from app.utils.streaming import EXPORT_FORMATS
+from app.core.etag import conditional_response
+from typing import Optional
 
 router = APIRouter()
 service = InventoryService()
 
-@router.get("/")
-async def get_inventory():
-    """Get current inventory status"""
-    return await service.get_inventory()
+@router.get("/", response_model=InventoryPage)
+async def get_inventory(request: Request, limit: Optional[int] = Query(None, ge=1, le=1000), cursor: Optional[str] = None):
+    """Get inventory stats and all products, or a page of them with limit/cursor (pass next_cursor as cursor for the next page). Supports If-None-Match."""
+    return await conditional_response(request, lambda: service.get_inventory(limit=limit, cursor=cursor), InventoryPage)
 
-@router.post("/stock-in")
-async def add_stock(request: dict):
+@router.get("/export")
+async def export_inventory(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream the full stock sheet as NDJSON or CSV"""
+    return StreamingResponse(
+        service.export_inventory(format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=inventory.{format}"}
+    )
+
+@router.post("/stock-in", response_model=StockMovement)
+async def add_stock(request: StockIn):
     """Add stock to inventory (STOCK IN)"""
     return await service.add_stock(request)
 
-@router.post("/adjust")
-async def adjust_stock(request: dict):
+@router.post("/stock-in/bulk", response_model=BulkStockInResult)
+async def add_stock_bulk(request: BulkStockIn):
+    """Add stock for many products in one transaction (goods receipt with supplier_ref)"""
+    return await service.add_stock_bulk(request)
+
+@router.post("/adjust", response_model=StockMovement)
+async def adjust_stock(request: StockAdjust):
     """Adjust stock (for corrections)"""
     return await service.adjust_stock(request)
+
+@router.post("/reconcile", response_model=ReconcileReport)
+async def reconcile_inventory(
+    repair: bool = False,
+    shards: Optional[int] = Query(None, ge=1, le=64)
+):
+    """Compare stock balances with the ledger (incremental); repair=true fixes mismatches"""
+    return await service.reconcile(repair=repair, shards=shards)
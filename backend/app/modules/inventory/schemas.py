@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+StockInReason = Literal["PURCHASE", "ADJUSTMENT", "RETURN"]
+
+
+class StockIn(BaseModel):
+    """Request body of POST /api/inventory/stock-in"""
+    product_id: str = Field(min_length=1)
+    quantity: float = Field(gt=0)
+    reason: StockInReason = "PURCHASE"
+    notes: Optional[str] = None
+
+
+class BulkStockInItem(BaseModel):
+    product_id: str = Field(min_length=1)
+    quantity: float = Field(gt=0)
+    notes: Optional[str] = None
+
+
+class BulkStockIn(BaseModel):
+    """Request body of POST /api/inventory/stock-in/bulk (one goods receipt)"""
+    items: List[BulkStockInItem] = Field(min_length=1)
+    reason: StockInReason = "PURCHASE"
+    supplier_ref: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class StockAdjust(BaseModel):
+    """Request body of POST /api/inventory/adjust (quantity may be negative)"""
+    product_id: str = Field(min_length=1)
+    quantity: float
+    notes: str = "Stock adjustment"
+
+
+class InventoryStats(BaseModel):
+    inStock: int
+    lowStock: int
+    stockValue: float
+
+
+class StockRow(BaseModel):
+    id: str
+    name: str
+    sku: str
+    unit: str
+    qty_on_hand: float
+    selling_price: float
+    stock_value: float
+
+
+class InventoryPage(BaseModel):
+    stats: InventoryStats
+    products: List[StockRow]
+    next_cursor: Optional[str] = None
+
+
+class StockMovement(BaseModel):
+    success: bool
+    ledger_entry: Dict[str, Any]
+    qty_on_hand: float
+
+
+class ProductBalance(BaseModel):
+    product_id: str
+    qty_on_hand: float
+
+
+class BulkStockInResult(BaseModel):
+    success: bool
+    supplier_ref: Optional[str] = None
+    entries: int
+    balances: List[ProductBalance]
+
+
+class Discrepancy(BaseModel):
+    product_id: str
+    balance_qty: float
+    ledger_qty: float
+    repaired: bool
+
+
+class HighWaterMark(BaseModel):
+    created_at: Optional[str] = None
+    id: Optional[str] = None
+
+
+class ReconcileReport(BaseModel):
+    run_id: str
+    status: str
+    shards: int
+    repair: bool
+    high_water_mark: HighWaterMark
+    ledger_rows: int
+    repaired: int
+    discrepancies: List[Discrepancy]
@@ -1,5 +1,12 @@
-from app.core.db import supabase
-from typing import Dict, Any, List
+import asyncio
+from app.core.db import get_db, scan_pages, DatabaseError
+from app.core.config import settings
+from app.modules.products.cache import invalidate_stock
+from app.utils.locks import stock_locks
+from app.modules.inventory.schemas import StockIn, BulkStockIn, StockAdjust
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.streaming import encode_rows
+from typing import Dict, Any, List, Optional, AsyncIterator
 from fastapi import HTTPException
 from decimal import Decimal
 import uuid
@@ -10,77 +17,86 @@ class InventoryService:
     Handles stock management using ledger-based approach.
     """
     
-    async def get_inventory(self) -> Dict[str, Any]:
+    # Products per page when paging with a cursor but no limit
+    PAGE_SIZE = 100
+    
+    # Columns of the stock sheet export
+    EXPORT_COLUMNS = ["id", "name", "sku", "unit", "qty_on_hand", "selling_price", "stock_value"]
+    
+    async def get_inventory(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
         Get current inventory status.
         
+        Stats come from the inventory_stats aggregate in the database; the
+        product list is product_catalog ordered by (name, id), read in
+        keyset pages. Stats and products are fetched concurrently.
+        
+        Args:
+            limit: Maximum number of products to return; with neither limit
+                   nor cursor, every product is returned
+            cursor: next_cursor from the previous page
+            
         Returns:
-            Dictionary with inventory stats and product list
+            Dictionary with inventory stats, products and next_cursor
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             return {
                 "stats": {
                     "inStock": 0,
                     "lowStock": 0,
                     "stockValue": 0
                 },
-                "products": []
+                "products": [],
+                "next_cursor": None
             }
         
         try:
-            # Get all products with their balances
-            products_response = supabase.table("products")\
-                .select("id, name, sku, unit, selling_price")\
-                .execute()
-            
-            products = products_response.data if products_response.data else []
+            after = decode_cursor(cursor, 2) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        def build_query():
+            return db.table("product_catalog").select("id, name, sku, unit, qty_on_hand, selling_price")
+        
+        async def read_products():
+            if limit is None and cursor is None:
+                products = []
+                async for rows in scan_pages(build_query, ("name", "id"), settings.EXPORT_PAGE_SIZE):
+                    products.extend(rows)
+                return products, None
             
-            # Get balances for all products
-            balance_response = supabase.table("inventory_balance")\
-                .select("product_id, qty_on_hand")\
-                .execute()
+            page_size = limit or self.PAGE_SIZE
+            query = build_query()
+            if after:
+                query = query.after(("name", "id"), after)
             
-            # Create balance lookup
-            balance_map = {
-                item["product_id"]: float(item["qty_on_hand"])
-                for item in (balance_response.data if balance_response.data else [])
-            }
+            # Fetch one extra row to know whether another page exists
+            response = await query.order("name").order("id").limit(page_size + 1).execute()
+            products = response.data if response.data else []
             
-            # Format products with stock info
-            formatted_products = []
-            in_stock_count = 0
-            low_stock_count = 0
-            total_stock_value = 0
+            next_cursor = None
+            if len(products) > page_size:
+                products = products[:page_size]
+                next_cursor = encode_cursor([products[-1]["name"], products[-1]["id"]])
+            return products, next_cursor
+        
+        try:
+            stats_response, (products, next_cursor) = await asyncio.gather(
+                db.rpc("inventory_stats", {"p_low_stock_threshold": settings.LOW_STOCK_THRESHOLD}).execute(),
+                read_products()
+            )
             
-            for product in products:
-                product_id = product["id"]
-                qty_on_hand = balance_map.get(product_id, 0.0)
-                selling_price = float(product.get("selling_price", 0))
-                
-                if qty_on_hand > 0:
-                    in_stock_count += 1
-                if qty_on_hand < 5:  # Low stock threshold
-                    low_stock_count += 1
-                
-                total_stock_value += qty_on_hand * selling_price
-                
-                formatted_products.append({
-                    "id": product_id,
-                    "name": product["name"],
-                    "sku": product["sku"],
-                    "unit": product["unit"],
-                    "qty_on_hand": qty_on_hand,
-                    "selling_price": selling_price,
-                    "stock_value": qty_on_hand * selling_price
-                })
+            stats = stats_response.data or {}
             
             return {
                 "stats": {
-                    "inStock": in_stock_count,
-                    "lowStock": low_stock_count,
-                    "stockValue": round(total_stock_value, 2)
+                    "inStock": stats.get("inStock", 0),
+                    "lowStock": stats.get("lowStock", 0),
+                    "stockValue": float(stats.get("stockValue", 0))
                 },
-                "products": formatted_products
+                "products": [self._format_stock_row(product) for product in products],
+                "next_cursor": next_cursor
             }
             
         except Exception as e:
@@ -89,7 +105,49 @@ class InventoryService:
                 detail=f"Error fetching inventory: {str(e)}"
             )
     
-    async def add_stock(self, data: dict) -> Dict[str, Any]:
+    def export_inventory(self, format: str = "ndjson") -> AsyncIterator[str]:
+        """
+        Stream the full stock sheet as NDJSON or CSV.
+        
+        Rows are read from product_catalog in keyset pages of EXPORT_PAGE_SIZE
+        and encoded page by page, so the whole catalog is never held in memory.
+        
+        Args:
+            format: "ndjson" or "csv"
+            
+        Returns:
+            Async iterator of encoded text chunks
+        """
+        db = get_db()
+        
+        async def pages():
+            if db is None:
+                return
+            async for rows in scan_pages(
+                lambda: db.table("product_catalog").select("id, name, sku, unit, qty_on_hand, selling_price"),
+                ("name", "id"),
+                settings.EXPORT_PAGE_SIZE
+            ):
+                yield [self._format_stock_row(row) for row in rows]
+        
+        return encode_rows(pages(), self.EXPORT_COLUMNS, format)
+    
+    @staticmethod
+    def _format_stock_row(product: Dict[str, Any]) -> Dict[str, Any]:
+        """Format a product_catalog row with its stock value"""
+        qty_on_hand = float(product["qty_on_hand"])
+        selling_price = float(product.get("selling_price") or 0)
+        return {
+            "id": product["id"],
+            "name": product["name"],
+            "sku": product["sku"],
+            "unit": product["unit"],
+            "qty_on_hand": qty_on_hand,
+            "selling_price": selling_price,
+            "stock_value": round(qty_on_hand * selling_price, 2)
+        }
+    
+    async def add_stock(self, data: StockIn) -> Dict[str, Any]:
         """
         Add stock to inventory (STOCK IN).
         
@@ -99,35 +157,23 @@ class InventoryService:
         - Balance is updated automatically via trigger
         
         Args:
-            data: Dictionary with product_id, quantity, reason, notes
+            data: Stock-in with product_id, quantity, reason, notes
             
         Returns:
             Success response with ledger entry
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         try:
-            product_id = data.get("product_id")
-            quantity = data.get("quantity")
-            reason = data.get("reason", "PURCHASE")
-            notes = data.get("notes")
-            
-            if not product_id:
-                raise HTTPException(status_code=400, detail="product_id is required")
-            if not quantity or quantity <= 0:
-                raise HTTPException(status_code=400, detail="quantity must be positive")
-            
-            # Validate reason
-            valid_reasons = ["PURCHASE", "ADJUSTMENT", "RETURN"]
-            if reason not in valid_reasons:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"reason must be one of: {', '.join(valid_reasons)}"
-                )
+            product_id = data.product_id
+            quantity = data.quantity
+            reason = data.reason
+            notes = data.notes
             
             # Verify product exists
-            product_response = supabase.table("products")\
+            product_response = await db.table("products")\
                 .select("id")\
                 .eq("id", product_id)\
                 .execute()
@@ -144,7 +190,7 @@ class InventoryService:
                 "notes": notes
             }
             
-            ledger_response = supabase.table("inventory_ledger")\
+            ledger_response = await db.table("inventory_ledger")\
                 .insert(ledger_data)\
                 .execute()
             
@@ -155,8 +201,10 @@ class InventoryService:
                 )
             
             # Balance is updated automatically by trigger
+            invalidate_stock([product_id])
+            
             # Fetch updated balance
-            balance_response = supabase.table("inventory_balance")\
+            balance_response = await db.table("inventory_balance")\
                 .select("qty_on_hand")\
                 .eq("product_id", product_id)\
                 .execute()
@@ -179,31 +227,90 @@ class InventoryService:
                 detail=f"Error adding stock: {str(e)}"
             )
     
-    async def adjust_stock(self, data: dict) -> Dict[str, Any]:
+    async def add_stock_bulk(self, data: BulkStockIn) -> Dict[str, Any]:
+        """
+        Add stock for many products at once (goods receipt).
+        
+        All lines are validated and written in one bulk_stock_in RPC: one
+        existence check for every product, one batched ledger insert inside
+        a single transaction, and the updated balances in the same response.
+        
+        Args:
+            data: Goods receipt with items (product_id, quantity, optional
+                  notes), supplier_ref, reason, notes
+            
+        Returns:
+            Success response with entry count and updated balances
+        """
+        db = get_db()
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+        
+        try:
+            reason = data.reason
+            supplier_ref = data.supplier_ref
+            notes = data.notes
+            lines = [
+                {"product_id": item.product_id, "quantity": item.quantity, "notes": item.notes}
+                for item in data.items
+            ]
+            
+            response = await db.rpc("bulk_stock_in", {
+                "p_items": lines,
+                "p_reason": reason,
+                "p_supplier_ref": supplier_ref,
+                "p_notes": notes
+            }).execute()
+            
+            result = response.data or {}
+            balances = result.get("balances") or []
+            invalidate_stock(balance["product_id"] for balance in balances)
+            
+            return {
+                "success": True,
+                "supplier_ref": supplier_ref,
+                "entries": result.get("entries", 0),
+                "balances": [
+                    {"product_id": balance["product_id"], "qty_on_hand": float(balance["qty_on_hand"])}
+                    for balance in balances
+                ]
+            }
+            
+        except HTTPException:
+            raise
+        except DatabaseError as e:
+            status_code = e.http_status
+            raise HTTPException(
+                status_code=status_code,
+                detail=e.message if status_code < 500 else f"Error adding stock: {e.message}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error adding stock: {str(e)}"
+            )
+    
+    async def adjust_stock(self, data: StockAdjust) -> Dict[str, Any]:
         """
         Adjust stock (for corrections, damages, etc.).
         
         Args:
-            data: Dictionary with product_id, quantity (can be negative), notes
+            data: Adjustment with product_id, quantity (can be negative), notes
             
         Returns:
             Success response
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         try:
-            product_id = data.get("product_id")
-            quantity = data.get("quantity")
-            notes = data.get("notes", "Stock adjustment")
-            
-            if not product_id:
-                raise HTTPException(status_code=400, detail="product_id is required")
-            if quantity is None:
-                raise HTTPException(status_code=400, detail="quantity is required")
+            product_id = data.product_id
+            quantity = data.quantity
+            notes = data.notes
             
             # Verify product exists
-            product_response = supabase.table("products")\
+            product_response = await db.table("products")\
                 .select("id")\
                 .eq("id", product_id)\
                 .execute()
@@ -211,44 +318,49 @@ class InventoryService:
             if not product_response.data:
                 raise HTTPException(status_code=404, detail="Product not found")
             
-            # Check if adjustment would result in negative stock
-            if quantity < 0:
-                balance_response = supabase.table("inventory_balance")\
-                    .select("qty_on_hand")\
-                    .eq("product_id", product_id)\
-                    .execute()
+            # Check and write under the product's stock lock, so concurrent
+            # deductions on this worker cannot both pass the check
+            async with stock_locks.hold([product_id]):
+                # Check if adjustment would result in negative stock
+                if quantity < 0:
+                    balance_response = await db.table("inventory_balance")\
+                        .select("qty_on_hand")\
+                        .eq("product_id", product_id)\
+                        .execute()
+                
+                    current_qty = 0.0
+                    if balance_response.data:
+                        current_qty = float(balance_response.data[0]["qty_on_hand"])
+                
+                    if current_qty + quantity < 0:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Insufficient stock. Current: {current_qty}, Adjustment: {quantity}"
+                        )
+                
+                # Insert ledger entry
+                ledger_data = {
+                    "product_id": product_id,
+                    "qty_delta": float(quantity),
+                    "reason": "ADJUSTMENT",
+                    "reference_id": None,
+                    "notes": notes
+                }
                 
-                current_qty = 0.0
-                if balance_response.data:
-                    current_qty = float(balance_response.data[0]["qty_on_hand"])
+                ledger_response = await db.table("inventory_ledger")\
+                    .insert(ledger_data)\
+                    .execute()
                 
-                if current_qty + quantity < 0:
+                if not ledger_response.data:
                     raise HTTPException(
-                        status_code=400,
-                        detail=f"Insufficient stock. Current: {current_qty}, Adjustment: {quantity}"
+                        status_code=500,
+                        detail="Failed to create ledger entry"
                     )
-            
-            # Insert ledger entry
-            ledger_data = {
-                "product_id": product_id,
-                "qty_delta": float(quantity),
-                "reason": "ADJUSTMENT",
-                "reference_id": None,
-                "notes": notes
-            }
-            
-            ledger_response = supabase.table("inventory_ledger")\
-                .insert(ledger_data)\
-                .execute()
-            
-            if not ledger_response.data:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to create ledger entry"
-                )
+                
+                invalidate_stock([product_id])
             
             # Fetch updated balance
-            balance_response = supabase.table("inventory_balance")\
+            balance_response = await db.table("inventory_balance")\
                 .select("qty_on_hand")\
                 .eq("product_id", product_id)\
                 .execute()
@@ -270,3 +382,88 @@ class InventoryService:
                 status_code=500,
                 detail=f"Error adjusting stock: {str(e)}"
             )
+    
+    async def reconcile(self, repair: bool = False, shards: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Reconcile inventory_balance against the ledger.
+        
+        Only ledger rows added since the previous run are read: each product
+        bucket keeps a high-water mark of the rows already summed into
+        inventory_ledger_totals (migration 013). The run is split into shards
+        that are processed concurrently, each in its own transaction.
+        
+        Args:
+            repair: Overwrite mismatched balances with the ledger total
+            shards: Number of concurrent shards (1-64, default RECONCILE_SHARDS)
+            
+        Returns:
+            Run summary with the discrepancies found
+        """
+        db = get_db()
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+        
+        shards = shards or settings.RECONCILE_SHARDS
+        
+        try:
+            run_response = await db.rpc("reconcile_inventory_begin", {
+                "p_shards": shards,
+                "p_repair": repair,
+                "p_settle_seconds": settings.RECONCILE_SETTLE_SECONDS
+            }).execute()
+            run_id = run_response.data["id"]
+            
+            results = await asyncio.gather(
+                *(db.rpc("reconcile_inventory_shard", {"p_run_id": run_id, "p_shard": shard}).expect_repeats().execute()
+                  for shard in range(shards)),
+                return_exceptions=True
+            )
+            
+            # Closes the run as failed when any shard did not complete
+            finish_response = await db.rpc("reconcile_inventory_finish", {"p_run_id": run_id}).execute()
+            
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            
+            discrepancies = []
+            for result in results:
+                discrepancies.extend(result.data["discrepancies"])
+            
+            repaired = [row["product_id"] for row in discrepancies if row["repaired"]]
+            if repaired:
+                invalidate_stock(repaired)
+            
+            run = finish_response.data
+            return {
+                "run_id": run["id"],
+                "status": run["status"],
+                "shards": run["shards"],
+                "repair": run["repair"],
+                "high_water_mark": {"created_at": run["to_created_at"], "id": run["to_id"]},
+                "ledger_rows": run["ledger_rows"],
+                "repaired": len(repaired),
+                "discrepancies": [
+                    {
+                        "product_id": row["product_id"],
+                        "balance_qty": float(row["balance_qty"]),
+                        "ledger_qty": float(row["ledger_qty"]),
+                        "repaired": row["repaired"]
+                    }
+                    for row in discrepancies
+                ]
+            }
+            
+        except HTTPException:
+            raise
+        except DatabaseError as e:
+            status_code = e.http_status
+            raise HTTPException(
+                status_code=status_code,
+                detail=e.message if status_code < 500 else f"Error reconciling inventory: {e.message}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error reconciling inventory: {str(e)}"
+            )
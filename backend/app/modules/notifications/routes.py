@@ -1,15 +1,17 @@
 from fastapi import APIRouter
+from typing import List
 from app.modules.notifications.service import NotificationService
+from app.modules.notifications.schemas import Notification, MarkRead, NotificationAck
 
 router = APIRouter()
 service = NotificationService()
 
-@router.get("/")
+@router.get("/", response_model=List[Notification])
 async def get_notifications():
     """Get notifications"""
     return await service.get_notifications()
 
-@router.put("/")
-async def mark_notification_read(request: dict):
+@router.put("/", response_model=NotificationAck)
+async def mark_notification_read(request: MarkRead):
     """Mark notification as read"""
-    return await service.mark_as_read(request.get("id"))
+    return await service.mark_as_read(request.id)
@@ -0,0 +1,21 @@
+from typing import Any, Optional
+from pydantic import BaseModel
+
+
+class Notification(BaseModel):
+    id: Any
+    type: Optional[str] = None
+    title: Optional[str] = None
+    message: Optional[str] = None
+    timestamp: Optional[str] = None
+    unread: bool = True
+
+
+class MarkRead(BaseModel):
+    """Request body of PUT /api/notifications"""
+    id: Any
+
+
+class NotificationAck(BaseModel):
+    success: bool
+    message: str
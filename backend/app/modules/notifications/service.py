@@ -1,11 +1,12 @@
-from app.core.db import supabase
+from app.core.db import get_db
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 
 class NotificationService:
     async def get_notifications(self) -> List[Dict[str, Any]]:
         """Get notifications"""
-        if supabase is None:
+        db = get_db()
+        if db is None:
             # Return mock data
             return [
                 {
@@ -35,7 +36,7 @@ class NotificationService:
             ]
         
         try:
-            response = supabase.table("notifications").select("*").order("created_at", desc=True).limit(50).execute()
+            response = await db.table("notifications").select("*").order("created_at", desc=True).limit(50).execute()
             notifications = []
             for notif in (response.data if response.data else []):
                 notifications.append({
@@ -52,11 +53,12 @@ class NotificationService:
     
     async def mark_as_read(self, notification_id: int) -> Dict[str, Any]:
         """Mark notification as read"""
-        if supabase is None:
+        db = get_db()
+        if db is None:
             return {"success": True, "message": "Notification marked as read (mock mode)"}
         
         try:
-            supabase.table("notifications").update({"unread": False}).eq("id", notification_id).execute()
+            await db.table("notifications").update({"unread": False}).eq("id", notification_id).execute()
             return {"success": True, "message": "Notification marked as read"}
         except Exception as e:
             raise Exception(f"Error marking notification as read: {str(e)}")
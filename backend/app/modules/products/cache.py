@@ -0,0 +1,54 @@
+from app.core.config import settings
+from app.core.etag import catalog_version
+from app.utils.cache import TTLCache
+from typing import Any, Dict, Iterable
+
+# Barcode -> catalog fields (name, price, tax...). Long TTL, invalidated on product changes.
+barcode_cache = TTLCache(
+    maxsize=settings.BARCODE_CACHE_SIZE,
+    ttl=settings.BARCODE_CACHE_TTL_SECONDS
+)
+
+# Product id -> qty_on_hand. Short TTL, invalidated by stock movements in this process.
+stock_cache = TTLCache(
+    maxsize=settings.BARCODE_CACHE_SIZE,
+    ttl=settings.STOCK_CACHE_TTL_SECONDS
+)
+
+def cache_product(product: Dict[str, Any]) -> None:
+    """
+    Cache a product row read from product_catalog.
+    
+    Catalog fields and stock are stored separately so stock can expire
+    (or be invalidated by a sale) without refetching the product.
+    """
+    catalog_fields = {k: v for k, v in product.items() if k != "qty_on_hand"}
+    if catalog_fields.get("barcode"):
+        barcode_cache.set(catalog_fields["barcode"], catalog_fields)
+    if "qty_on_hand" in product:
+        stock_cache.set(product["id"], float(product["qty_on_hand"]))
+
+def invalidate_product(product: Dict[str, Any]) -> None:
+    """
+    Invalidate cached catalog fields of a product.
+    
+    Must be called whenever a product is created or its catalog fields
+    (name, price, tax rate, barcode...) change.
+    """
+    if product.get("barcode"):
+        barcode_cache.invalidate(product["barcode"])
+    stock_cache.invalidate(product.get("id"))
+    catalog_version.bump()
+
+def invalidate_stock(product_ids: Iterable[str]) -> None:
+    """Invalidate cached stock after ledger movements for these products"""
+    for product_id in product_ids:
+        stock_cache.invalidate(product_id)
+    catalog_version.bump()
+
+def cache_stats() -> Dict[str, Any]:
+    """Counters for both caches"""
+    return {
+        "barcode": barcode_cache.stats(),
+        "stock": stock_cache.stats()
+    }
@@ -0,0 +1,167 @@
+"""
+Parsing and validation of bulk product imports.
+
+Accepted inputs (see POST /api/products/import):
+- JSON: a list of products, or {"products": [...]}
+- CSV: header row with name, sku, unit, selling_price and optional
+  barcode, mrp, tax_rate, category columns
+either as the request body or as an uploaded file.
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, List, Tuple
+from fastapi import HTTPException, Request
+from app.core.config import settings
+from app.utils.barcode import is_generated_barcode, validate_barcodes
+
+VALID_UNITS = ("piece", "kg", "liter", "gram", "pack")
+
+IMPORT_COLUMNS = ("name", "sku", "barcode", "unit", "mrp", "selling_price", "tax_rate", "category")
+
+
+async def read_import_rows(request: Request) -> List[Dict[str, Any]]:
+    """Read import rows from a JSON body, CSV body or uploaded file"""
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Upload a file in the 'file' field")
+        content = await upload.read()
+        is_csv = (upload.filename or "").lower().endswith(".csv") or (upload.content_type or "").endswith("csv")
+    else:
+        content = await request.body()
+        is_csv = "csv" in content_type
+
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8 encoded")
+
+    return parse_csv(text) if is_csv else parse_json(text)
+
+
+def parse_csv(text: str) -> List[Dict[str, Any]]:
+    """Parse CSV text into row dictionaries (empty cells become None)"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "sku" not in [f.strip() for f in reader.fieldnames]:
+        raise HTTPException(status_code=400, detail="CSV must have a header row with at least name, sku, unit, selling_price")
+
+    return [
+        {(key or "").strip(): (value.strip() or None) if isinstance(value, str) else value
+         for key, value in row.items()}
+        for row in reader
+    ]
+
+
+def parse_json(text: str) -> List[Dict[str, Any]]:
+    """Parse a JSON list of products, or {"products": [...]}"""
+    try:
+        payload = json.loads(text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+
+    if isinstance(payload, dict):
+        payload = payload.get("products")
+    if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        raise HTTPException(status_code=400, detail="JSON import must be a list of products or {\"products\": [...]}")
+    return payload
+
+
+def validate_rows(rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], Dict[int, List[str]]]:
+    """
+    Validate and normalize import rows.
+
+    Applies the create_product rules to every row and rejects SKUs and
+    barcodes repeated within the file (the first occurrence wins).
+
+    Args:
+        rows: Raw rows
+
+    Returns:
+        (valid, errors): valid is a list of (row number, product data);
+        errors maps row number (1-based) to its error messages
+    """
+    valid = []
+    errors: Dict[int, List[str]] = {}
+    seen_skus = set()
+    seen_barcodes = set()
+    barcode_ok = validate_barcodes([_text(row.get("barcode")) for row in rows])
+
+    for row_no, row in enumerate(rows, start=1):
+        row_errors = []
+
+        name = _text(row.get("name"))
+        sku = _text(row.get("sku"))
+        barcode = _text(row.get("barcode"))
+        unit = _text(row.get("unit"))
+        category = _text(row.get("category"))
+
+        if not name:
+            row_errors.append("Product name is required")
+        if not sku:
+            row_errors.append("SKU is required")
+        elif sku in seen_skus:
+            row_errors.append("Duplicate SKU in file")
+        if not unit:
+            row_errors.append("Unit is required")
+        elif unit not in VALID_UNITS:
+            row_errors.append(f"unit must be one of: {', '.join(VALID_UNITS)}")
+        if barcode:
+            if not barcode_ok[row_no - 1]:
+                row_errors.append("Invalid barcode format")
+            elif is_generated_barcode(barcode):
+                row_errors.append(f"Barcodes starting with {settings.BARCODE_PREFIX} are reserved for generated barcodes")
+            elif barcode in seen_barcodes:
+                row_errors.append("Duplicate barcode in file")
+
+        selling_price = _number(row.get("selling_price"), "Selling price", row_errors, required=True)
+        mrp = _number(row.get("mrp"), "MRP", row_errors)
+        tax_rate = _number(row.get("tax_rate"), "Tax rate", row_errors)
+        if selling_price is not None and selling_price < 0:
+            row_errors.append("Selling price must be >= 0")
+        if mrp is not None and mrp < 0:
+            row_errors.append("MRP must be >= 0")
+        if tax_rate is not None and not 0 <= tax_rate <= 100:
+            row_errors.append("Tax rate must be between 0 and 100")
+
+        if row_errors:
+            errors[row_no] = row_errors
+            continue
+
+        seen_skus.add(sku)
+        if barcode:
+            seen_barcodes.add(barcode)
+        valid.append((row_no, {
+            "name": name,
+            "sku": sku,
+            "barcode": barcode,
+            "unit": unit,
+            "mrp": mrp,
+            "selling_price": selling_price,
+            "tax_rate": tax_rate or 0,
+            "category": category
+        }))
+
+    return valid, errors
+
+
+def _text(value: Any) -> Any:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value: Any, label: str, row_errors: List[str], required: bool = False) -> Any:
+    if value is None or value == "":
+        if required:
+            row_errors.append(f"{label} is required")
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        row_errors.append(f"{label} must be a number")
+        return None
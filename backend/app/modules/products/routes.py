@@ -1,15 +1,49 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
 from app.modules.products.service import ProductService
+from app.modules.products.cache import cache_stats
+from app.modules.products.importer import read_import_rows
+from app.core.etag import conditional_response
+from app.modules.products.schemas import ProductCreate, ProductCreated, ProductPage, ProductSearch, Product, ImportReport
 
 router = APIRouter()
 service = ProductService()
 
-@router.get("/")
-async def get_products():
-    """Get all products"""
-    return await service.get_products()
+@router.get("/", response_model=ProductPage)
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    low_stock: bool = False,
+    unit: Optional[str] = None
+):
+    """Get all products, or a page of them with limit/cursor (pass next_cursor as cursor for the next page). Supports If-None-Match."""
+    return await conditional_response(
+        request,
+        lambda: service.get_products(limit=limit, cursor=cursor, low_stock=low_stock, unit=unit),
+        ProductPage
+    )
 
-@router.get("/{product_id}")
+@router.get("/search", response_model=ProductSearch)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search products by partial name or SKU, best match first, with current stock"""
+    return await service.search_products(q, limit=limit)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get barcode/stock cache hit, miss and eviction counters"""
+    return cache_stats()
+
+@router.post("/import", response_model=ImportReport)
+async def import_products(request: Request):
+    """Bulk import products from JSON or CSV (request body or uploaded 'file')"""
+    rows = await read_import_rows(request)
+    return await service.import_products(rows)
+
+@router.get("/{product_id}", response_model=Product)
 async def get_product(product_id: str):
     """Get a specific product by ID"""
     product = await service.get_product(product_id)
@@ -17,7 +51,7 @@ async def get_product(product_id: str):
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
-@router.get("/barcode/{barcode}")
+@router.get("/barcode/{barcode}", response_model=Product)
 async def get_product_by_barcode(barcode: str):
     """Get product by barcode"""
     product = await service.get_product_by_barcode(barcode)
@@ -25,7 +59,7 @@ async def get_product_by_barcode(barcode: str):
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
-@router.post("/")
-async def create_product(request: dict):
+@router.post("/", response_model=ProductCreated)
+async def create_product(request: ProductCreate):
     """Create a new product"""
     return await service.create_product(request)
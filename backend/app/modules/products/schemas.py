@@ -0,0 +1,69 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+Unit = Literal["piece", "kg", "liter", "gram", "pack"]
+
+
+class ProductCreate(BaseModel):
+    """Request body of POST /api/products"""
+    name: str = Field(min_length=1)
+    sku: str = Field(min_length=1)
+    unit: Unit
+    selling_price: float = Field(ge=0)
+    barcode: Optional[str] = None
+    mrp: Optional[float] = Field(None, ge=0)
+    tax_rate: float = Field(0, ge=0, le=100)
+    category: Optional[str] = None
+
+
+class Product(BaseModel):
+    """products / product_catalog row with current stock"""
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    name: str
+    sku: str
+    barcode: Optional[str] = None
+    unit: str
+    mrp: Optional[float] = None
+    selling_price: float
+    tax_rate: Optional[float] = None
+    category: Optional[str] = None
+    created_at: Optional[str] = None
+    qty_on_hand: Optional[float] = None
+
+
+class ProductPage(BaseModel):
+    products: List[Product]
+    next_cursor: Optional[str] = None
+
+
+class ProductSearch(BaseModel):
+    products: List[Product]
+
+
+class ProductCreated(BaseModel):
+    success: bool
+    product: Product
+
+
+class ImportedProduct(BaseModel):
+    row: int
+    id: str
+    sku: str
+    barcode: Optional[str] = None
+
+
+class ImportRowError(BaseModel):
+    row: int
+    sku: Optional[str] = None
+    errors: List[str]
+
+
+class ImportReport(BaseModel):
+    success: bool
+    total: int
+    created: int
+    failed: int
+    products: List[ImportedProduct]
+    errors: List[ImportRowError]
@@ -0,0 +1,300 @@
+"""
+In-memory product search for the billing counter (typeahead by name or SKU).
+
+Each worker holds a prefix index (sorted word tokens of name and SKU) and a
+trigram index (for typos and infix matches) over the catalog fields. The
+index is built from the products table at startup, updated by
+create_product and import_products in this worker, and picks up products
+created by other workers from a periodic incremental refresh. Until the
+first build completes, searches use the search_products SQL function
+(pg_trgm, migration 021).
+
+Ranking: exact SKU, SKU prefix, name prefix, then every query word prefixing
+a word of the name or SKU. Each class comes from its own sorted list, so a
+search reads at most `limit` entries per class (alphabetical within a class)
+instead of scoring every match. Only when nothing matches by prefix are
+trigrams used, for typos.
+"""
+import asyncio
+import bisect
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.db import get_db, scan_pages
+
+CATALOG_FIELDS = ("id", "name", "sku", "barcode", "unit", "mrp", "selling_price", "tax_rate", "category", "created_at")
+
+# Word-prefix candidates examined per search, so short queries stay bounded
+MAX_CANDIDATES = 1000
+# Trigrams shared by more products than this do not discriminate and are skipped
+MAX_TRIGRAM_POSTINGS = 1000
+MIN_SIMILARITY = 0.5
+# Products committed slightly out of created_at order are re-read by the next refresh
+REFRESH_OVERLAP_SECONDS = 60
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.casefold()) if text else []
+
+
+def _key(text: Optional[str]) -> str:
+    """Casefolded words joined by single spaces ("AMUL-BUT-500" -> "amul but 500")"""
+    return " ".join(_words(text))
+
+
+def _prefix_range(entries: List[Tuple[str, int]], prefix: str) -> Tuple[int, int]:
+    return (
+        bisect.bisect_left(entries, (prefix,)),
+        bisect.bisect_left(entries, (prefix + "\U0010ffff",))
+    )
+
+
+def _trigrams(words: List[str]) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space"""
+    grams = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductSearchIndex:
+    """Prefix and trigram index over product name and SKU"""
+
+    def __init__(self):
+        self._reset()
+        self.ready = False
+        self._building: Optional[asyncio.Task] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._refreshed_at = 0.0
+        self._high_water: Optional[str] = None
+
+    def _reset(self) -> None:
+        self._docs: List[Dict[str, Any]] = []         # doc number -> catalog fields
+        self._doc_text: List[str] = []                # doc number -> " " + name and SKU words
+        self._numbers: Dict[str, int] = {}            # product id -> doc number
+        self._keys: List[Tuple[str, str]] = []        # doc number -> (name key, SKU key)
+        self._skus: List[Tuple[str, int]] = []        # sorted (SKU key, doc number)
+        self._names: List[Tuple[str, int]] = []       # sorted (name key, doc number)
+        self._tokens: List[Tuple[str, int]] = []      # sorted (word, doc number)
+        self._postings: Dict[str, List[int]] = {}     # trigram -> doc numbers
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # -- maintenance -----------------------------------------------------
+
+    def add(self, product: Dict[str, Any]) -> None:
+        """Add or replace one product (e.g. after create_product)"""
+        self._add(product, sort=False)
+
+    def add_many(self, products: List[Dict[str, Any]]) -> None:
+        """Add or replace many products, re-sorting the prefix index once"""
+        for product in products:
+            self._add(product, sort=None)
+        self._sort()
+
+    def _sort(self) -> None:
+        self._skus.sort()
+        self._names.sort()
+        self._tokens.sort()
+
+    def _add(self, product: Dict[str, Any], sort: Optional[bool]) -> None:
+        """Index one product; sort=None appends unsorted (caller sorts once)"""
+        fields = {field: product.get(field) for field in CATALOG_FIELDS}
+        words = _words(fields["name"]) + _words(fields["sku"])
+        text = " " + " ".join(words)
+        keys = (_key(fields["name"]), _key(fields["sku"]))
+
+        number = self._numbers.get(fields["id"])
+        if number is not None:
+            # Stale entries of the old version stay in the lists; candidates are
+            # re-checked against the current keys and words, so they never match
+            old_keys = self._keys[number]
+            old_words = set(self._doc_text[number].split())
+            self._docs[number] = fields
+            self._doc_text[number] = text
+            self._keys[number] = keys
+            new_words = [word for word in words if word not in old_words]
+        else:
+            number = len(self._docs)
+            self._numbers[fields["id"]] = number
+            self._docs.append(fields)
+            self._doc_text.append(text)
+            self._keys.append(keys)
+            old_keys = (None, None)
+            new_words = words
+
+        entries = []
+        if keys[0] != old_keys[0]:
+            entries.append((self._names, (keys[0], number)))
+        if keys[1] != old_keys[1]:
+            entries.append((self._skus, (keys[1], number)))
+        entries.extend((self._tokens, (word, number)) for word in set(new_words))
+        for target, entry in entries:
+            if sort is None:
+                target.append(entry)
+            else:
+                bisect.insort(target, entry)
+        for gram in _trigrams(new_words):
+            self._postings.setdefault(gram, []).append(number)
+
+    async def build(self) -> None:
+        """Load the whole catalog (startup); searches use the database until done"""
+        db = get_db()
+        if db is None:
+            return
+
+        fresh = ProductSearchIndex()
+        high_water = None
+        async for rows in scan_pages(
+            lambda: db.table("products").select(", ".join(CATALOG_FIELDS)),
+            ("created_at", "id"),
+            settings.EXPORT_PAGE_SIZE
+        ):
+            for row in rows:
+                fresh._add(row, sort=None)
+            high_water = rows[-1]["created_at"]
+        fresh._sort()
+
+        # Products added by this worker while the build was running
+        for product in self._docs:
+            if product["id"] not in fresh._numbers:
+                fresh._add(product, sort=False)
+
+        self._docs, self._doc_text, self._numbers, self._keys = fresh._docs, fresh._doc_text, fresh._numbers, fresh._keys
+        self._skus, self._names, self._tokens, self._postings = fresh._skus, fresh._names, fresh._tokens, fresh._postings
+        self._high_water = high_water
+        self._refreshed_at = time.monotonic()
+        self.ready = True
+
+    def start(self) -> None:
+        """Build in the background (called on startup)"""
+        if settings.SEARCH_INDEX_ENABLED and self._building is None:
+            self._building = asyncio.ensure_future(self.build())
+
+    async def refresh(self) -> None:
+        """Add products created since the last build or refresh (e.g. by other workers)"""
+        db = get_db()
+        if db is None or not self.ready:
+            return
+
+        since = self._high_water
+        query = db.table("products").select(", ".join(CATALOG_FIELDS))
+        if since:
+            overlap = datetime.fromisoformat(since) - timedelta(seconds=REFRESH_OVERLAP_SECONDS)
+            query = query.gte("created_at", overlap.isoformat())
+        self._refreshed_at = time.monotonic()
+        response = await query.order("created_at").execute()
+
+        rows = response.data or []
+        if rows:
+            self.add_many(rows)
+            self._high_water = max(since or "", rows[-1]["created_at"])
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._refreshed_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self.refresh())
+
+    # -- search ----------------------------------------------------------
+
+    def search(self, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Ranked catalog fields of the best matches (without stock).
+
+        Args:
+            text: Partial name or SKU as typed
+            limit: Maximum number of results
+
+        Returns:
+            Product catalog field dictionaries, best match first
+        """
+        if self.ready:
+            self._maybe_refresh()
+
+        query_words = _words(text)
+        if not query_words:
+            return []
+        query_key = " ".join(query_words)
+
+        found: List[int] = []
+        seen = set()
+
+        def take(number: int) -> bool:
+            """Add a match; True once the page is full"""
+            if number not in seen:
+                seen.add(number)
+                found.append(number)
+            return len(found) >= limit
+
+        # Exact SKU, then SKU prefix (exact sorts first within the prefix range)
+        lo, hi = _prefix_range(self._skus, query_key)
+        for i in range(lo, hi):
+            key, number = self._skus[i]
+            if self._keys[number][1] == key and take(number):
+                return self._results(found)
+
+        # Name prefix
+        lo, hi = _prefix_range(self._names, query_key)
+        for i in range(lo, hi):
+            key, number = self._names[i]
+            if self._keys[number][0] == key and take(number):
+                return self._results(found)
+
+        # Every query word prefixes some word, driven from the rarest query word
+        ranges = [_prefix_range(self._tokens, word) for word in query_words]
+        lo, hi = min(ranges, key=lambda bounds: bounds[1] - bounds[0])
+        starts = [" " + word for word in query_words]
+        for i in range(lo, min(hi, lo + MAX_CANDIDATES)):
+            number = self._tokens[i][1]
+            if number in seen:
+                continue
+            text = self._doc_text[number]
+            if all(start in text for start in starts) and take(number):
+                return self._results(found)
+
+        if not found and len(query_key) >= 3:
+            found = self._similar(query_words)[:limit]
+        return self._results(found)
+
+    def _results(self, numbers: List[int]) -> List[Dict[str, Any]]:
+        return [dict(self._docs[number]) for number in numbers]
+
+    def _similar(self, query_words: List[str]) -> List[int]:
+        """Docs sharing at least MIN_SIMILARITY of the query's trigrams, most similar first"""
+        grams = _trigrams(query_words)
+        needed = math.ceil(MIN_SIMILARITY * len(grams))
+        postings = sorted(
+            (self._postings[gram] for gram in grams
+             if gram in self._postings and len(self._postings[gram]) <= MAX_TRIGRAM_POSTINGS),
+            key=len
+        )
+        if len(postings) < needed:
+            return []
+
+        # A doc sharing `needed` of the grams is in at least one of the
+        # len(postings) - needed + 1 rarest lists, so only those are candidates
+        candidates = set()
+        for numbers in postings[:len(postings) - needed + 1]:
+            candidates.update(numbers)
+        counts = Counter()
+        for numbers in postings:
+            # A doc appears once per gram unless re-added with a changed name;
+            # the over-count only affects the order of fallback results
+            counts.update(numbers)
+
+        similar = [number for number in candidates if counts[number] >= needed]
+        similar.sort(key=lambda number: (-counts[number], self._keys[number][0]))
+        return similar
+
+
+# Shared by the product routes and services of this worker
+product_index = ProductSearchIndex()
@@ -1,5 +1,12 @@
-from app.core.db import supabase
-from app.utils.barcode import generate_barcode, validate_barcode
+import asyncio
+from app.core.db import get_db, chunks, scan_pages
+from app.core.config import settings
+from app.utils.barcode import generate_barcode, generate_barcodes, is_generated_barcode, validate_barcode
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.modules.products.cache import barcode_cache, stock_cache, cache_product, invalidate_product
+from app.modules.products.importer import validate_rows
+from app.modules.products.search import product_index
+from app.modules.products.schemas import ProductCreate
 from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
 
@@ -8,40 +15,81 @@ class ProductService:
     Product service for V1 MVP.
     Handles product catalog operations.
     """
+    
+    # Products per page when paging with a cursor but no limit
+    PAGE_SIZE = 100
 
-    async def get_products(self) -> Dict[str, Any]:
+    async def get_products(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        low_stock: bool = False,
+        unit: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Get all products from catalog.
+        Get the product catalog with current stock, whole or one page at a time.
         
+        Reads the product_catalog view (products joined with inventory_balance)
+        using keyset pagination on (name, id), so the cost of a page depends
+        on the page size, not the catalog size.
+        
+        Args:
+            limit: Maximum number of products to return; with neither limit
+                   nor cursor, every matching product is returned
+            cursor: next_cursor from the previous page
+            low_stock: Only return products below LOW_STOCK_THRESHOLD
+            unit: Only return products with this unit
+            
         Returns:
-            Dictionary with products list
+            Dictionary with products list and next_cursor (None on the last page)
         """
-        if supabase is None:
-            return {"products": []}
+        db = get_db()
+        if db is None:
+            return {"products": [], "next_cursor": None}
 
         try:
-            # Query all products ordered by name
-            response = supabase.table("products") \
-                .select("*") \
-                .order("name") \
-                .execute()
+            after = decode_cursor(cursor, 2) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-            products = response.data if response.data else []
+        def build_query():
+            query = db.table("product_catalog").select("*")
+            if unit:
+                query = query.eq("unit", unit)
+            if low_stock:
+                query = query.lt("qty_on_hand", settings.LOW_STOCK_THRESHOLD)
+            return query
 
-            # Join with inventory balance for current stock
-            for product in products:
-                product_id = product["id"]
-                balance_response = supabase.table("inventory_balance") \
-                    .select("qty_on_hand") \
-                    .eq("product_id", product_id) \
+        try:
+            next_cursor = None
+            if limit is None and cursor is None:
+                products = []
+                async for rows in scan_pages(build_query, ("name", "id"), settings.EXPORT_PAGE_SIZE):
+                    products.extend(rows)
+            else:
+                page_size = limit or self.PAGE_SIZE
+                query = build_query()
+                if after:
+                    query = query.after(("name", "id"), after)
+                
+                # Fetch one extra row to know whether another page exists
+                response = await query \
+                    .order("name") \
+                    .order("id") \
+                    .limit(page_size + 1) \
                     .execute()
+
+                products = response.data if response.data else []
                 
-                if balance_response.data:
-                    product["qty_on_hand"] = float(balance_response.data[0]["qty_on_hand"])
-                else:
-                    product["qty_on_hand"] = 0.0
+                if len(products) > page_size:
+                    products = products[:page_size]
+                    last = products[-1]
+                    next_cursor = encode_cursor([last["name"], last["id"]])
+
+            for product in products:
+                product["qty_on_hand"] = float(product["qty_on_hand"])
             
-            return {"products": products}
+            return {"products": products, "next_cursor": next_cursor}
             
         except Exception as e:
             raise HTTPException(
@@ -59,26 +107,28 @@ class ProductService:
         Returns:
             Product dictionary or None if not found
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             return None
         
         try:
-            response = supabase.table("products") \
-                .select("*") \
-                .eq("id", product_id) \
-                .execute()
+            # Product and stock lookups are independent, run them concurrently
+            response, balance_response = await asyncio.gather(
+                db.table("products")
+                    .select("*")
+                    .eq("id", product_id)
+                    .execute(),
+                db.table("inventory_balance")
+                    .select("qty_on_hand")
+                    .eq("product_id", product_id)
+                    .execute()
+            )
             
             if not response.data:
                 return None
             
             product = response.data[0]
             
-            # Get current stock
-            balance_response = supabase.table("inventory_balance") \
-                .select("qty_on_hand") \
-                .eq("product_id", product_id) \
-                .execute()
-            
             if balance_response.data:
                 product["qty_on_hand"] = float(balance_response.data[0]["qty_on_hand"])
             else:
@@ -96,17 +146,44 @@ class ProductService:
         """
         Get product by barcode.
         
+        Hot path for scanning at the counter:
+        - Catalog fields come from the in-process barcode cache
+        - Stock comes from the short-lived stock cache
+        - A warm scan makes no network call; a cold scan makes one
+          product_catalog query and fills both caches
+        
         Args:
             barcode: Barcode string
             
         Returns:
             Product dictionary or None if not found
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             return None
         
+        product = barcode_cache.get(barcode)
+        if product is not None:
+            qty_on_hand = stock_cache.get(product["id"])
+            if qty_on_hand is not None:
+                return {**product, "qty_on_hand": qty_on_hand}
+        
         try:
-            response = supabase.table("products") \
+            if product is not None:
+                # Catalog fields cached, only stock expired
+                balance_response = await db.table("inventory_balance") \
+                    .select("qty_on_hand") \
+                    .eq("product_id", product["id"]) \
+                    .execute()
+                
+                qty_on_hand = 0.0
+                if balance_response.data:
+                    qty_on_hand = float(balance_response.data[0]["qty_on_hand"])
+                
+                stock_cache.set(product["id"], qty_on_hand)
+                return {**product, "qty_on_hand": qty_on_hand}
+            
+            response = await db.table("product_catalog") \
                 .select("*") \
                 .eq("barcode", barcode) \
                 .execute()
@@ -115,18 +192,8 @@ class ProductService:
                 return None
             
             product = response.data[0]
-            
-            # Get current stock
-            product_id = product["id"]
-            balance_response = supabase.table("inventory_balance") \
-                .select("qty_on_hand") \
-                .eq("product_id", product_id) \
-                .execute()
-            
-            if balance_response.data:
-                product["qty_on_hand"] = float(balance_response.data[0]["qty_on_hand"])
-            else:
-                product["qty_on_hand"] = 0.0
+            product["qty_on_hand"] = float(product["qty_on_hand"])
+            cache_product(product)
             
             return product
             
@@ -136,7 +203,66 @@ class ProductService:
                 detail=f"Error fetching product by barcode: {str(e)}"
             )
 
-    async def create_product(self, data: dict) -> Dict[str, Any]:
+    async def search_products(self, query: str, limit: int = 20) -> Dict[str, Any]:
+        """
+        Search products by partial name or SKU (counter typeahead).
+        
+        Matching and ranking run on the in-memory index (no database call);
+        stock comes from the stock cache, with one inventory_balance query
+        for the products not cached. Until the index has been built (cold
+        start) or when SEARCH_INDEX_ENABLED is off, the search_products
+        function (pg_trgm) answers instead.
+        
+        Args:
+            query: Partial name or SKU
+            limit: Maximum number of products to return
+            
+        Returns:
+            Dictionary with ranked products, each with qty_on_hand
+        """
+        db = get_db()
+        if db is None:
+            return {"products": []}
+        
+        try:
+            if not (settings.SEARCH_INDEX_ENABLED and product_index.ready):
+                response = await db.rpc("search_products", {"p_query": query, "p_limit": limit}).execute()
+                products = response.data or []
+                for product in products:
+                    product["qty_on_hand"] = float(product["qty_on_hand"])
+                return {"products": products}
+            
+            products = product_index.search(query, limit)
+            
+            missing = []
+            for product in products:
+                product["qty_on_hand"] = stock_cache.get(product["id"])
+                if product["qty_on_hand"] is None:
+                    missing.append(product["id"])
+            
+            if missing:
+                balance_response = await db.table("inventory_balance") \
+                    .select("product_id, qty_on_hand") \
+                    .in_("product_id", missing) \
+                    .execute()
+                balances = {
+                    row["product_id"]: float(row["qty_on_hand"])
+                    for row in balance_response.data or []
+                }
+                for product in products:
+                    if product["qty_on_hand"] is None:
+                        product["qty_on_hand"] = balances.get(product["id"], 0.0)
+                        stock_cache.set(product["id"], product["qty_on_hand"])
+            
+            return {"products": products}
+            
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error searching products: {str(e)}"
+            )
+
+    async def create_product(self, data: ProductCreate) -> Dict[str, Any]:
         """
         Create a new product.
         
@@ -144,44 +270,24 @@ class ProductService:
         - SKU must be unique
         - Barcode is auto-generated if not provided
         - Barcode must be unique if provided
+        - Barcode may not be in the generated range (BARCODE_PREFIX)
         
         Args:
-            data: Product data dictionary
+            data: Product fields (required fields and ranges are validated
+                  by ProductCreate)
             
         Returns:
             Created product dictionary
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         try:
-            # Validate required fields
-            if not data.get("name"):
-                raise HTTPException(status_code=400, detail="Product name is required")
-            if not data.get("sku"):
-                raise HTTPException(status_code=400, detail="SKU is required")
-            if not data.get("unit"):
-                raise HTTPException(status_code=400, detail="Unit is required")
-            if data.get("selling_price") is None:
-                raise HTTPException(status_code=400, detail="Selling price is required")
-            
-            # Generate barcode if not provided
-            barcode = data.get("barcode")
+            # Generate barcode if not provided (unique by construction)
+            barcode = data.barcode
             if not barcode:
-                # Generate unique barcode
-                barcode = generate_barcode()
-                # Ensure uniqueness (retry if collision)
-                max_retries = 5
-                for _ in range(max_retries):
-                    existing = await self.get_product_by_barcode(barcode)
-                    if existing is None:
-                        break
-                    barcode = generate_barcode()
-                else:
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Failed to generate unique barcode"
-                    )
+                barcode = await generate_barcode()
             else:
                 # Validate provided barcode
                 if not validate_barcode(barcode):
@@ -189,6 +295,11 @@ class ProductService:
                         status_code=400,
                         detail="Invalid barcode format"
                     )
+                if is_generated_barcode(barcode):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Barcodes starting with {settings.BARCODE_PREFIX} are reserved for generated barcodes"
+                    )
                 # Check uniqueness
                 existing = await self.get_product_by_barcode(barcode)
                 if existing:
@@ -199,17 +310,18 @@ class ProductService:
             
             # Prepare product data
             product_data = {
-                "name": data["name"],
-                "sku": data["sku"],
+                "name": data.name,
+                "sku": data.sku,
                 "barcode": barcode,
-                "unit": data["unit"],
-                "mrp": data.get("mrp"),
-                "selling_price": float(data["selling_price"]),
-                "tax_rate": float(data.get("tax_rate", 0))
+                "unit": data.unit,
+                "mrp": data.mrp,
+                "selling_price": data.selling_price,
+                "tax_rate": data.tax_rate,
+                "category": data.category
             }
             
             # Insert product
-            response = supabase.table("products") \
+            response = await db.table("products") \
                 .insert(product_data) \
                 .execute()
             
@@ -222,7 +334,7 @@ class ProductService:
             product = response.data[0]
             
             # Initialize inventory balance to 0
-            supabase.table("inventory_balance") \
+            await db.table("inventory_balance") \
                 .insert({
                     "product_id": product["id"],
                     "qty_on_hand": 0
@@ -230,6 +342,8 @@ class ProductService:
                 .execute()
             
             product["qty_on_hand"] = 0.0
+            invalidate_product(product)
+            product_index.add(product)
             
             return {"success": True, "product": product}
             
@@ -239,4 +353,120 @@ class ProductService:
             raise HTTPException(
                 status_code=500,
                 detail=f"Error creating product: {str(e)}"
-            )
\ No newline at end of file
+            )
+    
+    async def import_products(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Bulk-create products.
+        
+        All rows are validated up front. SKU and barcode uniqueness is checked
+        with set-based queries (one per chunk), missing barcodes are allocated
+        from the barcode counter in one reservation, and products are inserted with their balance rows in chunks of
+        IMPORT_CHUNK_SIZE, one RPC per chunk. Invalid rows are reported and
+        skipped; valid rows are still imported.
+        
+        Args:
+            rows: Raw product rows (see importer.py for accepted fields)
+            
+        Returns:
+            Import report with created products and per-row errors
+        """
+        db = get_db()
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+        
+        if not rows:
+            raise HTTPException(status_code=400, detail="No products to import")
+        if len(rows) > settings.IMPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Import is limited to {settings.IMPORT_MAX_ROWS} products per request"
+            )
+        
+        try:
+            products, errors = validate_rows(rows)
+            
+            # Uniqueness against the catalog
+            existing_skus, existing_barcodes = await self._find_existing(
+                db,
+                [product["sku"] for _, product in products],
+                [product["barcode"] for _, product in products if product["barcode"]]
+            )
+            
+            pending = []
+            for row_no, product in products:
+                row_errors = []
+                if product["sku"] in existing_skus:
+                    row_errors.append("SKU already exists")
+                if product["barcode"] and product["barcode"] in existing_barcodes:
+                    row_errors.append("Barcode already exists")
+                if row_errors:
+                    errors[row_no] = row_errors
+                else:
+                    pending.append((row_no, product))
+            
+            # Generate missing barcodes in one reservation
+            missing = [product for _, product in pending if not product["barcode"]]
+            for product, barcode in zip(missing, await generate_barcodes(len(missing))):
+                product["barcode"] = barcode
+            
+            # Insert chunks concurrently (bounded by the database pool)
+            batches = chunks(pending, settings.IMPORT_CHUNK_SIZE)
+            responses = await asyncio.gather(*(
+                db.rpc("bulk_create_products", {"p_products": [product for _, product in batch]}).execute()
+                for batch in batches
+            ))
+            
+            created = []
+            for batch, response in zip(batches, responses):
+                inserted = {product["sku"]: product for product in response.data or []}
+                for row_no, product in batch:
+                    row = inserted.get(product["sku"])
+                    if row is None:
+                        # Taken by a concurrent insert after the uniqueness check
+                        errors[row_no] = ["SKU or barcode already exists"]
+                        continue
+                    invalidate_product(row)
+                    product_index.add({**product, **row})
+                    created.append({"row": row_no, "id": row["id"], "sku": row["sku"], "barcode": row["barcode"]})
+            
+            return {
+                "success": not errors,
+                "total": len(rows),
+                "created": len(created),
+                "failed": len(errors),
+                "products": created,
+                "errors": [
+                    {"row": row_no, "sku": rows[row_no - 1].get("sku"), "errors": messages}
+                    for row_no, messages in sorted(errors.items())
+                ]
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error importing products: {str(e)}"
+            )
+    
+    @staticmethod
+    async def _find_existing(db, skus: List[str], barcodes: List[str]):
+        """SKUs and barcodes that already exist, checked one chunk per query"""
+        size = settings.IMPORT_CHUNK_SIZE
+        sku_chunks = chunks(skus, size)
+        barcode_chunks = chunks(barcodes, size)
+        responses = await asyncio.gather(*(
+            db.rpc("find_existing_products", {
+                "p_skus": sku_chunks[i] if i < len(sku_chunks) else [],
+                "p_barcodes": barcode_chunks[i] if i < len(barcode_chunks) else []
+            }).execute()
+            for i in range(max(len(sku_chunks), len(barcode_chunks)))
+        ))
+        
+        existing_skus = set()
+        existing_barcodes = set()
+        for response in responses:
+            existing_skus.update(response.data["skus"])
+            existing_barcodes.update(response.data["barcodes"])
+        return existing_skus, existing_barcodes
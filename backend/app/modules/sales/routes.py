@@ -1,20 +1,85 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from datetime import date
+from typing import Optional
+from app.core.idempotency import idempotency
 from app.modules.sales.service import SalesService
+from app.modules.sales.schemas import SaleCreate, SaleCreated, SalesPage, Bill, PaymentMode, ReportGroup, SalesReport
+from app.utils.streaming import EXPORT_FORMATS
 
 router = APIRouter()
 service = SalesService()
 
-@router.get("/")
-async def get_sales(limit: int = Query(100, ge=1, le=1000)):
-    """Get recent sales bills"""
-    return await service.get_sales(limit=limit)
+@router.get("/", response_model=SalesPage, response_model_exclude_unset=True)
+async def get_sales(
+    limit: int = Query(100, ge=1, le=1000),
+    include_items: bool = True,
+    cursor: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    payment_mode: Optional[PaymentMode] = None
+):
+    """
+    Get sales bills, newest first (include_items=false skips line items).
+    Pass next_cursor back as cursor to get the next page; start/end are
+    inclusive store-local dates.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await service.get_sales(
+        limit=limit,
+        include_items=include_items,
+        cursor=cursor,
+        start=start,
+        end=end,
+        payment_mode=payment_mode
+    )
 
-@router.get("/{bill_id}")
+@router.get("/report", response_model=SalesReport)
+async def get_sales_report(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: ReportGroup = "day",
+    payment_mode: Optional[PaymentMode] = None
+):
+    """Sales aggregated by day, hour, product, tax_rate or payment_mode (default: last 30 days)"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await service.get_report(start=start, end=end, group_by=group_by, payment_mode=payment_mode)
+
+@router.get("/report/export")
+async def export_sales_report(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    payment_mode: Optional[PaymentMode] = None,
+    format: str = Query("csv", pattern="^(ndjson|csv)$")
+):
+    """Stream every bill line in the range as CSV or NDJSON (default: last 30 days)"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return StreamingResponse(
+        service.export_report_lines(start=start, end=end, payment_mode=payment_mode, format=format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=sales.{format}"}
+    )
+
+@router.get("/{bill_id}", response_model=Bill, response_model_exclude_unset=True)
 async def get_bill(bill_id: str):
     """Get a specific bill by ID"""
     return await service.get_bill(bill_id)
 
-@router.post("/")
-async def create_sale(request: dict):
-    """Create a new sale (atomic transaction)"""
-    return await service.create_sale(request)
+@router.post("/", response_model=SaleCreated, response_model_exclude_unset=True)
+async def create_sale(
+    request: SaleCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Create a new sale (atomic transaction). Retries with the same Idempotency-Key replay the first result."""
+    result, replayed = await idempotency.run(
+        "sales", idempotency_key, request,
+        lambda: service.create_sale(request, idempotency_key),
+        recover=service.get_created_sale
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
@@ -0,0 +1,97 @@
+from typing import Any, List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+PaymentMode = Literal["cash", "upi", "card"]
+ReportGroup = Literal["day", "hour", "product", "tax_rate", "payment_mode"]
+
+
+class SaleItemCreate(BaseModel):
+    """Cart line of a new sale"""
+    product_id: str = Field(min_length=1)
+    quantity: float = Field(gt=0)
+
+
+class SaleCreate(BaseModel):
+    """Request body of POST /api/sales and POST /api/billing"""
+    items: List[SaleItemCreate] = Field(min_length=1)
+    payment_mode: PaymentMode = "cash"
+
+
+class BillItem(BaseModel):
+    """sales_bill_items row (snapshot of the product at sale time)"""
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    bill_id: str
+    product_id: Optional[str] = None
+    product_name: str
+    unit_price: float
+    quantity: float
+    tax_rate: float
+    line_total: float
+    created_at: Optional[str] = None
+
+
+class Bill(BaseModel):
+    """sales_bill row, with item_count (summary view) and/or items when loaded"""
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    bill_number: str
+    subtotal: float
+    tax_amount: float
+    total: float
+    payment_mode: str
+    created_at: Optional[str] = None
+    item_count: Optional[int] = None
+    items: Optional[List[BillItem]] = None
+
+
+class SalesPage(BaseModel):
+    sales: List[Bill]
+    next_cursor: Optional[str] = None
+
+
+class SaleCreated(BaseModel):
+    success: bool
+    bill: Bill
+
+
+class RecentBill(BaseModel):
+    """Bill summary of the legacy GET /api/billing endpoint"""
+    id: str
+    invoiceNumber: str
+    total: float
+    items: int
+    timestamp: Optional[str] = None
+
+
+class ReportRange(BaseModel):
+    start: str
+    end: str
+
+
+class SalesReportGroup(BaseModel):
+    """One group of GET /api/sales/report: day (date), hour (0-23), product id, tax rate or payment mode"""
+    key: Any = None
+    label: Optional[str] = None
+    bills: int
+    lines: int
+    quantity: float
+    taxable_value: float
+    tax_amount: float
+    total: float
+
+
+class SalesReportTotals(BaseModel):
+    bills: int
+    taxable_value: float
+    tax_amount: float
+    total: float
+
+
+class SalesReport(BaseModel):
+    range: ReportRange
+    group_by: ReportGroup
+    groups: List[SalesReportGroup]
+    totals: SalesReportTotals
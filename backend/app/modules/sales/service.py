@@ -1,47 +1,101 @@
-from app.core.db import supabase
+import asyncio
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from app.core.config import settings
+from app.core.db import get_db, chunks, scan_pages, DatabaseError
 from app.utils.bill_number import generate_bill_number
-from typing import Dict, Any, List
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.modules.products.cache import invalidate_stock
+from app.utils.locks import stock_locks
+from app.utils.streaming import encode_rows
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 from fastapi import HTTPException
-from decimal import Decimal
+from app.modules.sales.schemas import SaleCreate
 class SalesService:
     """
     Sales service for V1 MVP.
     Handles sales billing with atomic stock deduction.
     """
     
-    async def get_sales(self, limit: int = 100) -> Dict[str, Any]:
+    REPORT_GROUPS = ("day", "hour", "product", "tax_rate", "payment_mode")
+    REPORT_COLUMNS = [
+        "bill_number", "bill_date", "payment_mode", "product_id", "product_name",
+        "quantity", "unit_price", "tax_rate", "taxable_value", "tax_amount", "line_total"
+    ]
+    
+    async def get_sales(
+        self,
+        limit: int = 100,
+        include_items: bool = True,
+        cursor: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        payment_mode: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Get recent sales bills.
+        Get a page of sales bills, newest first.
+        
+        Uses keyset pagination on (created_at, id) over the
+        idx_sales_bill_created_at index, so any page costs the same as the
+        first. Round trips are constant in the page size: one query for the
+        bills (with item_count from the sales_bill_summary view), plus one
+        batched items query per IN_FILTER_CHUNK_SIZE bills when include_items
+        is set.
         
         Args:
             limit: Maximum number of bills to return
+            include_items: Attach line items to each bill
+            cursor: next_cursor from the previous page
+            start: First store-local date to include
+            end: Last store-local date to include
+            payment_mode: Only return bills paid with this mode
             
         Returns:
-            Dictionary with sales list
+            Dictionary with sales list and next_cursor (None on the last page)
         """
-        if supabase is None:
-            return {"sales": []}
+        db = get_db()
+        if db is None:
+            return {"sales": [], "next_cursor": None}
         
         try:
-            response = supabase.table("sales_bill")\
-                .select("*")\
-                .order("created_at", desc=True)\
-                .limit(limit)\
+            after = decode_cursor(cursor, 2) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        try:
+            query = db.table("sales_bill_summary").select("*")
+            
+            start_ts, end_ts = self._local_range(start, end)
+            if start_ts:
+                query = query.gte("created_at", start_ts)
+            if end_ts:
+                query = query.lt("created_at", end_ts)
+            if payment_mode:
+                query = query.eq("payment_mode", payment_mode)
+            if after:
+                query = query.after(("created_at", "id"), after, desc=True)
+            
+            # Fetch one extra row to know whether another page exists
+            response = await query \
+                .order("created_at", desc=True) \
+                .order("id", desc=True) \
+                .limit(limit + 1) \
                 .execute()
             
             sales = response.data if response.data else []
             
-            # Get items for each bill
-            for sale in sales:
-                bill_id = sale["id"]
-                items_response = supabase.table("sales_bill_items")\
-                    .select("*")\
-                    .eq("bill_id", bill_id)\
-                    .execute()
-                
-                sale["items"] = items_response.data if items_response.data else []
+            next_cursor = None
+            if len(sales) > limit:
+                sales = sales[:limit]
+                last = sales[-1]
+                next_cursor = encode_cursor([last["created_at"], last["id"]])
             
-            return {"sales": sales}
+            if include_items and sales:
+                items_by_bill = await self._get_items_by_bill(db, [sale["id"] for sale in sales])
+                for sale in sales:
+                    sale["items"] = items_by_bill.get(sale["id"], [])
+            
+            return {"sales": sales, "next_cursor": next_cursor}
             
         except Exception as e:
             raise HTTPException(
@@ -49,6 +103,172 @@ class SalesService:
                 detail=f"Error fetching sales: {str(e)}"
             )
     
+    @staticmethod
+    def _local_range(start: Optional[date], end: Optional[date]) -> Tuple[Optional[str], Optional[str]]:
+        """Timestamps bounding store-local dates start..end (inclusive)"""
+        tz = ZoneInfo(settings.STORE_TIMEZONE)
+        start_ts = datetime.combine(start, time.min, tzinfo=tz).isoformat() if start else None
+        end_ts = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz).isoformat() if end else None
+        return start_ts, end_ts
+    
+    @staticmethod
+    def _report_dates(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+        """Report range, defaulting to the last 30 days"""
+        end = end or datetime.now(ZoneInfo(settings.STORE_TIMEZONE)).date()
+        start = start or end - timedelta(days=29)
+        return start, end
+    
+    async def get_report(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        group_by: str = "day",
+        payment_mode: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Aggregate sales by day, hour, product, tax rate or payment mode.
+        
+        Grouping happens in the sales_report SQL function (migration 020), so
+        one round trip returns one row per group whatever the range length.
+        
+        Args:
+            start: First store-local date (default: 29 days before end)
+            end: Last store-local date (default: today)
+            group_by: day, hour, product, tax_rate or payment_mode
+            payment_mode: Only include bills paid with this mode
+            
+        Returns:
+            Dictionary with range, groups and totals
+        """
+        start, end = self._report_dates(start, end)
+        db = get_db()
+        if db is None:
+            return {
+                "range": {"start": start.isoformat(), "end": end.isoformat()},
+                "group_by": group_by,
+                "groups": [],
+                "totals": {"bills": 0, "taxable_value": 0.0, "tax_amount": 0.0, "total": 0.0}
+            }
+        
+        start_ts, end_ts = self._local_range(start, end)
+        try:
+            response = await db.rpc("sales_report", {
+                "p_from": start_ts,
+                "p_to": end_ts,
+                "p_group_by": group_by,
+                "p_payment_mode": payment_mode
+            }).execute()
+            
+            return {
+                "range": {"start": start.isoformat(), "end": end.isoformat()},
+                "group_by": group_by,
+                "groups": response.data["groups"],
+                "totals": response.data["totals"]
+            }
+            
+        except DatabaseError as e:
+            status_code = e.http_status
+            raise HTTPException(
+                status_code=status_code,
+                detail=e.message if status_code < 500 else f"Error building sales report: {e.message}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error building sales report: {str(e)}"
+            )
+    
+    def export_report_lines(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        payment_mode: Optional[str] = None,
+        format: str = "csv"
+    ) -> AsyncIterator[str]:
+        """
+        Stream every bill line in a date range as CSV or NDJSON.
+        
+        Lines are read from the sales_report_lines view in keyset pages of
+        EXPORT_PAGE_SIZE and encoded page by page, so memory stays constant
+        whatever the range length.
+        
+        Args:
+            start: First store-local date (default: 29 days before end)
+            end: Last store-local date (default: today)
+            payment_mode: Only include bills paid with this mode
+            format: "csv" or "ndjson"
+            
+        Returns:
+            Async iterator of encoded text chunks
+        """
+        db = get_db()
+        start_ts, end_ts = self._local_range(*self._report_dates(start, end))
+        tz = ZoneInfo(settings.STORE_TIMEZONE)
+        
+        def build_query():
+            query = db.table("sales_report_lines") \
+                .select("id, created_at, bill_number, payment_mode, product_id, product_name, quantity, unit_price, tax_rate, line_total") \
+                .gte("created_at", start_ts) \
+                .lt("created_at", end_ts)
+            if payment_mode:
+                query = query.eq("payment_mode", payment_mode)
+            return query
+        
+        async def pages():
+            if db is None:
+                return
+            async for rows in scan_pages(build_query, ("created_at", "id"), settings.EXPORT_PAGE_SIZE):
+                yield [self._format_report_line(row, tz) for row in rows]
+        
+        return encode_rows(pages(), self.REPORT_COLUMNS, format)
+    
+    @staticmethod
+    def _format_report_line(line: Dict[str, Any], tz: ZoneInfo) -> Dict[str, Any]:
+        """Format a sales_report_lines row with store-local date and tax split"""
+        quantity = float(line["quantity"])
+        unit_price = float(line["unit_price"])
+        tax_rate = float(line["tax_rate"])
+        taxable_value = unit_price * quantity
+        return {
+            "bill_number": line["bill_number"],
+            "bill_date": datetime.fromisoformat(line["created_at"]).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S"),
+            "payment_mode": line["payment_mode"],
+            "product_id": line["product_id"],
+            "product_name": line["product_name"],
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "tax_rate": tax_rate,
+            "taxable_value": round(taxable_value, 2),
+            "tax_amount": round(taxable_value * tax_rate / 100, 2),
+            "line_total": float(line["line_total"])
+        }
+    
+    async def _get_items_by_bill(self, db, bill_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Load line items for many bills with batched IN queries.
+        
+        Args:
+            db: Active database
+            bill_ids: Bill UUIDs
+            
+        Returns:
+            Mapping of bill_id to its items
+        """
+        responses = await asyncio.gather(*[
+            db.table("sales_bill_items")
+                .select("*")
+                .in_("bill_id", batch)
+                .execute()
+            for batch in chunks(bill_ids)
+        ])
+        
+        items_by_bill: Dict[str, List[Dict[str, Any]]] = {}
+        for items_response in responses:
+            for item in (items_response.data or []):
+                items_by_bill.setdefault(item["bill_id"], []).append(item)
+        
+        return items_by_bill
+    
     async def get_bill(self, bill_id: str) -> Dict[str, Any]:
         """
         Get a specific bill by ID.
@@ -59,26 +279,28 @@ class SalesService:
         Returns:
             Bill dictionary with items
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             raise HTTPException(status_code=404, detail="Bill not found")
         
         try:
-            bill_response = supabase.table("sales_bill")\
-                .select("*")\
-                .eq("id", bill_id)\
-                .execute()
+            # Bill and its items are independent lookups, run them concurrently
+            bill_response, items_response = await asyncio.gather(
+                db.table("sales_bill")
+                    .select("*")
+                    .eq("id", bill_id)
+                    .execute(),
+                db.table("sales_bill_items")
+                    .select("*")
+                    .eq("bill_id", bill_id)
+                    .execute()
+            )
             
             if not bill_response.data:
                 raise HTTPException(status_code=404, detail="Bill not found")
             
             bill = bill_response.data[0]
             
-            # Get items
-            items_response = supabase.table("sales_bill_items")\
-                .select("*")\
-                .eq("bill_id", bill_id)\
-                .execute()
-            
             bill["items"] = items_response.data if items_response.data else []
             
             return bill
@@ -91,235 +313,89 @@ class SalesService:
                 detail=f"Error fetching bill: {str(e)}"
             )
     
-    async def create_sale(self, data: dict) -> Dict[str, Any]:
+    async def create_sale(self, data: SaleCreate, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Create a new sale (ATOMIC TRANSACTION).
         
         CRITICAL FLOW:
-        1. Generate bill_number
-        2. For each cart item:
-           - Atomically deduct stock using UPDATE with WHERE condition
-           - If rows affected = 0 → abort (OUT OF STOCK)
-        3. Insert sales_bill
-        4. Insert sales_bill_items (with snapshot data)
-        5. Insert inventory_ledger entries (negative qty)
-        6. Commit transaction
+        1. Build the cart (request shape is validated by SaleCreate)
+        2. Generate bill_number
+        3. Hold the in-process stock locks of all cart products, so sales of
+           the same SKU on this worker queue here instead of waiting on row
+           locks in the database (each waiter would hold a pool connection)
+        4. Call the create_sale SQL function, which in ONE transaction:
+           - Locks the balance rows of all cart products
+           - Validates products exist and stock is sufficient
+           - Inserts sales_bill and sales_bill_items (with snapshot data)
+           - Inserts inventory_ledger entries (negative qty)
+           - Stock is deducted by the ledger trigger
+           - Adds the bill to the dashboard sales rollups, last
+        
+        Any failure rolls back the whole sale, and the round trip count is
+        constant regardless of cart size. With an Idempotency-Key, the bill
+        id is recorded on the claimed key in the same transaction.
         
         Args:
-            data: Sale data with items, payment_mode, etc.
+            data: Sale with items and payment_mode
+            idempotency_key: Claimed Idempotency-Key of the request, if any
             
         Returns:
             Created bill dictionary
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        items = data.get("items", [])
-        payment_mode = data.get("payment_mode", "cash")
-        
-        if not items or len(items) == 0:
-            raise HTTPException(status_code=400, detail="Sale must have at least one item")
-        
-        if payment_mode not in ["cash", "upi", "card"]:
-            raise HTTPException(
-                status_code=400,
-                detail="payment_mode must be one of: cash, upi, card"
-            )
+        payment_mode = data.payment_mode
+        cart = [{"product_id": item.product_id, "quantity": item.quantity} for item in data.items]
         
         try:
-            # STEP 1: Validate all products and get current data
-            product_data_map = {}
-            for item in items:
-                product_id = item.get("product_id")
-                quantity = item.get("quantity")
-                
-                if not product_id:
-                    raise HTTPException(status_code=400, detail="product_id is required for all items")
-                if not quantity or quantity <= 0:
-                    raise HTTPException(status_code=400, detail="quantity must be positive")
-                
-                # Fetch product data
-                product_response = supabase.table("products")\
-                    .select("*")\
-                    .eq("id", product_id)\
-                    .execute()
-                
-                if not product_response.data:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Product {product_id} not found"
-                    )
-                
-                product = product_response.data[0]
-                product_data_map[product_id] = product
-                
-                # Check stock availability
-                balance_response = supabase.table("inventory_balance")\
-                    .select("qty_on_hand")\
-                    .eq("product_id", product_id)\
-                    .execute()
-                
-                qty_on_hand = 0.0
-                if balance_response.data:
-                    qty_on_hand = float(balance_response.data[0]["qty_on_hand"])
-                
-                if qty_on_hand < quantity:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Insufficient stock for {product['name']}. Available: {qty_on_hand}, Requested: {quantity}"
-                    )
-            
-            # STEP 2: Generate bill number
-            bill_number = generate_bill_number()
-            
-            # STEP 3: Calculate totals
-            subtotal = Decimal("0")
-            tax_amount = Decimal("0")
-            
-            bill_items = []
-            for item in items:
-                product_id = item["product_id"]
-                quantity = Decimal(str(item["quantity"]))
-                product = product_data_map[product_id]
-                
-                unit_price = Decimal(str(product["selling_price"]))
-                tax_rate = Decimal(str(product.get("tax_rate", 0)))
-                
-                line_subtotal = unit_price * quantity
-                line_tax = line_subtotal * (tax_rate / Decimal("100"))
-                line_total = line_subtotal + line_tax
-                
-                subtotal += line_subtotal
-                tax_amount += line_tax
-                
-                bill_items.append({
-                    "product_id": product_id,
-                    "product_name": product["name"],
-                    "unit_price": float(unit_price),
-                    "quantity": float(quantity),
-                    "tax_rate": float(tax_rate),
-                    "line_total": float(line_total)
-                })
-            
-            total = subtotal + tax_amount
-            
-            # STEP 4: ATOMIC STOCK DEDUCTION
-            # Use optimistic locking with WHERE condition
-            # This ensures we don't oversell
-            
-            for item in items:
-                product_id = item["product_id"]
-                quantity = float(item["quantity"])
-                
-                # First, verify stock again (double-check)
-                balance_response = supabase.table("inventory_balance")\
-                    .select("qty_on_hand")\
-                    .eq("product_id", product_id)\
-                    .execute()
+            bill_number = await generate_bill_number()
+            
+            async with stock_locks.hold(item["product_id"] for item in cart):
+                response = await db.rpc("create_sale", {
+                    "p_bill_number": bill_number,
+                    "p_payment_mode": payment_mode,
+                    "p_items": cart,
+                    "p_idempotency_key": idempotency_key
+                }).execute()
                 
-                current_qty = 0.0
-                if balance_response.data:
-                    current_qty = float(balance_response.data[0]["qty_on_hand"])
+                if not response.data:
+                    raise HTTPException(status_code=500, detail="Failed to create bill")
                 
-                if current_qty < quantity:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Insufficient stock. Available: {current_qty}, Requested: {quantity}"
-                    )
-                
-                # Update balance with optimistic locking
-                new_qty = current_qty - quantity
-                
-                update_response = supabase.table("inventory_balance")\
-                    .update({"qty_on_hand": new_qty})\
-                    .eq("product_id", product_id)\
-                    .eq("qty_on_hand", current_qty)\
-                    .execute()
-                
-                # If no rows updated, stock was changed by another transaction
-                if not update_response.data:
-                    raise HTTPException(
-                        status_code=409,
-                        detail=f"Stock conflict for product {product_id}. Please retry."
-                    )
-            
-            # STEP 5: Create sales bill
-            bill_data = {
-                "bill_number": bill_number,
-                "subtotal": float(subtotal),
-                "tax_amount": float(tax_amount),
-                "total": float(total),
-                "payment_mode": payment_mode
-            }
-            
-            bill_response = supabase.table("sales_bill")\
-                .insert(bill_data)\
-                .execute()
-            
-            if not bill_response.data:
-                # Rollback stock updates (manual rollback needed)
-                # In production, use database transactions
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to create bill. Stock may have been deducted."
-                )
-            
-            bill_id = bill_response.data[0]["id"]
-            
-            # STEP 6: Create bill items (with snapshot data)
-            items_to_insert = []
-            for item in bill_items:
-                items_to_insert.append({
-                    "bill_id": bill_id,
-                    "product_id": item["product_id"],
-                    "product_name": item["product_name"],
-                    "unit_price": item["unit_price"],
-                    "quantity": item["quantity"],
-                    "tax_rate": item["tax_rate"],
-                    "line_total": item["line_total"]
-                })
-            
-            supabase.table("sales_bill_items")\
-                .insert(items_to_insert)\
-                .execute()
-            
-            # STEP 7: Create ledger entries (negative qty for stock out)
-            ledger_entries = []
-            for item in items:
-                ledger_entries.append({
-                    "product_id": item["product_id"],
-                    "qty_delta": -float(item["quantity"]),  # Negative for stock out
-                    "reason": "SALE",
-                    "reference_id": bill_id,
-                    "notes": f"Sale: {bill_number}"
-                })
-            
-            supabase.table("inventory_ledger")\
-                .insert(ledger_entries)\
-                .execute()
-            
-            # Fetch complete bill with items
-            bill = bill_response.data[0]
-            bill["items"] = items_to_insert
+                invalidate_stock(item["product_id"] for item in cart)
             
             return {
                 "success": True,
-                "bill": bill
+                "bill": response.data
             }
             
         except HTTPException:
             raise
+        except DatabaseError as e:
+            status_code = e.http_status
+            raise HTTPException(
+                status_code=status_code,
+                detail=e.message if status_code < 500 else f"Error creating sale: {e.message}"
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Error creating sale: {str(e)}"
             )
     
-    async def create_bill(self, data: dict) -> Dict[str, Any]:
+    async def create_bill(self, data: SaleCreate, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Legacy endpoint alias for create_sale.
         """
-        return await self.create_sale(data)
+        return await self.create_sale(data, idempotency_key)
+    
+    async def get_created_sale(self, bill_id: str) -> Dict[str, Any]:
+        """
+        create_sale response of an already committed bill (replay of an
+        Idempotency-Key whose first attempt lost its response).
+        """
+        return {"success": True, "bill": await self.get_bill(bill_id)}
     
     async def get_recent_bills(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -331,31 +407,24 @@ class SalesService:
         Returns:
             List of bill summaries
         """
-        if supabase is None:
+        db = get_db()
+        if db is None:
             return []
         
         try:
-            response = supabase.table("sales_bill")\
-                .select("id, bill_number, total, created_at")\
+            response = await db.table("sales_bill_summary")\
+                .select("id, bill_number, total, created_at, item_count")\
                 .order("created_at", desc=True)\
                 .limit(limit)\
                 .execute()
             
             bills = []
             for bill in (response.data if response.data else []):
-                # Count items
-                items_response = supabase.table("sales_bill_items")\
-                    .select("id")\
-                    .eq("bill_id", bill["id"])\
-                    .execute()
-                
-                item_count = len(items_response.data) if items_response.data else 0
-                
                 bills.append({
                     "id": bill["id"],
                     "invoiceNumber": bill["bill_number"],
                     "total": float(bill["total"]),
-                    "items": item_count,
+                    "items": bill["item_count"],
                     "timestamp": bill["created_at"]
                 })
             
@@ -1,41 +1,111 @@
-import uuid
-import random
+import numpy as np
+from typing import Dict, List, Sequence
+from app.core.db import get_db
+from app.core.config import settings
+from app.utils.hilo import HiLoAllocator
 
-def generate_barcode(product_id: str = None) -> str:
+# EAN-13 check digit weights for the first 12 digits
+_EAN13_WEIGHTS = np.array([1, 3] * 6, dtype=np.int64)
+
+async def _reserve_barcodes(prefix: str, count: int) -> int:
+    """Reserve `count` barcode counter values for a prefix, returning the first"""
+    db = get_db()
+    if db is None:
+        # Mock mode: process-local numbering; next free value per prefix
+        start = _local_counters.get(prefix, 1)
+        _local_counters[prefix] = start + count
+        return start
+
+    response = await db.rpc("reserve_barcodes", {
+        "p_prefix": prefix,
+        "p_block_size": count
+    }).execute()
+
+    return int(response.data)
+
+_local_counters: Dict[str, int] = {}
+_allocator = HiLoAllocator(_reserve_barcodes, settings.BARCODE_BLOCK_SIZE)
+
+def format_barcodes(prefix: str, start: int, count: int) -> List[str]:
     """
-    Generate a unique barcode for a product.
-    
-    For V1 MVP, we use a simple format: EAN-13 compatible format
-    Format: 8XXXXX + random 5 digits + check digit
-    
+    Build `count` EAN-13 barcodes for consecutive counter values.
+
+    Format: prefix + zero-padded counter (12 digits together) + check digit
+
     Args:
-        product_id: Optional product ID to seed the barcode
-        
+        prefix: Numeric barcode prefix
+        start: First counter value
+        count: Number of barcodes
+
+    Returns:
+        List of 13-digit barcode strings
+    """
+    counter_digits = 12 - len(prefix)
+    if start + count - 1 >= 10 ** counter_digits:
+        raise ValueError(f"Barcode counter exceeds {counter_digits} digits for prefix {prefix}")
+
+    base = int(prefix) * 10 ** counter_digits + np.arange(start, start + count, dtype=np.int64)
+    digits = (base[:, None] // 10 ** np.arange(11, -1, -1, dtype=np.int64)) % 10
+    check = (10 - (digits @ _EAN13_WEIGHTS) % 10) % 10
+    return [str(code).zfill(13) for code in (base * 10 + check).tolist()]
+
+async def generate_barcode() -> str:
+    """
+    Generate a unique barcode for a product.
+
+    Codes are EAN-13 in the BARCODE_PREFIX in-store range, numbered from a
+    persisted counter (barcode_counter) reserved in blocks of
+    BARCODE_BLOCK_SIZE per worker. This ensures:
+    - Uniqueness across workers and restarts (blocks are reserved atomically)
+    - No uniqueness lookup or retry (codes are handed out from memory)
+
     Returns:
         A 13-digit barcode string
     """
-    # Generate 12 digits (8 prefix + 4 random)
-    prefix = "8900000"  # Indian country code prefix
-    if product_id:
-        # Use last 4 chars of UUID if provided
-        try:
-            suffix = str(abs(hash(product_id)))[:5].zfill(5)
-        except:
-            suffix = str(random.randint(10000, 99999))
-    else:
-        suffix = str(random.randint(10000, 99999))
-    
-    barcode_12 = prefix + suffix
-    
-    # Calculate EAN-13 check digit
-    check_digit = calculate_ean13_check_digit(barcode_12)
-    
-    return barcode_12 + str(check_digit)
+    sequence = await _allocator.allocate(settings.BARCODE_PREFIX)
+    return format_barcodes(settings.BARCODE_PREFIX, sequence, 1)[0]
+
+async def generate_barcodes(count: int) -> List[str]:
+    """
+    Generate `count` unique barcodes.
+
+    Large batches reserve one contiguous range with a single round trip
+    instead of going through the per-worker block.
+
+    Args:
+        count: Number of barcodes
+
+    Returns:
+        List of 13-digit barcode strings
+    """
+    if count <= 0:
+        return []
+    if count <= settings.BARCODE_BLOCK_SIZE:
+        return [await generate_barcode() for _ in range(count)]
+
+    start = await _reserve_barcodes(settings.BARCODE_PREFIX, count)
+    return format_barcodes(settings.BARCODE_PREFIX, start, count)
+
+def is_generated_barcode(barcode: str) -> bool:
+    """
+    Whether a barcode lies in the range numbered by the barcode counter.
+
+    Such codes are only handed out by generate_barcode(s); a manually
+    entered one could be above the counter and collide with a code
+    generated later, so products may not be created with them.
+
+    Args:
+        barcode: 13-digit barcode string
+
+    Returns:
+        True if the barcode starts with BARCODE_PREFIX
+    """
+    return barcode.startswith(settings.BARCODE_PREFIX)
 
 def calculate_ean13_check_digit(barcode_12: str) -> int:
     """
     Calculate EAN-13 check digit.
-    
+
     Algorithm:
     1. Sum digits at odd positions (1-indexed)
     2. Sum digits at even positions and multiply by 3
@@ -52,22 +122,47 @@ def calculate_ean13_check_digit(barcode_12: str) -> int:
 def validate_barcode(barcode: str) -> bool:
     """
     Validate barcode format and check digit.
-    
+
     Args:
         barcode: 13-digit barcode string
-        
+
     Returns:
         True if valid, False otherwise
     """
     if not barcode or len(barcode) != 13:
         return False
-    
+
     if not barcode.isdigit():
         return False
-    
+
     # Validate check digit
     barcode_12 = barcode[:12]
     expected_check = calculate_ean13_check_digit(barcode_12)
     actual_check = int(barcode[12])
-    
-    return expected_check == actual_check
\ No newline at end of file
+
+    return expected_check == actual_check
+
+def validate_barcodes(barcodes: Sequence[str]) -> np.ndarray:
+    """
+    Validate many barcodes at once (format and check digit).
+
+    Vectorized equivalent of validate_barcode for batches such as imports.
+
+    Args:
+        barcodes: Barcode strings (None and non-strings are invalid)
+
+    Returns:
+        Boolean array, True where the barcode is valid
+    """
+    codes = np.array([code if isinstance(code, str) else "" for code in barcodes], dtype=str)
+    if codes.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    valid = (np.char.str_len(codes) == 13) & np.char.isdigit(codes)
+    if valid.any():
+        # Code points of each character; isdigit() also accepts non-ASCII digits
+        digits = codes[valid].astype("U13").view(np.uint32).reshape(-1, 13).astype(np.int64) - ord("0")
+        ascii_digits = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        check = (10 - (np.clip(digits[:, :12], 0, 9) @ _EAN13_WEIGHTS) % 10) % 10
+        valid[valid] = ascii_digits & (check == digits[:, 12])
+    return valid
@@ -1,58 +1,62 @@
-from datetime import datetime
-from app.core.db import supabase
-from typing import Optional
+import itertools
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from app.core.db import get_db
+from app.core.config import settings
+from app.utils.hilo import HiLoAllocator
 
-def generate_bill_number() -> str:
+async def _reserve_bill_numbers(bill_date: date, count: int) -> int:
+    """Reserve `count` bill sequence numbers for a day, returning the first"""
+    db = get_db()
+    if db is None:
+        # Mock mode: process-local numbering
+        return next(_local_counters.setdefault(bill_date, itertools.count(1, count)))
+    
+    response = await db.rpc("reserve_bill_numbers", {
+        "p_bill_date": bill_date.isoformat(),
+        "p_block_size": count
+    }).execute()
+    
+    return int(response.data)
+
+_local_counters = {}
+_allocator = HiLoAllocator(_reserve_bill_numbers, settings.BILL_NUMBER_BLOCK_SIZE)
+
+def format_bill_number(bill_date: date, sequence: int) -> str:
+    """
+    Format a bill number.
+    
+    Format: BILL-YYYYMMDD-XXXX
+    The sequence is zero-padded to 4 digits and grows wider past 9999.
+    """
+    return f"BILL-{bill_date.strftime('%Y%m%d')}-{str(sequence).zfill(4)}"
+
+async def generate_bill_number() -> str:
     """
     Generate a unique bill number.
     
     Format: BILL-YYYYMMDD-XXXX
-    Where XXXX is a 4-digit sequence number for the day
+    Where XXXX is a sequence number for the day
     
-    This ensures:
-    - Chronological ordering
-    - Uniqueness per day
+    Sequence numbers come from a per-day counter row (bill_number_counter),
+    reserved in blocks of BILL_NUMBER_BLOCK_SIZE per worker. This ensures:
+    - Uniqueness under concurrency (blocks are reserved atomically)
+    - No query on the sale hot path (numbers are handed out from memory)
     - Human-readable format
     
+    The date is the store's (STORE_TIMEZONE), matching the sales reports.
+    Numbers are roughly chronological and may have gaps; order bills by
+    created_at, not bill_number.
+    
     Returns:
         Unique bill number string
     """
-    if supabase is None:
-        # Mock mode: use timestamp
-        timestamp = int(datetime.now().timestamp() * 1000) % 10000
-        return f"BILL-{datetime.now().strftime('%Y%m%d')}-{str(timestamp).zfill(4)}"
-    
-    try:
-        # Get today's date prefix
-        date_prefix = datetime.now().strftime('%Y%m%d')
-        bill_prefix = f"BILL-{date_prefix}-"
-        
-        # Find the highest sequence number for today
-        # Query for bills starting with today's prefix
-        response = supabase.table("sales_bill")\
-            .select("bill_number")\
-            .like("bill_number", f"{bill_prefix}%")\
-            .order("bill_number", desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if response.data and len(response.data) > 0:
-            # Extract sequence number from last bill
-            last_bill = response.data[0]["bill_number"]
-            try:
-                last_seq = int(last_bill.split("-")[-1])
-                next_seq = last_seq + 1
-            except:
-                next_seq = 1
-        else:
-            next_seq = 1
-        
-        # Format with 4 digits
-        bill_number = f"{bill_prefix}{str(next_seq).zfill(4)}"
-        
-        return bill_number
-        
-    except Exception as e:
-        # Fallback to timestamp-based if query fails
-        timestamp = int(datetime.now().timestamp() * 1000) % 10000
-        return f"BILL-{datetime.now().strftime('%Y%m%d')}-{str(timestamp).zfill(4)}"
\ No newline at end of file
+    today = datetime.now(ZoneInfo(settings.STORE_TIMEZONE)).date()
+    
+    # Drop blocks of previous days
+    for bill_date in _allocator.keys():
+        if bill_date != today:
+            _allocator.discard(bill_date)
+    
+    sequence = await _allocator.allocate(today)
+    return format_bill_number(today, sequence)
@@ -0,0 +1,41 @@
+import base64
+import json
+from typing import Any, List
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encode keyset pagination values into an opaque cursor token.
+    
+    Args:
+        values: Sort key values of the last row on the page, e.g. [name, id]
+        
+    Returns:
+        URL-safe cursor string
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor token produced by encode_cursor.
+    
+    Args:
+        cursor: Cursor string from a previous page
+        size: Expected number of sort key values
+        
+    Returns:
+        List of sort key values
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    
+    return values
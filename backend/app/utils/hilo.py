@@ -0,0 +1,93 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+class _Block:
+    """Numbers [next, end) reserved for one key, plus an optional prefetched block"""
+
+    def __init__(self):
+        self.next = 0
+        self.end = 0
+        self.lock = asyncio.Lock()
+        self.pending: Optional[asyncio.Future] = None
+
+class HiLoAllocator:
+    """
+    Hi/lo allocator for unique integers.
+    
+    The "hi" part is a block of `block_size` consecutive numbers reserved from
+    a persistent counter (one round trip per block). The "lo" part is handed
+    out from memory, so allocate() normally completes without I/O.
+    
+    When a block runs low, the next one is reserved in the background, keeping
+    the reservation round trip off the caller's path.
+    
+    Numbers are unique across workers (each block is reserved atomically) but
+    not gap-free: numbers left in a block are lost when the process exits.
+    """
+
+    def __init__(
+        self,
+        reserve: Callable[[Hashable, int], Awaitable[int]],
+        block_size: int
+    ):
+        """
+        Args:
+            reserve: Async function (key, count) -> first number of a newly
+                reserved block of `count` numbers
+            block_size: Numbers reserved per round trip
+        """
+        self._reserve = reserve
+        self.block_size = block_size
+        self._low_water = max(1, block_size // 5)
+        self._blocks: Dict[Hashable, _Block] = {}
+
+    async def allocate(self, key: Hashable = None) -> int:
+        """Allocate the next number for `key`"""
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._blocks[key] = _Block()
+        
+        while block.next >= block.end:
+            async with block.lock:
+                if block.next < block.end:
+                    break
+                start = await self._next_block(key, block)
+                block.next, block.end = start, start + self.block_size
+        
+        value = block.next
+        block.next += 1
+        
+        if block.end - block.next <= self._low_water and block.pending is None:
+            block.pending = asyncio.ensure_future(self._reserve(key, self.block_size))
+        
+        return value
+
+    async def _next_block(self, key: Hashable, block: _Block) -> int:
+        """Use the prefetched block if there is one, otherwise reserve now"""
+        pending, block.pending = block.pending, None
+        if pending is not None:
+            try:
+                # Shielded, so only discard() can cancel the prefetch itself
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    # This task was cancelled
+                    raise
+                # Prefetch cancelled by discard(), reserve in the foreground
+            except Exception:
+                # Prefetch failed, retry in the foreground
+                pass
+        return await self._reserve(key, self.block_size)
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Forget the block for `key` (e.g. a previous day), cancelling any
+        prefetch. An allocate() waiting on that prefetch reserves in the
+        foreground instead.
+        """
+        block = self._blocks.pop(key, None)
+        if block is not None and block.pending is not None:
+            block.pending.cancel()
+
+    def keys(self):
+        return list(self._blocks.keys())
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+async def encode_rows(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    columns: List[str],
+    format: str
+) -> AsyncIterator[str]:
+    """
+    Encode pages of rows as NDJSON or CSV text, one page per chunk.
+    
+    Only the current page is held in memory, so exports of any size stream
+    with constant memory.
+    
+    Args:
+        pages: Async iterator of row lists (e.g. from scan_pages)
+        columns: Columns to write, in order
+        format: "ndjson" or "csv"
+        
+    Yields:
+        Encoded text chunks
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        
+        async for rows in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([row.get(column) for column in columns] for row in rows)
+            yield buffer.getvalue()
+    else:
+        async for rows in pages:
+            yield "".join(
+                json.dumps({column: row.get(column) for column in columns}, default=str) + "\n"
+                for row in rows
+            )
@@ -0,0 +1,138 @@
+"""
+Response serialization benchmark.
+
+Compares, on the 1,000-bill GET /api/sales payload and a full catalog page:
+- before: FastAPI's generic path (jsonable_encoder + json.dumps), used when a
+  route returns a dict without a response model
+- after: response model validated and dumped by pydantic-core, rendered
+  with orjson (what the typed routes with ORJSONResponse do)
+- model_dump_json: pydantic-core serializing straight to bytes (used for the
+  cached catalog and inventory bodies)
+
+Usage (from backend/):
+    python -m benchmarks.serialization [--bills 1000] [--items 5] [--products 10000] [--repeat 20]
+
+Prints one JSON document with median/p95 milliseconds per case.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.modules.sales.schemas import SalesPage
+from app.modules.products.schemas import ProductPage
+
+
+def make_sales(bills: int, items_per_bill: int) -> Dict[str, Any]:
+    """Synthetic GET /api/sales payload (sales_bill_summary rows with items)"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    sales = []
+    for i in range(bills):
+        bill_id = str(uuid.uuid4())
+        created_at = (start + timedelta(minutes=i)).isoformat()
+        items = [
+            {
+                "id": str(uuid.uuid4()),
+                "bill_id": bill_id,
+                "product_id": str(uuid.uuid4()),
+                "product_name": f"Product {j}",
+                "unit_price": 45.5,
+                "quantity": 2,
+                "tax_rate": 5,
+                "line_total": 95.55,
+                "created_at": created_at
+            }
+            for j in range(items_per_bill)
+        ]
+        sales.append({
+            "id": bill_id,
+            "bill_number": f"BILL-20240101-{i + 1:04d}",
+            "subtotal": 91.0 * items_per_bill,
+            "tax_amount": 4.55 * items_per_bill,
+            "total": 95.55 * items_per_bill,
+            "payment_mode": "cash",
+            "created_at": created_at,
+            "item_count": items_per_bill,
+            "items": items
+        })
+    return {"sales": sales}
+
+
+def make_catalog(products: int) -> Dict[str, Any]:
+    """Synthetic GET /api/products payload (product_catalog rows)"""
+    return {
+        "products": [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Product {i:06d}",
+                "sku": f"SKU-{i:06d}",
+                "barcode": f"200{i:09d}0",
+                "unit": "piece",
+                "mrp": 50.0,
+                "selling_price": 45.5,
+                "tax_rate": 5.0,
+                "category": "Grocery",
+                "created_at": "2024-01-01T00:00:00+00:00",
+                "qty_on_hand": 12.0
+            }
+            for i in range(products)
+        ],
+        "next_cursor": None
+    }
+
+
+def measure(fn: Callable[[], bytes], repeat: int) -> Dict[str, Any]:
+    fn()  # warm up
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "bytes": size
+    }
+
+
+def cases(payload: Dict[str, Any], model) -> Dict[str, Callable[[], bytes]]:
+    return {
+        "before_jsonable_encoder_json": lambda: JSONResponse(jsonable_encoder(payload)).body,
+        "after_model_orjson": lambda: ORJSONResponse(
+            model.model_validate(payload).model_dump(mode="json", exclude_unset=True)
+        ).body,
+        "model_dump_json": lambda: model.model_validate(payload).model_dump_json(exclude_unset=True).encode()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument("--bills", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=5, help="Items per bill")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {"params": vars(args), "results": {}}
+    payloads: List = [
+        (f"get_sales_{args.bills}_bills", make_sales(args.bills, args.items), SalesPage),
+        (f"catalog_{args.products}_products", make_catalog(args.products), ProductPage)
+    ]
+    for name, payload, model in payloads:
+        timings = {case: measure(fn, args.repeat) for case, fn in cases(payload, model).items()}
+        before = timings["before_jsonable_encoder_json"]["median_ms"]
+        for case in timings.values():
+            case["speedup"] = round(before / case["median_ms"], 2) if case["median_ms"] else None
+        results["results"][name] = timings
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Service-level benchmark on a local database.
+
+Seeds an in-memory SQLite stand-in for the Supabase schema
+(app/core/sqlite_backend.py: tables, views, the ledger -> balance trigger,
+the immutability triggers and the RPCs) and measures the services the
+routes call, through the same Database wrapper they use in production:
+
+- SalesService.create_sale (random 1-5 line carts)
+- ProductService.get_products (first page)
+- ProductService.get_product_by_barcode (random barcodes)
+- SalesService.get_sales (last 100 bills with items)
+- InventoryService.get_inventory (first page)
+- DashboardService.get_dashboard
+
+For each operation it reports latency percentiles, database round trips
+per call and the most repeated query shape per call (the N+1 detector of
+app/core/query_detector.py runs on every call). Absolute latencies are
+lower than against Supabase (no network); round trips are what carries
+over, so compare both between runs.
+
+Usage (from backend/):
+    python -m benchmarks.services [--scales 1000x10000] [--iterations 200] [--output results.json]
+
+For CI, run two or more scales with --check-scaling: the exit status is 1
+when an operation makes more round trips at a larger scale than at the
+smallest one. --strict also fails on the first query shape repeated more
+than QUERY_REPEAT_THRESHOLD times in one call.
+
+Scales are PRODUCTSxBILLS; the full matrix is
+    --scales 1000x10000 1000x1000000 10000x10000 10000x1000000 100000x10000 100000x1000000
+Seeding one million bills takes a few minutes.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+import app.core.db as db_module
+from app.core.config import settings
+from app.core.db import Database
+from app.core.etag import catalog_version, response_cache
+from app.core.query_detector import audit_queries
+from app.core.sqlite_backend import SQLiteBackend, utc_timestamp
+from app.modules.dashboard.service import DashboardService
+from app.modules.inventory.service import InventoryService
+from app.modules.products.cache import barcode_cache, stock_cache
+from app.modules.products.service import ProductService
+from app.modules.sales.schemas import SaleCreate
+from app.modules.sales.service import SalesService
+from app.utils import barcode as barcode_module
+from app.utils.barcode import format_barcodes
+from app.utils import bill_number as bill_number_module
+
+UNITS = ("piece", "kg", "liter", "gram", "pack")
+CATEGORIES = ("Groceries", "Beverages", "Snacks", "Dairy", "Others")
+PAYMENT_MODES = ("cash", "upi", "card")
+SEED_BATCH = 10000
+HISTORY_DAYS = 90
+
+
+class CountingBackend:
+    """Backend wrapper counting round trips (queries and RPCs)"""
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self.calls = 0
+
+    async def execute(self, query: Any):
+        self.calls += 1
+        return await self.backend.execute(query)
+
+    async def close(self):
+        await self.backend.close()
+
+
+def parse_scale(value: str) -> Tuple[int, int]:
+    try:
+        products, bills = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Scale must be PRODUCTSxBILLS, got {value!r}")
+    return products, bills
+
+
+def seed(backend: SQLiteBackend, products: int, bills: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Insert the catalog, opening stock and bill history.
+
+    Stock is large enough that the benchmark never runs out. Historical
+    bills have no SALE ledger rows (their stock impact is folded into the
+    opening PURCHASE), which keeps balances consistent with the ledger.
+    """
+    conn = backend.conn
+    now = datetime.now(timezone.utc)
+    opened_at = utc_timestamp(now - timedelta(days=HISTORY_DAYS + 1))
+
+    barcodes = format_barcodes(settings.BARCODE_PREFIX, 1, products)
+    catalog = []
+    for i in range(products):
+        price = round(rng.uniform(5, 500), 2)
+        catalog.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Product {i:06d}",
+            "sku": f"SKU-{i:06d}",
+            "barcode": barcodes[i],
+            "unit": rng.choice(UNITS),
+            "mrp": round(price * 1.1, 2),
+            "selling_price": price,
+            "tax_rate": rng.choice((0, 5, 12, 18)),
+            "category": rng.choice(CATEGORIES)
+        })
+
+    conn.execute("BEGIN")
+    for batch_start in range(0, products, SEED_BATCH):
+        batch = catalog[batch_start:batch_start + SEED_BATCH]
+        conn.executemany(
+            "INSERT INTO products (id, name, sku, barcode, unit, mrp, selling_price, tax_rate, category, created_at) "
+            "VALUES (:id, :name, :sku, :barcode, :unit, :mrp, :selling_price, :tax_rate, :category, :created_at)",
+            [{**product, "created_at": opened_at} for product in batch]
+        )
+        conn.executemany(
+            "INSERT INTO inventory_ledger (id, product_id, qty_delta, reason, notes, created_at) "
+            "VALUES (?, ?, ?, 'PURCHASE', 'Opening stock', ?)",
+            [(str(uuid.uuid4()), product["id"], 1000000, opened_at) for product in batch]
+        )
+    conn.execute("COMMIT")
+
+    tz = ZoneInfo(settings.STORE_TIMEZONE)
+    start = now - timedelta(days=HISTORY_DAYS)
+    span = (now - start).total_seconds()
+    # Bill history is inserted in time order, as the store would have written it
+    offsets = sorted(rng.random() * span for _ in range(bills))
+    sequences: Dict[str, int] = {}
+
+    for batch_start in range(0, bills, SEED_BATCH):
+        bill_rows = []
+        item_rows = []
+        for offset in offsets[batch_start:batch_start + SEED_BATCH]:
+            created = start + timedelta(seconds=offset)
+            created_at = utc_timestamp(created)
+            day = created.astimezone(tz).strftime("%Y%m%d")
+            sequences[day] = sequences.get(day, 0) + 1
+            bill_id = str(uuid.uuid4())
+            subtotal = tax_amount = 0.0
+            for product in rng.sample(catalog, min(len(catalog), rng.randint(1, 5))):
+                quantity = rng.randint(1, 3)
+                line_subtotal = product["selling_price"] * quantity
+                line_tax = line_subtotal * product["tax_rate"] / 100
+                subtotal += line_subtotal
+                tax_amount += line_tax
+                item_rows.append((
+                    str(uuid.uuid4()), bill_id, product["id"], product["name"], product["selling_price"],
+                    quantity, product["tax_rate"], round(line_subtotal + line_tax, 2), created_at
+                ))
+            bill_rows.append((
+                bill_id, f"BILL-{day}-{sequences[day]:04d}", round(subtotal, 2), round(tax_amount, 2),
+                round(subtotal + tax_amount, 2), rng.choice(PAYMENT_MODES), created_at
+            ))
+
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO sales_bill (id, bill_number, subtotal, tax_amount, total, payment_mode, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            bill_rows
+        )
+        conn.executemany(
+            "INSERT INTO sales_bill_items (id, bill_id, product_id, product_name, unit_price, quantity, tax_rate, line_total, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            item_rows
+        )
+        conn.execute("COMMIT")
+
+    # Historical bills bypass create_sale, which maintains the rollups
+    conn.execute("BEGIN")
+    backend._rpc_rebuild_sales_rollups()
+    conn.execute("COMMIT")
+
+    conn.execute("ANALYZE")
+    return catalog
+
+
+def reset_process_state() -> None:
+    """Drop caches and reserved number blocks left by the previous scale"""
+    barcode_cache.clear()
+    stock_cache.clear()
+    response_cache.clear()
+    catalog_version._version = None
+    catalog_version._fetched_at = 0.0
+    for allocator in (bill_number_module._allocator, barcode_module._allocator):
+        for key in allocator.keys():
+            allocator.discard(key)
+
+
+async def measure(
+    name: str,
+    counter: CountingBackend,
+    operation: Callable[[], Awaitable[Any]],
+    iterations: int
+) -> Dict[str, Any]:
+    await operation()  # warm up
+    timings = []
+    round_trips = []
+    repeats = 0
+    for _ in range(iterations):
+        calls = counter.calls
+        with audit_queries(name) as audit:
+            started = time.perf_counter()
+            await operation()
+            timings.append((time.perf_counter() - started) * 1000)
+        round_trips.append(counter.calls - calls)
+        repeats = max(repeats, audit.max_repeats)
+    timings.sort()
+
+    def percentile(p: float) -> float:
+        return round(timings[min(len(timings) - 1, int(len(timings) * p))], 3)
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(timings[-1], 3),
+        "round_trips_mean": round(statistics.mean(round_trips), 3),
+        "round_trips_max": max(round_trips),
+        "repeated_query_max": repeats
+    }
+
+
+async def run_scale(products: int, bills: int, iterations: int, rng: random.Random) -> Dict[str, Any]:
+    reset_process_state()
+    sqlite = SQLiteBackend(":memory:")
+
+    started = time.perf_counter()
+    catalog = seed(sqlite, products, bills, rng)
+    seed_seconds = time.perf_counter() - started
+
+    counter = CountingBackend(sqlite)
+    db_module._db = Database(counter, pool_size=settings.DB_POOL_SIZE, timeout=settings.DB_QUERY_TIMEOUT_SECONDS)
+
+    sales = SalesService()
+    product_service = ProductService()
+    inventory = InventoryService()
+    dashboard = DashboardService()
+
+    def random_cart() -> SaleCreate:
+        return SaleCreate(
+            items=[
+                {"product_id": product["id"], "quantity": rng.randint(1, 3)}
+                for product in rng.sample(catalog, min(len(catalog), rng.randint(1, 5)))
+            ],
+            payment_mode=rng.choice(PAYMENT_MODES)
+        )
+
+    operations: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "create_sale": lambda: sales.create_sale(random_cart()),
+        "get_products": lambda: product_service.get_products(limit=100),
+        "get_product_by_barcode": lambda: product_service.get_product_by_barcode(rng.choice(catalog)["barcode"]),
+        "get_sales": lambda: sales.get_sales(limit=100),
+        "get_inventory": lambda: inventory.get_inventory(limit=100),
+        "get_dashboard": lambda: dashboard.get_dashboard()
+    }
+
+    try:
+        results = {name: await measure(name, counter, operation, iterations) for name, operation in operations.items()}
+    finally:
+        await db_module._db.close()
+        db_module._db = None
+
+    return {
+        "products": products,
+        "bills": bills,
+        "seed_seconds": round(seed_seconds, 1),
+        "operations": results
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    results = []
+    for products, bills in args.scales:
+        print(f"scale {products} products x {bills} bills...", file=sys.stderr)
+        results.append(await run_scale(products, bills, args.iterations, rng))
+    return {
+        "benchmark": "services",
+        "backend": "sqlite",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "scales": [f"{products}x{bills}" for products, bills in args.scales]
+        },
+        "scales": results
+    }
+
+
+def scaling_regressions(results: Dict[str, Any]) -> List[str]:
+    """Operations whose round trips grow with data size"""
+    scales = sorted(results["scales"], key=lambda scale: (scale["products"], scale["bills"]))
+    baseline = scales[0]
+    problems = []
+    for scale in scales[1:]:
+        for name, result in scale["operations"].items():
+            expected = baseline["operations"][name]["round_trips_max"]
+            if result["round_trips_max"] > expected:
+                problems.append(
+                    f"{name}: {result['round_trips_max']} round trips at {scale['products']}x{scale['bills']}, "
+                    f"{expected} at {baseline['products']}x{baseline['bills']}"
+                )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend services on a local database")
+    parser.add_argument("--scales", type=parse_scale, nargs="+", default=[(1000, 10000)],
+                        help="PRODUCTSxBILLS, e.g. 10000x1000000")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per operation")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for data and carts")
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--check-scaling", action="store_true",
+                        help="Exit with status 1 if round trips grow with data size")
+    parser.add_argument("--strict", action="store_true",
+                        help="Fail on the first query shape repeated past QUERY_REPEAT_THRESHOLD")
+    args = parser.parse_args()
+
+    # Fingerprints need the calling method recorded when queries are built
+    settings.QUERY_DETECTOR_ENABLED = True
+    settings.QUERY_DETECTOR_STRICT = args.strict
+
+    results = asyncio.run(run(args))
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    print(document)
+
+    if args.check_scaling:
+        problems = scaling_regressions(results)
+        for problem in problems:
+            print(f"Round trips grow with data size: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()